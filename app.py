@@ -1,5 +1,10 @@
+import sys
+
 import uvicorn
 
+from util.config import WORKERS, LEASE_BACKEND
+from util.logger import logger
+
 log_config = uvicorn.config.LOGGING_CONFIG
 default_format = "%(asctime)s | %(levelname)s | %(message)s"
 access_format = r'%(asctime)s | %(levelname)s | %(client_addr)s: %(request_line)s %(status_code)s'
@@ -7,4 +12,10 @@ access_format = r'%(asctime)s | %(levelname)s | %(client_addr)s: %(request_line)
 log_config["formatters"]["default"]["fmt"] = default_format
 log_config["formatters"]["access"]["fmt"] = access_format
 
-uvicorn.run("main:app", host="0.0.0.0", port=7000)
+# 进程内的租约存储无法在 worker 之间互斥，多个 worker 时同一账号可能被超出槽位地同时使用
+if WORKERS > 1 and LEASE_BACKEND != 'redis':
+    logger.error(f"WORKERS={WORKERS} 需要 LEASE_BACKEND=redis，当前为 {LEASE_BACKEND}")
+    sys.exit(1)
+
+# 多个 worker 时启动回收和定时任务只由选出的 leader 执行，见 util/leader.py
+uvicorn.run("main:app", host="0.0.0.0", port=7000, workers=WORKERS)
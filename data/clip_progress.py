@@ -0,0 +1,108 @@
+# -*- coding:utf-8 -*-
+from typing import List
+
+# 已发送字段的标志位
+SENT_IDS = 1 << 0
+SENT_TITLE = 1 << 1
+SENT_TAGS = 1 << 2
+SENT_PROMPT = 1 << 3
+SENT_IMAGE = 1 << 4
+SENT_AUDIO = 1 << 5
+SENT_CDN = 1 << 6
+
+SENT_METADATA = SENT_IDS | SENT_TITLE | SENT_TAGS | SENT_PROMPT | SENT_IMAGE | SENT_AUDIO
+
+
+class ClipProgress:
+    """
+    单次生成的进度状态机
+    每次拿到 feed 快照后与已发送的字段做差，按固定顺序一次性返回所有新出现的内容
+    """
+    __slots__ = ("song_id_1", "song_id_2", "sent")
+
+    def __init__(self, song_id_1: str, song_id_2: str):
+        self.song_id_1 = song_id_1
+        self.song_id_2 = song_id_2
+        self.sent = 0
+
+    @property
+    def metadata_done(self) -> bool:
+        return self.sent & SENT_METADATA == SENT_METADATA
+
+    @property
+    def finished(self) -> bool:
+        return bool(self.sent & SENT_CDN)
+
+    def advance(self, clip: dict) -> List[str]:
+        """
+        对比快照，返回本次需要输出的内容
+
+        输出顺序固定为：IDs -> 歌名 -> 类型 -> 歌词 -> 图片 -> 实时链接，
+        前一项还没出现时后面的项不会提前输出
+        """
+        contents = []
+        metadata = clip.get('metadata') or {}
+
+        # 第一步：歌曲IDs
+        if not self.sent & SENT_IDS:
+            contents.append(f"### ⭐ 歌曲信息\n\n"
+                            f"- **🧩 ID1️⃣**：{self.song_id_1}\n"
+                            f"- **🧩 ID2️⃣**：{self.song_id_2}\n")
+            self.sent |= SENT_IDS
+
+        # 第二步：歌名
+        if not self.sent & SENT_TITLE:
+            title = clip.get('title')
+            if not title:
+                return contents
+            contents.append(f"- **🤖 歌名**：{title} \n\n")
+            self.sent |= SENT_TITLE
+
+        # 第三步：类型
+        if not self.sent & SENT_TAGS:
+            tags = metadata.get('tags')
+            if not tags:
+                return contents
+            contents.append(f"- **💄 类型**：{tags} \n\n")
+            self.sent |= SENT_TAGS
+
+        # 第四步：歌词
+        if not self.sent & SENT_PROMPT:
+            prompt = metadata.get('prompt')
+            if not prompt:
+                return contents
+            contents.append(f"### 📖 完整歌词\n\n```\n{prompt}\n```\n\n")
+            self.sent |= SENT_PROMPT
+
+        # 第五步：图片
+        if not self.sent & SENT_IMAGE:
+            if clip.get('image_url') is None:
+                return contents
+            contents.append(f"### 🖼️ 歌曲图片\n\n")
+            contents.append(f"![image_large_url]({clip.get('image_large_url')}) \n\n### 🤩 即刻享受\n")
+            self.sent |= SENT_IMAGE
+
+        # 第六步：实时链接
+        if not self.sent & SENT_AUDIO:
+            if not clip.get('audio_url'):
+                return contents
+            contents.append(f"\n- **🔗 实时音乐1️⃣**：https://audiopipe.suno.ai/?item_id={self.song_id_1}")
+            contents.append(f"\n- **🔗 实时音乐2️⃣**：https://audiopipe.suno.ai/?item_id={self.song_id_2}"
+                            f"\n\n### 🚀 生成CDN链接中（2min~）\n\n")
+            self.sent |= SENT_AUDIO
+
+        return contents
+
+    # 第七步：CDN链接
+    def cdn_contents(self) -> List[str]:
+        self.sent |= SENT_CDN
+        return [
+            (f"\n\n### 🎷 CDN音乐链接\n\n"
+             f"- **🎧 音乐1️⃣**：https://cdn1.suno.ai/{self.song_id_1}.mp3 \n"
+             f"- **🎧 音乐2️⃣**：https://cdn1.suno.ai/{self.song_id_2}.mp3 \n"),
+            (f"\n### 📺 CDN视频链接\n\n"
+             f"- **📽️ 视频1️⃣**：https://cdn1.suno.ai/{self.song_id_1}.mp4 \n"
+             f"- **📽️ 视频2️⃣**：https://cdn1.suno.ai/{self.song_id_2}.mp4 \n"
+             f"\n### 👀 更多\n\n"
+             f"**🤗还想听更多歌吗，快来告诉我**🎶✨\n"),
+        ]
@@ -0,0 +1,135 @@
+# -*- coding:utf-8 -*-
+import asyncio
+import time
+from contextlib import aclosing
+from typing import AsyncIterator, Optional, Union
+
+from starlette.requests import Request
+
+from data.sse_encoder import ChunkEncoder, DONE
+from util.config import DISCONNECT_CHECK_INTERVAL
+from util.logger import logger
+from util.token_counter import token_counter
+
+
+class ContentDelta:
+    """生成过程中输出的一段文本，role 为 True 时是带 role 的第一个分片"""
+    __slots__ = ("content", "role")
+
+    def __init__(self, content: str, role: bool = False):
+        self.content = content
+        self.role = role
+
+
+class StreamEnd:
+    """输出结束"""
+    __slots__ = ()
+
+
+STREAM_END = StreamEnd()
+
+ContentEvent = Union[ContentDelta, StreamEnd]
+
+
+class StreamMetrics:
+    """生成请求的完成与放弃统计"""
+
+    def __init__(self):
+        self.started = 0
+        self.completed = 0
+        # 客户端断开或取消请求导致提前结束的次数
+        self.abandoned = 0
+        # 生成过程抛出异常而结束的次数
+        self.failed = 0
+        self.last_abandoned_at: Optional[float] = None
+
+    def abandon(self):
+        self.abandoned += 1
+        self.last_abandoned_at = time.time()
+
+    def stats(self) -> dict:
+        return {
+            "started": self.started,
+            "completed": self.completed,
+            "abandoned": self.abandoned,
+            "failed": self.failed,
+            "active": self.started - self.completed - self.abandoned - self.failed,
+            "last_abandoned_at": self.last_abandoned_at,
+        }
+
+
+stream_metrics = StreamMetrics()
+
+
+async def _wait_disconnect(request: Request, interval: float):
+    while not await request.is_disconnected():
+        await asyncio.sleep(interval)
+
+
+# 转发事件，同时检查客户端是否断开；断开或被取消时立即取消事件源，生成过程的 finally 随即归还账号、停止轮询
+async def until_disconnected(events: AsyncIterator[ContentEvent], request: Request,
+                             interval: float = DISCONNECT_CHECK_INTERVAL) -> AsyncIterator[ContentEvent]:
+    stream_metrics.started += 1
+    watcher = asyncio.create_task(_wait_disconnect(request, interval))
+    try:
+        while True:
+            fetch = asyncio.ensure_future(events.__anext__())
+            try:
+                await asyncio.wait((fetch, watcher), return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                # 客户端已断开或本请求被取消
+                if not fetch.done():
+                    fetch.cancel()
+                    await asyncio.gather(fetch, return_exceptions=True)
+            if watcher.done():
+                logger.info("客户端已断开，停止生成并归还账号")
+                stream_metrics.abandon()
+                return
+            try:
+                event = fetch.result()
+            except StopAsyncIteration:
+                stream_metrics.completed += 1
+                return
+            yield event
+    except (asyncio.CancelledError, GeneratorExit):
+        stream_metrics.abandon()
+        raise
+    except Exception:
+        stream_metrics.failed += 1
+        raise
+    finally:
+        watcher.cancel()
+        await events.aclose()
+
+
+# SSE 输出：把内容事件编码为 chat.completion.chunk，结束前发送带用量的最后一个分片
+async def sse_sink(events: AsyncIterator[ContentEvent], encoder: ChunkEncoder,
+                   prompt: str = "") -> AsyncIterator[bytes]:
+    parts = []
+    # 客户端断开时立即关闭事件源，尽早归还账号
+    async with aclosing(events):
+        async for event in events:
+            if event is STREAM_END:
+                try:
+                    usage = await token_counter.usage(prompt, "".join(parts))
+                except Exception as e:
+                    logger.error(f"计算 token 用量时出错: {e}")
+                    usage = None
+                yield encoder.finish(usage)
+                yield DONE
+                continue
+            parts.append(event.content)
+            if event.role:
+                yield encoder.role(event.content)
+            else:
+                yield encoder.content(event.content)
+
+
+# 非流式输出：直接拼接所有文本，不经过 SSE 编码
+async def collect_content(events: AsyncIterator[ContentEvent]) -> str:
+    parts = []
+    async with aclosing(events):
+        async for event in events:
+            if event is not STREAM_END:
+                parts.append(event.content)
+    return "".join(parts)
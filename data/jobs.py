@@ -0,0 +1,193 @@
+# -*- coding:utf-8 -*-
+import asyncio
+import time
+from collections import deque
+from contextlib import aclosing
+from typing import AsyncIterator, Deque, Dict, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from data.events import ContentDelta, ContentEvent, STREAM_END
+from data.message import generate_events
+from data.sse_encoder import ChunkEncoder, DONE
+from util.config import JOB_EVENT_LOG_SIZE, JOB_TTL, JOB_MAX_RUNNING
+from util.logger import logger
+from util.token_counter import token_counter
+from util.tool import generate_random_string_async
+
+
+class GenerationJob:
+    """一次后台生成任务，事件日志只保留最近 log_size 条，供断线重连时按 Last-Event-ID 补发"""
+
+    def __init__(self, job_id: str, model: str, prompt: str, log_size: int):
+        self.id = job_id
+        self.model = model
+        self.prompt = prompt
+        self.created = int(time.time())
+        self.updated = time.time()
+        # running / completed / failed / cancelled
+        self.status = "running"
+        self.error: Optional[str] = None
+        self.usage: Optional[dict] = None
+        self.events: Deque[Tuple[int, ContentEvent]] = deque(maxlen=log_size)
+        # 所有文本分片，第 i 个分片的序号为 i + 1
+        self.parts: List[str] = []
+        self.last_seq = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status != "running"
+
+    # 订阅方在读取日志前取出，之后有新事件时被触发
+    @property
+    def changed(self) -> asyncio.Event:
+        return self._changed
+
+    def _notify(self):
+        self.updated = time.time()
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def append(self, event: ContentEvent):
+        self.last_seq += 1
+        self.events.append((self.last_seq, event))
+        if event is not STREAM_END:
+            self.parts.append(event.content)
+        self._notify()
+
+    def finish(self, status: str, error: Optional[str] = None):
+        self.status = status
+        self.error = error
+        self._notify()
+
+    def events_after(self, seq: int) -> Iterator[Tuple[int, ContentEvent]]:
+        return ((s, event) for s, event in list(self.events) if s > seq)
+
+    # 日志中最早保留的事件之前、seq 之后已被淘汰的文本，返回 (最后一个被淘汰的序号, 文本)，没有淘汰时返回 None
+    def evicted_after(self, seq: int) -> Optional[Tuple[int, str]]:
+        oldest = self.events[0][0] if self.events else self.last_seq + 1
+        if seq >= oldest - 1:
+            return None
+        return oldest - 1, "".join(self.parts[seq:oldest - 1])
+
+    def status_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "model": self.model,
+            "created": self.created,
+            "updated": int(self.updated),
+            "last_event_id": self.last_seq,
+            "content": "".join(self.parts),
+            "usage": self.usage,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    与 HTTP 连接解耦的生成任务
+    生成在后台任务中进行，客户端断开后继续运行，重新连接时从 Last-Event-ID 之后补发，
+    不会再占用账号或消耗次数；结束的任务保留 ttl 秒后清理
+    """
+
+    def __init__(self, log_size: int = JOB_EVENT_LOG_SIZE, ttl: float = JOB_TTL, max_running: int = JOB_MAX_RUNNING):
+        self.log_size = log_size
+        self.ttl = ttl
+        self.max_running = max_running
+        self.db_manager = None
+        self._jobs: Dict[str, GenerationJob] = {}
+
+    async def start(self, db_manager):
+        self.db_manager = db_manager
+
+    # 取消所有进行中的任务，生成过程的 finally 会归还账号
+    async def close(self):
+        tasks = [job.task for job in self._jobs.values() if job.task is not None and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _purge(self):
+        expire = time.time() - self.ttl
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done and job.updated < expire]:
+            del self._jobs[job_id]
+
+    def submit(self, data, prompt: str) -> GenerationJob:
+        self._purge()
+        if sum(not job.done for job in self._jobs.values()) >= self.max_running:
+            raise HTTPException(status_code=429, detail="进行中的生成任务过多")
+        job = GenerationJob(generate_random_string_async(29), data.model, prompt, self.log_size)
+        events = generate_events(time.time(), self.db_manager, prompt, data.model, data.tags, data.title,
+                                 data.continue_at, data.continue_clip_id)
+        job.task = asyncio.create_task(self._run(job, events))
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> GenerationJob:
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="生成任务不存在或已过期")
+        return job
+
+    # 取消任务并等待生成过程退出
+    async def cancel(self, job_id: str) -> GenerationJob:
+        job = self.get(job_id)
+        if not job.done and job.task is not None:
+            job.task.cancel()
+            await asyncio.gather(job.task, return_exceptions=True)
+            # 任务在开始运行前被取消时不会进入 _run
+            if not job.done:
+                job.finish("cancelled")
+        return job
+
+    async def _run(self, job: GenerationJob, events: AsyncIterator[ContentEvent]):
+        try:
+            async with aclosing(events):
+                async for event in events:
+                    if event is STREAM_END:
+                        try:
+                            job.usage = await token_counter.usage(job.prompt, "".join(job.parts))
+                        except Exception as e:
+                            logger.error(f"计算 token 用量时出错: {e}")
+                    job.append(event)
+            job.finish("completed")
+        except asyncio.CancelledError:
+            job.append(ContentDelta("生成任务已取消"))
+            job.append(STREAM_END)
+            job.finish("cancelled")
+        except Exception as e:
+            logger.error(f"生成任务 {job.id} 失败：{e}")
+            job.append(ContentDelta(str(e)))
+            job.append(STREAM_END)
+            job.finish("failed", str(e))
+
+    # 以 SSE 输出任务事件，每条带 id，从 last_event_id 之后开始，任务结束后关闭；
+    # 已被淘汰的事件合并为一个分片补发
+    async def stream(self, job: GenerationJob, last_event_id: int = 0) -> AsyncIterator[bytes]:
+        encoder = ChunkEncoder(job.id, job.model, job.created)
+        # 不属于这个任务的序号（负数或超过已产生的事件）按从头开始处理，否则会一直等不到新事件
+        seq = last_event_id if 0 <= last_event_id <= job.last_seq else 0
+        while True:
+            changed = job.changed
+            evicted = job.evicted_after(seq)
+            if evicted is not None:
+                # 要补发的事件已超出日志长度，合并为一个分片发送；从头开始时它代替带 role 的第一个分片
+                chunk = encoder.role(evicted[1]) if seq == 0 else encoder.content(evicted[1])
+                seq = evicted[0]
+                yield b"id: %d\n" % seq + chunk
+            for seq, event in job.events_after(seq):
+                if event is STREAM_END:
+                    yield b"id: %d\n" % seq + encoder.finish(job.usage) + DONE
+                elif event.role:
+                    yield b"id: %d\n" % seq + encoder.role(event.content)
+                else:
+                    yield b"id: %d\n" % seq + encoder.content(event.content)
+            if job.done and seq >= job.last_seq:
+                return
+            await changed.wait()
+
+
+job_manager = JobManager()
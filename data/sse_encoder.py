@@ -0,0 +1,52 @@
+# -*- coding:utf-8 -*-
+import json
+from json.encoder import encode_basestring_ascii
+from typing import Optional
+
+# 流结束标记
+DONE = b"data: [DONE]\n\n"
+
+
+# 转义 delta 中的文本，结果与 json.dumps 默认参数一致
+def escape(text: str) -> bytes:
+    return encode_basestring_ascii(text).encode("ascii")
+
+
+class ChunkEncoder:
+    """
+    chat.completion.chunk 的 SSE 编码器
+    id、model、created 在同一个请求中不变，信封在创建时编码一次，
+    之后每个分片只转义 delta 中的文本并拼接字节，输出与 json.dumps 整个字典完全一致
+    """
+    __slots__ = ("_envelope", "_prefix", "_role_prefix", "_cache")
+
+    _SUFFIX = b'}, "finish_reason": null}]}\n\n'
+
+    def __init__(self, chat_id: str, model: str, created: int):
+        envelope = json.dumps({"id": f"chatcmpl-{chat_id}", "object": "chat.completion.chunk",
+                               "model": model, "created": created})
+        self._envelope = b"data: " + envelope[:-1].encode("ascii")
+        head = self._envelope + b', "choices": [{"index": 0, "delta": {'
+        self._prefix = head + b'"content": '
+        self._role_prefix = head + b'"role": "assistant", "content": '
+        # 本请求内已编码过的短分片，例如每隔几秒发送一次的等待提示
+        self._cache = {}
+
+    def content(self, text: str) -> bytes:
+        chunk = self._cache.get(text)
+        if chunk is None:
+            chunk = self._prefix + escape(text) + self._SUFFIX
+            if len(text) <= 16:
+                self._cache[text] = chunk
+        return chunk
+
+    # 第一个分片带上 role
+    def role(self, text: str) -> bytes:
+        return self._role_prefix + escape(text) + self._SUFFIX
+
+    # 最后一个分片，带上 finish_reason 和用量
+    def finish(self, usage: Optional[dict] = None) -> bytes:
+        chunk = self._envelope + b', "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]'
+        if usage is not None:
+            chunk += b', "usage": ' + json.dumps(usage).encode("ascii")
+        return chunk + b"}\n\n"
@@ -1,62 +1,87 @@
 # -*- coding:utf-8 -*-
-import asyncio
 import datetime
 import json
 import time
 import warnings
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from chainlit.utils import mount_chainlit
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi import Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from starlette.responses import StreamingResponse
 
 from data import schemas
+from data.events import stream_metrics
+from data.jobs import job_manager
 from data.message import response_async
 from process import process_cookies
-from util.config import (SQL_IP, SQL_DK, USER_NAME,
+from process.cookie_allocator import cookie_allocator
+from process.cookie_health import cookie_health
+from process.cookie_refresher import cookie_refresher
+from process.write_behind import write_behind
+from util.config import (SQL_IP, DB_BACKEND,
                          SQL_PASSWORD, SQL_NAME, COOKIES_PREFIX,
-                         BATCH_SIZE, AUTH_KEY)
+                         BATCH_SIZE, AUTH_KEY, LEASE_TTL, COOKIES_STATS_CACHE_TTL)
+from suno.captcha_pool import captcha_pool
+from util.clip_watcher import clip_watcher
+from util.http_pool import http_pool
+from util.leader import leader_elector
 from util.logger import logger
-from util.sql_uilts import DatabaseManager
+from util.poll_scheduler import poll_scheduler
+from util.token_counter import token_counter
+from util.storage import create_db_manager
 from util.tool import generate_random_string_async, generate_timestamp_async
 
 warnings.filterwarnings("ignore")
 
 # 从环境变量中获取配置
-db_manager = DatabaseManager(SQL_IP, int(SQL_DK), USER_NAME, SQL_PASSWORD, SQL_NAME)
-process_cookie = process_cookies.processCookies(SQL_IP, int(SQL_DK), USER_NAME, SQL_PASSWORD, SQL_NAME)
+db_manager = create_db_manager()
+process_cookie = process_cookies.processCookies(db_manager, BATCH_SIZE)
+# 定时任务只在 leader 上添加，cookie 刷新由 cookie_refresher 增量进行，这里只定时删除无效 cookie
+scheduler = AsyncIOScheduler()
 
 
 # executor = ThreadPoolExecutor(max_workers=300, thread_name_prefix="Music_thread")
 
 
-# 刷新cookies函数
-async def cron_refresh_cookies():
-    try:
-        logger.info(f"==========================================")
-        logger.info("开始刷新数据库里的 cookies.........")
-        cookies = [item['cookie'] for item in await db_manager.get_cookies()]
-        total_cookies = len(cookies)
+# 添加或刷新cookies，逐条返回进度，最后一条为汇总信息
+async def refresh_cookies_messages(cookies, tem_word, upsert=True):
+    total_cookies = len(cookies)
+    processed_count = 0
+    finished_count = 0
+    async for cookie, result in process_cookie.refresh_add_cookie(cookies, False, upsert):
+        finished_count += 1
+        if result:
+            processed_count += 1
+            yield f"Cookie {finished_count}/{total_cookies} {tem_word}成功!"
+        else:
+            logger.info(f"Cookie {finished_count}/{total_cookies} {tem_word}失败!")
+            yield f"Cookie {finished_count}/{total_cookies} {tem_word}失败!"
 
-        processed_count = 0
-        for i in range(0, total_cookies, BATCH_SIZE):
-            cookie_batch = cookies[i:i + BATCH_SIZE]
-            for result in process_cookie.refresh_add_cookie(cookie_batch, BATCH_SIZE, False):
-                if result:
-                    processed_count += 1
+    success_percentage = (processed_count / total_cookies) * 100 if total_cookies > 0 else 100
+    logger.info(f"所有 Cookies {tem_word}完毕。{processed_count}/{total_cookies} 个成功，"
+                f"成功率：({success_percentage:.2f}%)")
+    logger.info(f"==========================================")
+    yield f"所有 Cookies {tem_word}完毕。{processed_count}/{total_cookies} 个成功，成功率：({success_percentage:.2f}%)"
 
-        success_percentage = (processed_count / total_cookies) * 100 if total_cookies > 0 else 100
-        logger.info(f"所有 Cookies 刷新完毕。{processed_count}/{total_cookies} 个成功，"
-                    f"成功率：({success_percentage:.2f}%)")
 
-    except Exception as e:
-        logger.error({"刷新 cookies 出现错误": str(e)})
+# 以 SSE 形式推送添加或刷新进度
+async def stream_cookies_messages(cookies, tem_word, upsert=True):
+    async for message in refresh_cookies_messages(cookies, tem_word, upsert):
+        yield f"data: {message}\n\n"
+    yield f"""data:""" + ' ' + f"""[DONE]\n\n"""
+
+
+# 删除cookies：立即停止分配并批量删除，返回数据库中实际删除的行数；
+# 删除同时排入 write_behind 队列，丢弃这些账号尚未写入的修改，直接删除失败时也会由队列重试
+async def remove_cookies(cookies):
+    cookie_allocator.remove(cookies)
+    return await db_manager.delete_cookies_bulk(cookies)
 
 
 # 删除无效cookies
@@ -64,12 +89,7 @@ async def cron_delete_cookies():
     try:
         logger.info("开始删除数据库里的无效cookies.........")
         cookies = [item['cookie'] for item in await db_manager.get_invalid_cookies()]
-        delete_tasks = []
-        for cookie in cookies:
-            delete_tasks.append(db_manager.delete_cookies(cookie))
-
-        results = await asyncio.gather(*delete_tasks, return_exceptions=True)
-        success_count = sum(1 for result in results if result is True)
+        success_count = await remove_cookies(cookies)
         fail_count = len(cookies) - success_count
 
         logger.info(
@@ -80,48 +100,76 @@ async def cron_delete_cookies():
         logger.error({"删除无效 cookies 出现错误": e})
 
 
-# 先刷新在删除cookies
-async def cron_optimize_cookies():
-    await cron_refresh_cookies()
-    await cron_delete_cookies()
-
-
-# 初始化所有songID
-async def init_delete_songID():
+# 启动时只回收已过期的租约，其他实例仍在使用的租约保持不变
+async def init_reap_leases():
     try:
-        rows_updated = await db_manager.delete_songIDS()
-        logger.info({"message": "Cookies songIDs 更新成功！", "rows_updated": rows_updated})
+        rows_updated = await db_manager.reap_expired_leases(LEASE_TTL)
+        logger.info({"message": "过期的 cookie 租约回收成功！", "rows_updated": rows_updated})
     except HTTPException as http_exc:
         raise http_exc
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
 
 
+# 成为 leader 后回收过期租约，并接管定时任务和 cookie 刷新
+async def on_leader_elected():
+    await init_reap_leases()
+    scheduler.add_job(cron_delete_cookies, IntervalTrigger(minutes=60), id='Delete_invalid_run',
+                      replace_existing=True)
+    await cookie_refresher.start(db_manager, process_cookie)
+
+
+async def on_leader_demoted():
+    if scheduler.get_job('Delete_invalid_run'):
+        scheduler.remove_job('Delete_invalid_run')
+    await cookie_refresher.close()
+
+
 # 生命周期管理
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator:
     global db_manager
     try:
+        await http_pool.start()
+        await captcha_pool.start()
+        await token_counter.start()
         await db_manager.create_pool()
-        await db_manager.create_database_and_table()
-        await init_delete_songID()
+        # 多个 worker 同时启动时依次建表和迁移
+        locked = await db_manager.acquire_lock("init", timeout=60)
+        try:
+            await db_manager.create_database_and_table()
+        finally:
+            if locked:
+                await db_manager.release_lock("init")
+        await write_behind.start(db_manager)
+        await cookie_allocator.start(db_manager)
+        await job_manager.start(db_manager)
+        scheduler.start()
+        await leader_elector.start(db_manager, on_leader_elected, on_leader_demoted)
         logger.info("初始化 SQL 和 songID 成功！")
     except Exception as e:
         logger.error(f"初始化 SQL 或者 songID 失败: {str(e)}")
         raise
 
-    # 初始化并启动 APScheduler
-    scheduler = AsyncIOScheduler()
-    scheduler.add_job(cron_optimize_cookies, IntervalTrigger(minutes=60), id='Refresh_and_delete_run')
-    scheduler.start()
-
     try:
         yield
     finally:
-        # 停止调度器
+        # 取消进行中的后台生成任务，归还占用的账号
+        await job_manager.close()
+        # 交出 leader 身份，停止定时任务和 cookie 刷新
+        await leader_elector.close()
         scheduler.shutdown(wait=True)
+        # 停止 cookie 分配器，并把尚未写入的租约状态全部写回
+        await cookie_allocator.close()
+        await write_behind.close()
         # 关闭数据库连接池
         await db_manager.close_db_pool()
+        # 停止歌曲状态轮询和验证码预求解
+        await clip_watcher.close()
+        await captcha_pool.close()
+        await token_counter.close()
+        # 关闭 HTTP 连接池
+        await http_pool.close()
 
 
 # FastAPI 应用初始化
@@ -139,10 +187,10 @@ app.add_middleware(
 # mount_chainlit(app=app, target="background/BackManagement.py", path="")
 
 @app.post("/v1/chat/completions")
-async def get_last_user_message(data: schemas.Data, authorization: str = Header(...)):
+async def get_last_user_message(data: schemas.Data, request: Request, authorization: str = Header(...)):
     start_time = time.time()
     content_all = ''
-    if SQL_IP == '' or SQL_PASSWORD == '' or SQL_NAME == '':
+    if DB_BACKEND == 'mysql' and (SQL_IP == '' or SQL_PASSWORD == '' or SQL_NAME == ''):
         raise ValueError("BASE_URL is not set")
 
     try:
@@ -156,14 +204,7 @@ async def get_last_user_message(data: schemas.Data, authorization: str = Header(
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"生成聊天 ID 或时间戳时出错: {str(e)}")
 
-    last_user_content = None
-    for message in reversed(data.messages):
-        if message.role == "user":
-            last_user_content = message.content
-            break
-
-    if last_user_content is None:
-        raise HTTPException(status_code=400, detail="No user message found")
+    last_user_content = get_last_user_content(data)
 
     headers = {
         'Cache-Control': 'no-cache',
@@ -177,7 +218,7 @@ async def get_last_user_message(data: schemas.Data, authorization: str = Header(
     try:
         # 协程处理
         return await response_async(start_time, db_manager, data, content_all,
-                                    chat_id, timeStamp, last_user_content, headers)
+                                    chat_id, timeStamp, last_user_content, headers, request)
     except HTTPException as http_exc:
         raise http_exc
 
@@ -190,6 +231,53 @@ async def get_last_user_message(data: schemas.Data, authorization: str = Header(
     #     raise HTTPException(status_code=500, detail=str(e))
 
 
+# 取出最后一条用户消息
+def get_last_user_content(data: schemas.Data) -> str:
+    for message in reversed(data.messages):
+        if message.role == "user":
+            return message.content
+    raise HTTPException(status_code=400, detail="No user message found")
+
+
+# 提交后台生成任务，生成与连接解耦，客户端断开后继续进行
+@app.post("/v1/jobs")
+async def submit_job(data: schemas.Data, authorization: str = Header(...)):
+    await verify_auth_header(authorization)
+    job = job_manager.submit(data, get_last_user_content(data))
+    return JSONResponse(status_code=202, content={"id": job.id, "status": job.status})
+
+
+# 查询生成任务的状态和已生成的内容
+@app.get("/v1/jobs/{job_id}")
+async def get_job(job_id: str, authorization: str = Header(...)):
+    await verify_auth_header(authorization)
+    return JSONResponse(content=job_manager.get(job_id).status_dict())
+
+
+# 以 SSE 订阅生成任务，重新连接时按 Last-Event-ID 从断开处继续
+@app.get("/v1/jobs/{job_id}/events")
+async def stream_job(job_id: str, authorization: str = Header(...), last_event_id: Optional[str] = Header(None)):
+    await verify_auth_header(authorization)
+    job = job_manager.get(job_id)
+    try:
+        after = int(last_event_id) if last_event_id else 0
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Last-Event-ID 必须是整数")
+    headers = {
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    }
+    return StreamingResponse(job_manager.stream(job, after), headers=headers, media_type="text/event-stream")
+
+
+# 取消生成任务
+@app.delete("/v1/jobs/{job_id}")
+async def cancel_job(job_id: str, authorization: str = Header(...)):
+    await verify_auth_header(authorization)
+    job = await job_manager.cancel(job_id)
+    return JSONResponse(content={"id": job.id, "status": job.status})
+
+
 # 授权检查
 async def verify_auth_header(authorization: str = Header(...)):
     if not authorization.startswith("Bearer "):
@@ -198,45 +286,57 @@ async def verify_auth_header(authorization: str = Header(...)):
         raise HTTPException(status_code=403, detail="Invalid authorization key")
 
 
+# cookies 统计结果的短时缓存，轮询的面板不必每次都查询数据库
+cookies_summary_cache = {"expires": 0.0, "value": None}
+
+
+async def get_cookies_summary():
+    now = time.monotonic()
+    if cookies_summary_cache["value"] is None or now >= cookies_summary_cache["expires"]:
+        cookies_summary_cache["value"] = await db_manager.get_cookies_summary()
+        cookies_summary_cache["expires"] = now + COOKIES_STATS_CACHE_TTL
+    return cookies_summary_cache["value"]
+
+
+# 按 id 逐页查询并以 NDJSON 逐行输出 cookies，不会一次性把整张表读入内存
+async def stream_cookies_rows(after, page_size):
+    while True:
+        rows = await db_manager.get_cookies_page(after, page_size)
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False) + "\n"
+        if len(rows) < page_size:
+            break
+        after = rows[-1]['id']
+
+
 # 获取cookies的详细详细
 @app.get(f"/{COOKIES_PREFIX}/cookies")
-async def get_cookies(authorization: str = Header(...), cookies_type: str = Query(None)):
+async def get_cookies(authorization: str = Header(...), cookies_type: str = Query(None),
+                      after: int = Query(0), limit: int = Query(100)):
     try:
         await verify_auth_header(authorization)
+        limit = max(1, min(limit, 1000))
 
         if cookies_type == "list":
-            cookies = await db_manager.get_row_cookies()
-            if not isinstance(cookies, list):
-                cookies = []
-            return JSONResponse(
-                content={
-                    "cookies": cookies,
-                    "status": "success",
-                    "message": "Cookies retrieved successfully"
-                }
-            )
+            return StreamingResponse(stream_cookies_rows(after, limit), media_type="application/x-ndjson")
         else:
-            cookies = await db_manager.get_all_cookies()
-            cookies_json = json.loads(cookies)
-            valid_cookie_count = int(await db_manager.get_valid_cookies_count())
-            invalid_cookie_count = len(cookies_json) - valid_cookie_count
-            remaining_count = int(await db_manager.get_cookies_count())
+            summary = await get_cookies_summary()
+            cookies_page = await db_manager.get_cookies_page(after, limit)
+            invalid_cookie_count = summary["cookie_count"] - summary["valid_cookie_count"]
 
-            if remaining_count is None:
-                remaining_count = 0
-
-            logger.info({"message": "Cookies 获取成功。", "数量": len(cookies_json)})
-            logger.info("有效数量: " + str(valid_cookie_count))
+            logger.info({"message": "Cookies 获取成功。", "数量": summary["cookie_count"]})
+            logger.info("有效数量: " + str(summary["valid_cookie_count"]))
             logger.info("无效数量: " + str(invalid_cookie_count))
-            logger.info("剩余创作音乐次数: " + str(remaining_count))
+            logger.info("剩余创作音乐次数: " + str(summary["remaining_count"]))
 
             return JSONResponse(
                 content={
-                    "cookie_count": len(cookies_json),
-                    "valid_cookie_count": valid_cookie_count,
+                    "cookie_count": summary["cookie_count"],
+                    "valid_cookie_count": summary["valid_cookie_count"],
                     "invalid_cookie_count": invalid_cookie_count,
-                    "remaining_count": remaining_count,
-                    "process": cookies_json
+                    "remaining_count": summary["remaining_count"],
+                    "process": cookies_page,
+                    "next_after": cookies_page[-1]['id'] if len(cookies_page) == limit else None
                 }
             )
     except HTTPException as http_exc:
@@ -247,38 +347,20 @@ async def get_cookies(authorization: str = Header(...), cookies_type: str = Quer
 
 
 @app.put(f"/{COOKIES_PREFIX}/cookies")
-async def add_cookies(data: schemas.Cookies, authorization: str = Header(...)):
+async def add_cookies(data: schemas.Cookies, authorization: str = Header(...), stream: bool = Query(False)):
     try:
         await verify_auth_header(authorization)
         logger.info(f"==========================================")
         logger.info("开始添加数据库里的 cookies.........")
         cookies = data.cookies
-        total_cookies = len(cookies)
-
-        async def stream_results(cookies,total_cookies):
-            processed_count = 0
-            for i in range(0, total_cookies, BATCH_SIZE):
-                cookie_batch = cookies[i:i + BATCH_SIZE]
-                for result in process_cookie.refresh_add_cookie(cookie_batch, BATCH_SIZE, False):
-                    if result:
-                        processed_count += 1
-                        # yield f"data: Cookie {processed_count}/{total_cookies} 添加成功!\n\n"
-                    else:
-                        logger.info(f"data: Cookie {processed_count}/{total_cookies} 添加失败!\n\n")
-                        # yield f"data: Cookie {processed_count}/{total_cookies} 添加失败!\n\n"
-
-            success_percentage = (processed_count / total_cookies) * 100 if total_cookies > 0 else 100
-            logger.info(f"所有 Cookies 添加完毕。{processed_count}/{total_cookies} 个成功，"
-                        f"成功率：({success_percentage:.2f}%)")
-            logger.info(f"==========================================")
-            # yield f"data: 所有 Cookies 添加完毕。{processed_count}/{total_cookies} 个成功，成功率：({success_percentage:.2f}%)\n\n"
-            # yield f"""data:""" + ' ' + f"""[DONE]\n\n"""
-            return f"所有 Cookies 添加完毕。{processed_count}/{total_cookies} 个成功，成功率：({success_percentage:.2f}%)"
-
-        # return StreamingResponse(stream_results(cookies,total_cookies), media_type="text/event-stream")
-        # return JSONResponse({"message":stream_results(cookies,total_cookies)},status_code=200)
-        messageResult = await stream_results(cookies, total_cookies)
-        return JSONResponse({"messages":messageResult},status_code=200)
+
+        if stream:
+            return StreamingResponse(stream_cookies_messages(cookies, "添加"), media_type="text/event-stream")
+
+        messageResult = None
+        async for messageResult in refresh_cookies_messages(cookies, "添加"):
+            pass
+        return JSONResponse({"messages": messageResult}, status_code=200)
 
     except HTTPException as http_exc:
         raise http_exc
@@ -293,12 +375,7 @@ async def delete_cookies(data: schemas.Cookies, authorization: str = Header(...)
     try:
         await verify_auth_header(authorization)
         cookies = data.cookies
-        delete_tasks = []
-        for cookie in cookies:
-            delete_tasks.append(db_manager.delete_cookies(cookie))
-
-        results = await asyncio.gather(*delete_tasks, return_exceptions=True)
-        success_count = sum(1 for result in results if result is True)
+        success_count = await remove_cookies(cookies)
         fail_count = len(cookies) - success_count
 
         return JSONResponse(
@@ -312,37 +389,21 @@ async def delete_cookies(data: schemas.Cookies, authorization: str = Header(...)
 
 # 请求刷新cookies
 @app.get(f"/{COOKIES_PREFIX}/refresh/cookies")
-async def refresh_cookies(authorization: str = Header(...)):
+async def refresh_cookies(authorization: str = Header(...), stream: bool = Query(False)):
     try:
         await verify_auth_header(authorization)
         logger.info(f"==========================================")
         logger.info("开始刷新数据库里的 cookies.........")
         cookies = [item['cookie'] for item in await db_manager.get_cookies()]
-        total_cookies = len(cookies)
-
-        async def stream_results():
-            processed_count = 0
-            for i in range(0, total_cookies, BATCH_SIZE):
-                cookie_batch = cookies[i:i + BATCH_SIZE]
-                for result in process_cookie.refresh_add_cookie(cookie_batch, BATCH_SIZE, False):
-                    if result:
-                        processed_count += 1
-                        # yield f"data: Cookie {processed_count}/{total_cookies} 刷新成功!\n\n"
-                    else:
-                        # yield f"data: Cookie {processed_count}/{total_cookies} 刷新失败!\n\n"
-                        logger.info(f"data: Cookie {processed_count}/{total_cookies} 刷新失败!\n\n")
-            success_percentage = (processed_count / total_cookies) * 100 if total_cookies > 0 else 100
-            logger.info(f"所有 Cookies 刷新完毕。{processed_count}/{total_cookies} 个成功，"
-                        f"成功率：({success_percentage:.2f}%)")
-            logger.info(f"==========================================")
-            # yield f"data: 所有 Cookies 刷新完毕。{processed_count}/{total_cookies} 个成功，成功率：({success_percentage:.2f}%)\n\n"
-            # yield f"""data:""" + ' ' + f"""[DONE]\n\n"""
-            return f"data: 所有 Cookies 刷新完毕。{processed_count}/{total_cookies} 个成功，成功率：({success_percentage:.2f}%)\n\n"
-
-
-        messgaesResultRefresh = await stream_results()
-        # return StreamingResponse(stream_results(), media_type="text/event-stream")
-        return JSONResponse({"messages":messgaesResultRefresh},status_code=200)
+
+        if stream:
+            return StreamingResponse(stream_cookies_messages(cookies, "刷新", upsert=False),
+                                     media_type="text/event-stream")
+
+        messgaesResultRefresh = None
+        async for messgaesResultRefresh in refresh_cookies_messages(cookies, "刷新", upsert=False):
+            pass
+        return JSONResponse({"messages": f"data: {messgaesResultRefresh}\n\n"}, status_code=200)
     except HTTPException as http_exc:
         raise http_exc
     except Exception as e:
@@ -358,12 +419,7 @@ async def delete_invalid_cookies(authorization: str = Header(...)):
         logger.info(f"==========================================")
         logger.info("开始删除数据库里的无效cookies.........")
         cookies = [item['cookie'] for item in await db_manager.get_invalid_cookies()]
-        delete_tasks = []
-        for cookie in cookies:
-            delete_tasks.append(db_manager.delete_cookies(cookie))
-
-        results = await asyncio.gather(*delete_tasks, return_exceptions=True)
-        success_count = sum(1 for result in results if result is True)
+        success_count = await remove_cookies(cookies)
         fail_count = len(cookies) - success_count
 
         logger.info(
@@ -393,3 +449,101 @@ async def delete_songID(authorization: str = Header(...)):
         logger.error(f"Unexpected error: {e}")
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+
+# 获取增量刷新队列的状态
+@app.get(f"/{COOKIES_PREFIX}/refresh/stats")
+async def get_refresh_stats(authorization: str = Header(...)):
+    try:
+        await verify_auth_header(authorization)
+        return JSONResponse(content={**cookie_refresher.stats(), "leader": leader_elector.is_leader})
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+# 获取当前的 cookie 租约
+@app.get(f"/{COOKIES_PREFIX}/leases")
+async def get_leases(authorization: str = Header(...)):
+    try:
+        await verify_auth_header(authorization)
+        return JSONResponse(content={
+            "owner": cookie_allocator.owner,
+            "local": cookie_allocator.lease_status(),
+            "database": await db_manager.get_leases(),
+        })
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+# 获取各账号的健康度与隔离状态
+@app.get(f"/{COOKIES_PREFIX}/health")
+async def get_cookies_health(authorization: str = Header(...)):
+    try:
+        await verify_auth_header(authorization)
+        return JSONResponse(content=cookie_health.status())
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+# 解除账号隔离并清空健康度统计
+@app.delete(f"/{COOKIES_PREFIX}/health")
+async def reset_cookies_health(data: schemas.Cookies, authorization: str = Header(...)):
+    try:
+        await verify_auth_header(authorization)
+        reset_count = 0
+        for cookie in data.cookies:
+            reset_count += cookie_health.reset(cookie)
+            cookie_allocator.refresh(cookie)
+        return JSONResponse(content={"message": "账号健康度已重置！", "reset_count": reset_count})
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+# 获取生成请求的完成与放弃（客户端提前断开）统计
+@app.get(f"/{COOKIES_PREFIX}/streams/stats")
+async def get_stream_stats(authorization: str = Header(...)):
+    try:
+        await verify_auth_header(authorization)
+        return JSONResponse(content=stream_metrics.stats())
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+# 获取验证码预求解与消耗统计
+@app.get(f"/{COOKIES_PREFIX}/captcha/stats")
+async def get_captcha_stats(authorization: str = Header(...)):
+    try:
+        await verify_auth_header(authorization)
+        return JSONResponse(content=captcha_pool.stats())
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+# 获取自适应轮询学习到的各阶段耗时分布
+@app.get(f"/{COOKIES_PREFIX}/poll/stats")
+async def get_poll_stats(authorization: str = Header(...)):
+    try:
+        await verify_auth_header(authorization)
+        return JSONResponse(content=poll_scheduler.stats())
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
+        return JSONResponse(status_code=500, content={"error": str(e)})
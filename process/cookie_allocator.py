@@ -0,0 +1,305 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+
+from util.config import (ALLOCATOR_RECONCILE_INTERVAL, LEASE_TTL, LEASE_REAP_INTERVAL,
+                         LEASE_OWNER, LEASE_KEY_PREFIX, COOKIE_SLOTS)
+from process.cookie_health import cookie_health
+from process.lease_store import LeaseStore, create_lease_store
+from process.write_behind import write_behind
+from suno.token_manager import token_manager
+from util.leader import leader_elector
+from util.logger import logger
+from util.storage import hash_cookie
+
+_lease_ids = itertools.count(1)
+
+
+class CookieLease:
+    """一次 cookie 租约，归还时凭租约对象而不是 cookie，避免超时回收后误还别人的租约"""
+    __slots__ = ("cookie", "owner", "token", "slot", "leased_at", "expire_at")
+
+    def __init__(self, cookie: str, owner: str, ttl: float):
+        self.cookie = cookie
+        self.owner = owner
+        # 写入租约存储的值，每个租约唯一；slot 为占用的槽位，归还后为 None
+        self.token = f"{owner}:{next(_lease_ids)}"
+        self.slot: Optional[int] = None
+        self.leased_at = time.time()
+        self.expire_at = self.leased_at + ttl
+
+
+class AccountState:
+    """内存中单个账号的状态"""
+    __slots__ = ("cookie", "count", "leases", "remote")
+
+    def __init__(self, cookie: str, count: int):
+        self.cookie = cookie
+        self.count = count
+        # 本进程持有的租约，以及其他进程占用的槽位数
+        self.leases: Set[CookieLease] = set()
+        self.remote = 0
+
+
+class CookieAllocator:
+    """
+    进程内的 cookie 租约分配器，同时作为各账号剩余次数的本地账本
+    每个账号有 slots 个并发槽位，还有空闲槽位的账号放在 ready 集合中，
+    先按健康等级、再按剩余次数建立堆，分配与归还都是 O(log n)；被 cookie_health 隔离的账号不参与分配；
+    每次租用乐观地扣减一次，只在定时刷新或上游返回积分不足时才以计费接口为准；
+    租约状态经 write_behind 队列合并后批量写回数据库，并定期与数据库对账以获取管理端的修改；
+    每个租约带有持有者和过期时间，过期未归还的租约由后台任务回收；
+    每个槽位在租约存储中对应一个带过期时间的键，使用共享的租约存储（redis）时，
+    多个网关节点通过它互斥，租约不再写入数据库，数据库只记录账号和剩余次数
+    """
+
+    def __init__(self, reconcile_interval: float = ALLOCATOR_RECONCILE_INTERVAL, lease_ttl: float = LEASE_TTL,
+                 reap_interval: float = LEASE_REAP_INTERVAL, owner: str = LEASE_OWNER, slots: int = COOKIE_SLOTS,
+                 store: Optional[LeaseStore] = None):
+        self.reconcile_interval = reconcile_interval
+        self.slots = max(1, slots)
+        self.lease_ttl = lease_ttl
+        self.reap_interval = reap_interval
+        self.owner = owner
+        self.store = store or create_lease_store()
+        self.db_manager = None
+        self._accounts: Dict[str, AccountState] = {}
+        self._ready: Set[str] = set()
+        self._heap: List[Tuple[Tuple[int, int], int, str]] = []
+        self._seq = itertools.count()
+        self._tasks: List[asyncio.Task] = []
+
+    # 加载账号并启动定时对账和租约回收
+    async def start(self, db_manager):
+        self.db_manager = db_manager
+        await self.reconcile()
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._reconcile_loop()),
+                           asyncio.create_task(self._reap_loop())]
+        logger.info(f"Cookie 分配器已启动，可用账号：{len(self._ready)}/{len(self._accounts)}")
+
+    # 停止后台任务，租约状态由 write_behind 关闭时写完
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.store.close()
+
+    def _free_slots(self, state: AccountState) -> int:
+        return self.slots - len(state.leases) - state.remote
+
+    # 健康账号优先，同一等级中剩余次数多的优先
+    @staticmethod
+    def _rank(state: AccountState) -> Tuple[int, int]:
+        return cookie_health.tier(state.cookie), -state.count
+
+    def _push(self, state: AccountState):
+        if self._free_slots(state) <= 0 or state.count <= 0 or not cookie_health.available(state.cookie):
+            self._ready.discard(state.cookie)
+            return
+        self._ready.add(state.cookie)
+        heapq.heappush(self._heap, (self._rank(state), next(self._seq), state.cookie))
+        # 堆中失效条目过多时重建
+        if len(self._heap) > 2 * len(self._ready) + 64:
+            self._heap = [(self._rank(self._accounts[c]), next(self._seq), c) for c in self._ready]
+            heapq.heapify(self._heap)
+
+    @staticmethod
+    def _key(cookie: str, slot: int) -> str:
+        return f"{LEASE_KEY_PREFIX}{hash_cookie(cookie)}:{slot}"
+
+    # 在租约存储中占用一个本进程未使用的槽位
+    async def _claim(self, state: AccountState, lease: CookieLease) -> bool:
+        used = {other.slot for other in state.leases if other is not lease}
+        for slot in range(self.slots):
+            if slot in used:
+                continue
+            lease.slot = slot
+            if await self.store.acquire(self._key(lease.cookie, slot), lease.token, self.lease_ttl):
+                return True
+        lease.slot = None
+        return False
+
+    # 租用一个可用的 cookie（剩余次数最多的账号优先）
+    async def acquire(self) -> CookieLease:
+        while self._heap:
+            rank, _, cookie = heapq.heappop(self._heap)
+            state = self._accounts.get(cookie)
+            if state is None or cookie not in self._ready:
+                continue
+            if self._rank(state) != rank:
+                # 剩余次数或健康等级已变化，按新的优先级重新入堆
+                self._ready.discard(cookie)
+                self._push(state)
+                continue
+            lease = CookieLease(cookie, self.owner, self.lease_ttl)
+            # 先在本地占住槽位，等待租约存储期间其他请求不会再选中它
+            state.leases.add(lease)
+            self._ready.discard(cookie)
+            self._push(state)
+            try:
+                claimed = await self._claim(state, lease)
+            except Exception:
+                state.leases.discard(lease)
+                self._ready.discard(cookie)
+                self._push(state)
+                raise
+            if not claimed:
+                # 槽位都被其他节点占用，下次对账前不再分配这个账号
+                state.leases.discard(lease)
+                state.remote = self.slots - len(state.leases)
+                self._ready.discard(cookie)
+                self._push(state)
+                continue
+            state.count -= 1
+            # 还有空闲槽位时以新的剩余次数重新入堆
+            self._ready.discard(cookie)
+            self._push(state)
+            if self.store.shared:
+                write_behind.consume(cookie)
+            else:
+                write_behind.lease(cookie, self.owner, self.lease_ttl)
+            return lease
+        raise HTTPException(status_code=429, detail="未找到可用的suno cookie")
+
+    # 归还租约，租约已被回收或已归还时忽略
+    async def release(self, lease: CookieLease):
+        if lease.slot is None:
+            return
+        key, lease.slot = self._key(lease.cookie, lease.slot), None
+        state = self._accounts.get(lease.cookie)
+        if state is not None and lease in state.leases:
+            state.leases.discard(lease)
+            self._ready.discard(lease.cookie)
+            self._push(state)
+            if not self.store.shared:
+                write_behind.release(lease.cookie)
+        try:
+            await self.store.release(key, lease.token)
+        except Exception as e:
+            # 键会在过期后自动释放
+            logger.error(f"租约存储释放失败：{e}")
+
+    # 上游返回积分不足时将账号剩余次数记为 0，等待下次刷新时按计费接口校准
+    def exhaust(self, cookie: str):
+        state = self._accounts.get(cookie)
+        if state is None:
+            return
+        state.count = 0
+        self._ready.discard(cookie)
+        write_behind.set_count(cookie, 0)
+
+    # 从分配器中移除账号（例如账号已失效被删除）
+    def discard(self, cookie: str):
+        self._accounts.pop(cookie, None)
+        self._ready.discard(cookie)
+        cookie_health.forget(cookie)
+        token_manager.forget(cookie)
+
+    # 删除账号：立即停止分配，删除经 write_behind 队列写入数据库
+    def remove(self, cookies: List[str]):
+        for cookie in cookies:
+            self.discard(cookie)
+            write_behind.invalidate(cookie)
+
+    # 账号健康状态变化（隔离、解除隔离或等级变化）后重新判断是否可分配
+    def refresh(self, cookie: str):
+        state = self._accounts.get(cookie)
+        if state is not None:
+            self._ready.discard(cookie)
+            self._push(state)
+
+    # 当前进程持有的租约
+    def lease_status(self) -> List[dict]:
+        now = time.time()
+        return [
+            {
+                "cookie": lease.cookie,
+                "owner": lease.owner,
+                "leased_seconds": round(now - lease.leased_at, 1),
+                "expires_in": round(lease.expire_at - now, 1),
+            }
+            for state in self._accounts.values() for lease in state.leases
+        ]
+
+    # 回收过期租约：本进程内超时未归还的租约，以及数据库中其他进程遗留的过期租约（只由 leader 执行）
+    async def reap(self) -> int:
+        now = time.time()
+        expired = [lease for state in self._accounts.values()
+                   for lease in state.leases if lease.expire_at < now]
+        for lease in expired:
+            logger.warning(f"Cookie 租约超时未归还，已回收：{lease.cookie[:32]}...")
+            await self.release(lease)
+
+        # 冷却结束的账号恢复分配
+        for cookie in cookie_health.expire_quarantine():
+            self.refresh(cookie)
+
+        # 共享租约存储中的键自带过期时间，无需回收数据库；数据库中的过期租约只由 leader 回收
+        if self.store.shared or not leader_elector.is_leader:
+            return len(expired)
+        rows_reaped = await self.db_manager.reap_expired_leases(self.lease_ttl)
+        if rows_reaped:
+            logger.info(f"回收数据库中过期的 cookie 租约 {rows_reaped} 个")
+            await self.reconcile()
+        return len(expired) + (rows_reaped or 0)
+
+    # 与数据库对账：新增、删除账号，以及同步管理端修改的 count
+    async def reconcile(self):
+        since = write_behind.last_op
+        rows = await self.db_manager.get_cookie_states()
+        seen = set()
+        for row in rows:
+            cookie = row['cookie']
+            count = row['count'] if row['count'] is not None else 0
+            seen.add(cookie)
+            state = self._accounts.get(cookie)
+            if state is None:
+                if write_behind.deleting(cookie):
+                    # 已删除的账号在删除写入数据库之前不能重新加入
+                    continue
+                state = self._accounts[cookie] = AccountState(cookie, count)
+            elif write_behind.dirty(cookie, since):
+                # 还有未写入或查询期间刚写入的修改，数据库中的值已过时
+                continue
+
+            # 数据库中的占用数减去本进程的租约即为其他进程占用的槽位；
+            # 使用共享租约存储时由它判断，对账后重新尝试被其他节点占满的账号
+            active = row.get('active_leases') or 0
+            if not active and (row['songID'] is not None or row['songID2'] is not None):
+                active = 1
+            remote = 0 if self.store.shared else max(0, active - len(state.leases))
+            if cookie not in self._ready or state.count != count or state.remote != remote:
+                state.count = count
+                state.remote = remote
+                self._ready.discard(cookie)
+                self._push(state)
+
+        for cookie in list(self._accounts):
+            if cookie not in seen:
+                self.discard(cookie)
+        write_behind.reconciled(since)
+
+    async def _reconcile_loop(self):
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error(f"Cookie 分配器对账失败：{e}")
+
+    async def _reap_loop(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                await self.reap()
+            except Exception as e:
+                logger.error(f"Cookie 租约回收失败：{e}")
+
+
+cookie_allocator = CookieAllocator()
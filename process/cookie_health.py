@@ -0,0 +1,132 @@
+import time
+from typing import Dict, List, Optional
+
+from util.config import (HEALTH_ALPHA, HEALTH_DEGRADED_SCORE, HEALTH_QUARANTINE_FAILURES,
+                         HEALTH_COOLDOWN, HEALTH_COOLDOWN_MAX)
+from util.logger import logger
+
+
+class AccountHealth:
+    """单个账号最近的生成结果统计"""
+    __slots__ = ("cookie", "score", "latency", "captcha_rate", "successes", "failures",
+                 "consecutive_failures", "strikes", "quarantined_until", "last_error", "last_error_at")
+
+    def __init__(self, cookie: str):
+        self.cookie = cookie
+        # 成功率、生成耗时（秒）和每次生成遇到的验证码次数，均为指数移动平均
+        self.score = 1.0
+        self.latency: Optional[float] = None
+        self.captcha_rate = 0.0
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        # 被隔离的次数，决定下次冷却时间，成功后清零
+        self.strikes = 0
+        self.quarantined_until = 0.0
+        self.last_error: Optional[str] = None
+        self.last_error_at: Optional[float] = None
+
+
+class CookieHealth:
+    """
+    根据真实的生成结果给账号打分
+    健康度低或频繁遇到验证码的账号排在后面分配；连续失败的账号被隔离，
+    冷却时间按隔离次数指数增长，冷却结束后再失败一次就会重新隔离，成功一次即恢复
+    """
+
+    def __init__(self, alpha: float = HEALTH_ALPHA, degraded_score: float = HEALTH_DEGRADED_SCORE,
+                 max_failures: int = HEALTH_QUARANTINE_FAILURES, cooldown: float = HEALTH_COOLDOWN,
+                 cooldown_max: float = HEALTH_COOLDOWN_MAX):
+        self.alpha = alpha
+        self.degraded_score = degraded_score
+        self.max_failures = max(1, max_failures)
+        self.cooldown = cooldown
+        self.cooldown_max = cooldown_max
+        self._accounts: Dict[str, AccountHealth] = {}
+        # 正在隔离的账号及冷却结束时间
+        self._quarantined: Dict[str, float] = {}
+
+    def _get(self, cookie: str) -> AccountHealth:
+        health = self._accounts.get(cookie)
+        if health is None:
+            health = self._accounts[cookie] = AccountHealth(cookie)
+        return health
+
+    def _observe(self, health: AccountHealth, ok: bool, captchas: int):
+        health.score += self.alpha * (float(ok) - health.score)
+        health.captcha_rate += self.alpha * (captchas - health.captcha_rate)
+
+    def record_success(self, cookie: str, latency: float, captchas: int = 0):
+        health = self._get(cookie)
+        self._observe(health, True, captchas)
+        health.latency = latency if health.latency is None else health.latency + self.alpha * (latency - health.latency)
+        health.successes += 1
+        health.consecutive_failures = 0
+        health.strikes = 0
+
+    # 记录一次失败，账号因此被隔离时返回 True
+    def record_failure(self, cookie: str, error: str, captchas: int = 0) -> bool:
+        health = self._get(cookie)
+        self._observe(health, False, captchas)
+        health.failures += 1
+        health.consecutive_failures += 1
+        health.last_error = error[:500]
+        health.last_error_at = time.time()
+        if health.consecutive_failures < self.max_failures or cookie in self._quarantined:
+            return False
+        cooldown = min(self.cooldown * 2 ** health.strikes, self.cooldown_max)
+        health.strikes += 1
+        health.quarantined_until = time.time() + cooldown
+        self._quarantined[cookie] = health.quarantined_until
+        logger.warning(f"账号连续失败 {health.consecutive_failures} 次，隔离 {cooldown:.0f} 秒：{cookie[:32]}...")
+        return True
+
+    def available(self, cookie: str) -> bool:
+        return cookie not in self._quarantined
+
+    # 分配优先级，0 为健康，1 为降级
+    def tier(self, cookie: str) -> int:
+        health = self._accounts.get(cookie)
+        if health is None:
+            return 0
+        return int(health.score < self.degraded_score or health.captcha_rate >= 1)
+
+    # 结束已到期的隔离，返回恢复的账号
+    def expire_quarantine(self) -> List[str]:
+        now = time.time()
+        released = [cookie for cookie, until in self._quarantined.items() if until <= now]
+        for cookie in released:
+            del self._quarantined[cookie]
+        return released
+
+    # 手动解除隔离并清空统计
+    def reset(self, cookie: str) -> bool:
+        self._quarantined.pop(cookie, None)
+        return self._accounts.pop(cookie, None) is not None
+
+    def forget(self, cookie: str):
+        self._quarantined.pop(cookie, None)
+        self._accounts.pop(cookie, None)
+
+    def status(self) -> List[dict]:
+        now = time.time()
+        return sorted((
+            {
+                "cookie": health.cookie,
+                "score": round(health.score, 3),
+                "tier": self.tier(health.cookie),
+                "latency": round(health.latency, 1) if health.latency is not None else None,
+                "captcha_rate": round(health.captcha_rate, 2),
+                "successes": health.successes,
+                "failures": health.failures,
+                "consecutive_failures": health.consecutive_failures,
+                "quarantined_for": round(max(health.quarantined_until - now, 0), 1)
+                if health.cookie in self._quarantined else 0,
+                "last_error": health.last_error,
+                "last_error_at": health.last_error_at,
+            }
+            for health in self._accounts.values()
+        ), key=lambda item: item["score"])
+
+
+cookie_health = CookieHealth()
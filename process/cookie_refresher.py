@@ -0,0 +1,213 @@
+import asyncio
+import heapq
+import itertools
+import math
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+from util.config import (COOKIE_REFRESH_INTERVAL, COOKIE_REFRESH_TICK, COOKIE_REFRESH_SLICE,
+                         COOKIE_REFRESH_USED_DELAY, COOKIE_REFRESH_LOW_COUNT)
+from process.write_behind import write_behind
+from util.logger import logger
+
+
+class RefreshState:
+    """单个账号的刷新状态"""
+    __slots__ = ("cookie", "count", "checked", "used", "uses", "due", "total_uses", "base_uses")
+
+    def __init__(self, cookie: str, count: int, checked: float, total_uses: int = 0):
+        self.cookie = cookie
+        self.count = count
+        # 上次刷新的时间
+        self.checked = checked
+        # 上次使用的时间及刷新后的使用次数
+        self.used = 0.0
+        self.uses = 0
+        self.due = 0.0
+        # 数据库中累计的使用次数，以及上次刷新时的累计值
+        self.total_uses = total_uses
+        self.base_uses = total_uses
+
+
+class CookieRefresher:
+    """
+    增量刷新 cookie 剩余次数
+    按下次应刷新的时间建立小顶堆，每个周期只刷新少量到期的账号，把查询分散到整个刷新周期内；
+    刚被使用过、预计很快用完或剩余次数很少的账号会提前到期；
+    只有 leader 运行刷新，各 worker 的使用记录和刷新请求经 write_behind 写入数据库，由 leader 同步时读取
+    """
+
+    def __init__(self, interval: float = COOKIE_REFRESH_INTERVAL, tick: float = COOKIE_REFRESH_TICK,
+                 slice_size: int = COOKIE_REFRESH_SLICE, used_delay: float = COOKIE_REFRESH_USED_DELAY,
+                 low_count: int = COOKIE_REFRESH_LOW_COUNT, sync_interval: float = 60):
+        self.interval = interval
+        self.tick = tick
+        self.slice_size = slice_size
+        self.used_delay = used_delay
+        self.low_count = low_count
+        self.sync_interval = sync_interval
+        self.db_manager = None
+        self.processor = None
+        self._states: Dict[str, RefreshState] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self._last_sync = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    # 启动后台刷新，processor 为 processCookies 实例，与管理接口共用并发上限
+    async def start(self, db_manager, processor):
+        self.db_manager = db_manager
+        self.processor = processor
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _due(self, state: RefreshState) -> float:
+        if not state.checked:
+            return 0.0
+        due = state.checked + self.interval
+        if state.uses:
+            # 按刷新后的使用速度估算用完的时间
+            remaining = state.count - state.uses
+            rate = state.uses / max(state.used - state.checked, 1.0)
+            exhausted = state.used + max(remaining, 0) / rate
+            due = min(due, max(state.used + self.used_delay, min(state.checked + self.interval / 2, exhausted)))
+        if 0 <= state.count <= self.low_count:
+            due = min(due, state.checked + self.interval / 4)
+        return due
+
+    def _schedule(self, state: RefreshState):
+        state.due = self._due(state)
+        heapq.heappush(self._heap, (state.due, next(self._seq), state.cookie))
+        # 堆中失效条目过多时重建
+        if len(self._heap) > 2 * len(self._states) + 64:
+            self._heap = [(s.due, next(self._seq), s.cookie) for s in self._states.values()]
+            heapq.heapify(self._heap)
+
+    # 记录账号被使用，使其提前刷新
+    def mark_used(self, cookie: str):
+        write_behind.use(cookie)
+        state = self._states.get(cookie)
+        if state is None:
+            return
+        state.used = time.time()
+        state.uses += 1
+        self._schedule(state)
+
+    # 让账号在下一个周期立即刷新（例如上游返回积分不足）
+    def refresh_soon(self, cookie: str):
+        write_behind.request_refresh(cookie)
+        state = self._states.get(cookie)
+        if state is None:
+            return
+        # 视为从未刷新过，刷新之前的重新排期都不会把它推迟
+        state.checked = 0.0
+        self._schedule(state)
+
+    # 与数据库同步账号列表和剩余次数
+    async def sync(self):
+        rows = await self.db_manager.get_cookie_states()
+        now = time.time()
+        seen = set()
+        for row in rows:
+            cookie = row['cookie']
+            count = row['count'] if row['count'] is not None else 0
+            total_uses = row.get('uses') or 0
+            seen.add(cookie)
+            state = self._states.get(cookie)
+            if state is None:
+                # 上次刷新时间未知，随机打散到整个周期内，避免集中刷新
+                state = self._states[cookie] = RefreshState(cookie, count, now - random.uniform(0, self.interval),
+                                                            total_uses)
+                self._schedule(state)
+                continue
+
+            changed = state.count != count
+            state.count = count
+            # 其他 worker 的使用记录，本进程已计入的部分不重复计算
+            state.total_uses = total_uses
+            if total_uses - state.base_uses > state.uses:
+                state.uses = total_uses - state.base_uses
+                state.used = max(state.used, row.get('used_at') or 0.0)
+                changed = True
+            # 上次刷新之后有 worker 请求尽快刷新
+            if state.checked and (row.get('refresh_at') or 0.0) > state.checked:
+                state.checked = 0.0
+                changed = True
+            if changed:
+                self._schedule(state)
+        for cookie in list(self._states):
+            if cookie not in seen:
+                del self._states[cookie]
+        self._last_sync = now
+
+    # 每个周期最多刷新的数量，至少要能在一个刷新周期内把所有账号刷新一遍
+    @property
+    def batch_size(self) -> int:
+        return max(self.slice_size, math.ceil(len(self._states) * self.tick / self.interval))
+
+    # 取出最多 batch_size 个已到期的账号
+    def _take_due(self, now: float) -> List[str]:
+        cookies = []
+        limit = self.batch_size
+        while self._heap and len(cookies) < limit:
+            due, _, cookie = self._heap[0]
+            state = self._states.get(cookie)
+            if state is None or state.due != due:
+                heapq.heappop(self._heap)
+                continue
+            if due > now:
+                break
+            heapq.heappop(self._heap)
+            cookies.append(cookie)
+        return cookies
+
+    # 刷新一批到期的账号，返回刷新的数量
+    async def refresh_due(self) -> int:
+        now = time.time()
+        if now - self._last_sync >= self.sync_interval:
+            await self.sync()
+
+        cookies = self._take_due(now)
+        if not cookies:
+            return 0
+
+        success = 0
+        async for cookie, result in self.processor.refresh_add_cookie(cookies, False, upsert=False):
+            success += bool(result)
+            state = self._states.get(cookie)
+            if state is not None:
+                state.checked = time.time()
+                state.uses = 0
+                state.base_uses = state.total_uses
+                self._schedule(state)
+        logger.info(f"增量刷新 cookies：{success}/{len(cookies)} 个成功")
+        return len(cookies)
+
+    # 刷新队列状态
+    def stats(self) -> dict:
+        now = time.time()
+        return {
+            "accounts": len(self._states),
+            "due": sum(1 for state in self._states.values() if state.due <= now),
+            "interval": self.interval,
+            "tick": self.tick,
+            "slice_size": self.batch_size,
+        }
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh_due()
+            except Exception as e:
+                logger.error(f"增量刷新 cookies 失败：{e}")
+            await asyncio.sleep(self.tick)
+
+
+cookie_refresher = CookieRefresher()
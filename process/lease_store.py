@@ -0,0 +1,84 @@
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Tuple
+
+from util.config import LEASE_BACKEND, LEASE_REDIS_URL
+
+
+class LeaseStore(ABC):
+    """
+    租约存储协议，语义同 Redis 的 SET NX PX：
+    acquire 只在键不存在（或已过期）时写入 token 并设置过期时间，
+    release 只在键的值仍是自己的 token 时删除，过期后被别人重新占用的键不会被误删
+    """
+
+    # 为 True 时多个网关节点共用同一份租约，数据库只记录账号和次数
+    shared = False
+
+    @abstractmethod
+    async def acquire(self, key: str, token: str, ttl: float) -> bool: ...
+
+    @abstractmethod
+    async def release(self, key: str, token: str) -> bool: ...
+
+    async def close(self):
+        pass
+
+
+class LocalLeaseStore(LeaseStore):
+    """进程内的租约存储，只在单个进程内互斥，租约状态仍由数据库在进程间同步"""
+
+    def __init__(self):
+        self._keys: Dict[str, Tuple[str, float]] = {}
+
+    async def acquire(self, key: str, token: str, ttl: float) -> bool:
+        now = time.monotonic()
+        held = self._keys.get(key)
+        if held is not None and held[1] > now:
+            return False
+        self._keys[key] = (token, now + ttl)
+        return True
+
+    async def release(self, key: str, token: str) -> bool:
+        held = self._keys.get(key)
+        if held is None or held[0] != token:
+            return False
+        del self._keys[key]
+        return True
+
+
+class RedisLeaseStore(LeaseStore):
+    """基于 Redis 的租约存储，多个网关节点共享同一个账号池"""
+
+    shared = True
+
+    # 比较并删除，保证只删除自己持有的键
+    RELEASE_SCRIPT = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then
+            return redis.call('del', KEYS[1])
+        end
+        return 0
+    """
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        self.client = redis.from_url(url, decode_responses=True)
+        self._release = self.client.register_script(self.RELEASE_SCRIPT)
+
+    async def acquire(self, key: str, token: str, ttl: float) -> bool:
+        return bool(await self.client.set(key, token, nx=True, px=int(ttl * 1000)))
+
+    async def release(self, key: str, token: str) -> bool:
+        return bool(await self._release(keys=[key], args=[token]))
+
+    async def close(self):
+        await self.client.aclose()
+
+
+# 根据 LEASE_BACKEND 创建租约存储
+def create_lease_store() -> LeaseStore:
+    if LEASE_BACKEND == "redis":
+        return RedisLeaseStore(LEASE_REDIS_URL)
+    if LEASE_BACKEND != "local":
+        raise ValueError(f"不支持的 LEASE_BACKEND：{LEASE_BACKEND}")
+    return LocalLeaseStore()
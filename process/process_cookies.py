@@ -1,94 +1,92 @@
 import asyncio
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import AsyncIterator, Dict, Iterable, Optional, Tuple
 
 from suno.suno import SongsGen
+from util.config import CAPSOLVER_APIKEY, BATCH_SIZE
 from util.logger import logger
-from util.sql_uilts import DatabaseManager
 
 
 class processCookies:
-    def __init__(self, sql_IP, sql_dk, user_name, sql_password, sql_name):
-        self.host = sql_IP
-        self.port = sql_dk
-        self.user = user_name
-        self.password = sql_password
-        self.db_name = sql_name
+    """
+    添加或刷新cookie
+    直接运行在主事件循环上，共用主程序的数据库连接池和HTTP连接池，
+    通过信号量限制同时查询的账号数，结果按完成顺序返回，查询到的次数攒批写入数据库
+    """
 
+    def __init__(self, db_manager, concurrency: int = BATCH_SIZE, flush_size: int = 100):
+        self.db_manager = db_manager
+        self.concurrency = concurrency
+        self.flush_size = flush_size
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # 定时任务和管理接口同时刷新时共用同一个并发上限
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    # 异步任务, 查询cookie的剩余次数，返回 (是否成功, 需要写入数据库的次数)
     @staticmethod
-    # 异步任务, 添加或刷新cookie
-    async def cookies_task(db_manage, cookie, is_insert):
+    async def cookies_task(cookie, is_insert) -> Tuple[bool, Optional[int]]:
         tem_word = "添加" if is_insert else "刷新"
         remaining_count = -1
         song_gen = None
         try:
-            song_gen = SongsGen(cookie)
+            song_gen = SongsGen(cookie, CAPSOLVER_APIKEY)
             remaining_count = await song_gen.get_limit_left()
             if remaining_count == -1 and is_insert:
                 logger.info(f"该账号剩余次数: {remaining_count}，添加失败！")
-                return False
+                return False, None
             else:
-                await db_manage.insert_or_update_cookie(cookie=cookie, count=remaining_count)
-                return True
+                return True, remaining_count
         except Exception as e:
             if not is_insert:
-                await db_manage.insert_or_update_cookie(cookie=cookie, count=remaining_count)
                 logger.error(f"{tem_word}成功，已将改cookie禁用：{e}")
-                return False
+                return False, remaining_count
             else:
                 raise RuntimeError(f"该账号剩余次数: {remaining_count}，添加失败")
         finally:
             if song_gen is not None:
-                await song_gen.close_session()
+                await song_gen.close()
 
-    # 在当前线程的事件循环中运行任务添加或刷新cookie
-    def fetch_limit_left_async(self, cookie, is_insert):
-        db_manage = DatabaseManager(self.host, self.port, self.user, self.password, self.db_name)
-        result = False
-        loop = asyncio.new_event_loop()
-        try:
-            asyncio.set_event_loop(loop)
-            result = loop.run_until_complete(self.cookies_task(db_manage, cookie, is_insert))
-        except Exception as e:
-            result = False
-            logger.error(str(e) + "：" + cookie)
-        finally:
-            loop.run_until_complete(db_manage.close_db_pool())
-            loop.close()
-            return result
+    async def _run(self, cookie, is_insert) -> Tuple[str, bool, Optional[int]]:
+        async with self.semaphore:
+            try:
+                return (cookie, *await self.cookies_task(cookie, is_insert))
+            except Exception as e:
+                logger.error(str(e) + "：" + cookie)
+                return cookie, False, None
 
-    # 添加或刷新cookie，多线程
-    def refresh_add_cookie(self, cookies, batch_size, is_insert):
-        # 使用 ThreadPoolExecutor 管理多线程
+    async def _flush(self, counts: Dict[str, int], upsert: bool):
+        if not counts:
+            return
         try:
-            with ThreadPoolExecutor(max_workers=batch_size) as executor:
-                # 提交任务到线程池
-                futures = [
-                    executor.submit(self.fetch_limit_left_async, str(cookie).strip(), is_insert) for cookie in cookies]
-                results = []
-                # 获取并处理结果
-                for future in as_completed(futures):
-                    results.append(future.result())
-                return results
+            if upsert:
+                await self.db_manager.upsert_cookies_bulk(list(counts.items()))
+            else:
+                await self.db_manager.update_counts_bulk(counts)
         except Exception as e:
-            logger.error(f"refresh_add_cookie提交线程失败：{e}")
-            return None
+            logger.error(f"批量写入 cookies 次数失败：{e}")
+        counts.clear()
 
-    # 添加cookie的函数
-    # @staticmethod
-    # async def fetch_limit_left(db_manager, cookie, is_insert: bool = False):
-    #     tem_word = "添加" if is_insert else "刷新"
-    #     song_gen = None
-    #     try:
-    #         song_gen = SongsGen(cookie)
-    #         remaining_count = await song_gen.get_limit_left()
-    #         if remaining_count == -1 and is_insert:
-    #             logger.info(f"该账号剩余次数: {remaining_count}，添加失败！")
-    #             return False
-    #         logger.info(f"该账号剩余次数: {remaining_count}，{tem_word}成功！")
-    #         await db_manager.insert_or_update_cookie(cookie=cookie, count=remaining_count)
-    #         return True
-    #     except Exception as e:
-    #         logger.error(cookie + f"，{tem_word}失败：{e}")
-    #         return False
-    #     finally:
-    #         await song_gen.close_session()
+    # 添加或刷新cookie，按完成顺序逐个返回 (cookie, 是否成功)
+    # upsert 为 False 时只更新已存在的账号，不会把刷新期间被删除的账号重新插入
+    async def refresh_add_cookie(self, cookies: Iterable[str], is_insert: bool,
+                                 upsert: bool = True) -> AsyncIterator[Tuple[str, bool]]:
+        tasks = [asyncio.create_task(self._run(str(cookie).strip(), is_insert)) for cookie in cookies]
+        counts: Dict[str, int] = {}
+        try:
+            for future in asyncio.as_completed(tasks):
+                cookie, result, count = await future
+                if count is not None:
+                    counts[cookie] = count
+                    if len(counts) >= self.flush_size:
+                        await self._flush(counts, upsert)
+                yield cookie, result
+        finally:
+            # 调用方提前退出（例如客户端断开）时取消剩余任务，已查询到的结果仍然写入
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._flush(counts, upsert)
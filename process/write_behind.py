@@ -0,0 +1,193 @@
+import asyncio
+import itertools
+import time
+from typing import Dict, Optional
+
+from util.config import WRITE_BEHIND_INTERVAL
+from util.logger import logger
+
+
+class CookieDelta:
+    """单个账号待写入数据库的合并修改"""
+    __slots__ = ("acquired", "released", "count_set", "count_delta", "owner", "ttl", "invalidated",
+                 "uses", "used_at", "refresh_at")
+
+    def __init__(self):
+        self.acquired = 0
+        self.released = 0
+        # count 先被设置为 count_set（如果有），再减去 count_delta
+        self.count_set: Optional[int] = None
+        self.count_delta = 0
+        self.owner: Optional[str] = None
+        self.ttl = 0
+        self.invalidated = False
+        # 供 leader 上的 cookie_refresher 排期：使用次数、最近使用时间和请求尽快刷新的时间
+        self.uses = 0
+        self.used_at = 0.0
+        self.refresh_at = 0.0
+
+    # 把更晚的修改 later 合并进来
+    def merge(self, later: "CookieDelta"):
+        self.acquired += later.acquired
+        self.released += later.released
+        if later.count_set is not None:
+            self.count_set = later.count_set
+            self.count_delta = later.count_delta
+        else:
+            self.count_delta += later.count_delta
+        self.owner = later.owner or self.owner
+        self.ttl = max(self.ttl, later.ttl)
+        self.invalidated = self.invalidated or later.invalidated
+        self.uses += later.uses
+        self.used_at = max(self.used_at, later.used_at)
+        self.refresh_at = max(self.refresh_at, later.refresh_at)
+
+
+class WriteBehindQueue:
+    """
+    cookie 状态的延迟写入队列
+    租用、归还、次数修改和失效删除只在内存中按账号合并，后台每隔 interval 秒在一个事务内批量写入；
+    写入失败的修改会合并回队列重试，关闭时写完所有修改再退出
+    """
+
+    def __init__(self, interval: float = WRITE_BEHIND_INTERVAL, drain_attempts: int = 10):
+        self.interval = interval
+        self.drain_attempts = drain_attempts
+        self.db_manager = None
+        self._pending: Dict[str, CookieDelta] = {}
+        self._inflight: Dict[str, CookieDelta] = {}
+        # 每个账号最近一次修改的序号，用于判断对账读到的数据是否已过时
+        self._touched: Dict[str, int] = {}
+        self._ops = itertools.count(1)
+        self._last_op = 0
+        # 最近一次完成对账时的序号，不晚于它的 _touched 记录不会再被用到
+        self._reconciled = 0
+        # 定时写入与管理接口触发的立即写入不能同时进行
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, db_manager):
+        self.db_manager = db_manager
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    # 停止定时写入，并把剩余的修改全部写完
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for attempt in range(self.drain_attempts):
+            if not self._pending:
+                return
+            if await self.flush():
+                continue
+            await asyncio.sleep(min(2 ** attempt * 0.1, 5))
+        if self._pending:
+            logger.error(f"关闭时仍有 {len(self._pending)} 个账号的状态未能写入数据库")
+
+    def _delta(self, cookie: str) -> CookieDelta:
+        self._last_op = next(self._ops)
+        self._touched[cookie] = self._last_op
+        delta = self._pending.get(cookie)
+        if delta is None:
+            delta = self._pending[cookie] = CookieDelta()
+        return delta
+
+    # 当前的修改序号，对账前记录，之后用 dirty 判断账号是否被改过
+    @property
+    def last_op(self) -> int:
+        return self._last_op
+
+    def dirty(self, cookie: str, since: int) -> bool:
+        return cookie in self._pending or cookie in self._inflight or self._touched.get(cookie, 0) > since
+
+    # 对账以 since 为起点读取完成，之后的写入可以清理更早的 _touched 记录
+    def reconciled(self, since: int):
+        self._reconciled = max(self._reconciled, since)
+
+    # 账号的删除还在队列中，尚未写入数据库
+    def deleting(self, cookie: str) -> bool:
+        delta = self._pending.get(cookie) or self._inflight.get(cookie)
+        return delta is not None and delta.invalidated
+
+    def lease(self, cookie: str, owner: str, ttl: float):
+        delta = self._delta(cookie)
+        delta.acquired += 1
+        delta.count_delta += 1
+        delta.owner = owner
+        delta.ttl = max(delta.ttl, int(ttl))
+
+    # 只扣减次数，租约由共享的租约存储记录
+    def consume(self, cookie: str):
+        self._delta(cookie).count_delta += 1
+
+    def release(self, cookie: str):
+        self._delta(cookie).released += 1
+
+    def set_count(self, cookie: str, count: int):
+        delta = self._delta(cookie)
+        delta.count_set = count
+        delta.count_delta = 0
+
+    # 记录一次使用，由 leader 同步后提前刷新
+    def use(self, cookie: str):
+        delta = self._delta(cookie)
+        delta.uses += 1
+        delta.used_at = time.time()
+
+    # 请求 leader 尽快刷新账号
+    def request_refresh(self, cookie: str):
+        self._delta(cookie).refresh_at = time.time()
+
+    # 删除账号，之前尚未写入的修改一并丢弃
+    def invalidate(self, cookie: str):
+        self._delta(cookie).invalidated = True
+
+    # 写入当前积累的所有修改，成功返回 True
+    async def flush(self) -> bool:
+        async with self._flush_lock:
+            return await self._flush()
+
+    def _prune(self):
+        if self._reconciled:
+            for cookie in [cookie for cookie, op in self._touched.items() if op <= self._reconciled]:
+                del self._touched[cookie]
+            self._reconciled = 0
+
+    async def _flush(self) -> bool:
+        self._prune()
+        if not self._pending:
+            return True
+        self._inflight, self._pending = self._pending, {}
+        try:
+            await self.db_manager.apply_cookie_writes(
+                [(cookie, delta.acquired, delta.released, delta.count_set, delta.count_delta, delta.owner, delta.ttl,
+                  delta.uses, delta.used_at, delta.refresh_at)
+                 for cookie, delta in self._inflight.items() if not delta.invalidated],
+                [cookie for cookie, delta in self._inflight.items() if delta.invalidated],
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Cookie 状态批量写入失败，稍后重试：{e}")
+            # 失败的修改比队列中新的修改更早，合并时以新的修改为准
+            for cookie, delta in self._pending.items():
+                if cookie in self._inflight:
+                    self._inflight[cookie].merge(delta)
+                else:
+                    self._inflight[cookie] = delta
+            self._pending = self._inflight
+            return False
+        finally:
+            self._inflight = {}
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Cookie 状态批量写入失败：{e}")
+
+
+write_behind = WriteBehindQueue()
@@ -3,7 +3,10 @@ Suno AI API Client
 """
 
 from .suno import SongsGen
+from .token_manager import TokenManager, token_manager
+from .captcha_pool import CaptchaPool, captcha_pool
 from .constants import CLERK_API_VERSION, CLERK_JS_VERSION, URLs, CaptchaConfig, DEFAULT_HEADERS
 
 __version__ = "0.2.1"
-__all__ = ["SongsGen", "CLERK_API_VERSION", "CLERK_JS_VERSION", "URLs", "CaptchaConfig", "DEFAULT_HEADERS"] 
\ No newline at end of file
+__all__ = ["SongsGen", "TokenManager", "token_manager", "CaptchaPool", "captcha_pool", "CLERK_API_VERSION",
+           "CLERK_JS_VERSION", "URLs", "CaptchaConfig", "DEFAULT_HEADERS"] 
\ No newline at end of file
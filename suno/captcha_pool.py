@@ -0,0 +1,178 @@
+"""
+验证码池模块
+按账号/站点密钥预先求解Turnstile验证码，401时直接取用现成token
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Mapping, Optional, Set, Tuple
+
+from util.config import (CAPTCHA_POOL_SIZE, CAPTCHA_TOKEN_TTL,
+                         CAPTCHA_CONCURRENCY, CAPTCHA_IDLE_TIMEOUT)
+from util.http_pool import HttpSessionPool
+from util.logger import logger
+
+# (combination_index, cookies) -> token，与 SongsGen.get_captcha_token 签名一致
+CaptchaSolver = Callable[[int, Optional[Mapping[str, str]]], Awaitable[Optional[str]]]
+
+
+class CaptchaEntry:
+    """单个账号+站点密钥组合的验证码缓存"""
+    __slots__ = ("combination_index", "cookies", "solver", "tokens", "inflight", "last_used", "armed")
+
+    def __init__(self, combination_index: int, cookies: Optional[Mapping[str, str]], solver: CaptchaSolver):
+        self.combination_index = combination_index
+        self.cookies = cookies
+        self.solver = solver
+        self.tokens: Deque[Tuple[str, float]] = deque()
+        self.inflight: Set[asyncio.Task] = set()
+        self.last_used = time.monotonic()
+        # 是否需要后台预求解，预求解的token未被使用就过期后关闭，下次取用时重新开启
+        self.armed = True
+
+    # 丢弃过期的token，返回丢弃数量
+    def drop_expired(self, ttl: float) -> int:
+        now = time.monotonic()
+        dropped = 0
+        while self.tokens and now - self.tokens[0][1] > ttl:
+            self.tokens.popleft()
+            dropped += 1
+        return dropped
+
+
+class CaptchaPool:
+    """
+    验证码预求解池
+    遇到过401的账号会被标记为热点，后台在并发上限内持续补足可用token；
+    预求解的token未被使用就过期时停止该账号的预求解，直到再次取用，
+    空闲账号每次401最多多花费 size 次求解；
+    池中没有可用token时走冷路径，在请求内同步求解
+    """
+
+    def __init__(self, size: int = CAPTCHA_POOL_SIZE, ttl: float = CAPTCHA_TOKEN_TTL,
+                 concurrency: int = CAPTCHA_CONCURRENCY, idle_timeout: float = CAPTCHA_IDLE_TIMEOUT,
+                 interval: float = 2):
+        self.size = size
+        self.ttl = ttl
+        self.concurrency = concurrency
+        self.idle_timeout = idle_timeout
+        self.interval = interval
+        self._entries: Dict[Tuple[str, int], CaptchaEntry] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        # 求解与消耗统计，用于观察预求解的成本
+        self.presolved = 0
+        self.consumed = 0
+        self.expired = 0
+        self.sync_solved = 0
+
+    async def start(self) -> None:
+        """启动后台补充任务"""
+        if self._task is None or self._task.done():
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._task = asyncio.create_task(self._replenish_loop())
+
+    async def close(self) -> None:
+        """停止后台任务并取消正在求解的验证码"""
+        tasks = [task for entry in self._entries.values() for task in entry.inflight]
+        if self._task is not None:
+            tasks.append(self._task)
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._entries.clear()
+
+    async def acquire(self, combination_index: int, cookies: Optional[Mapping[str, str]],
+                      solver: CaptchaSolver) -> Optional[str]:
+        """
+        获取一个可用的验证码token
+
+        Args:
+            combination_index: 站点密钥/站点URL组合序号
+            cookies: 账号cookie
+            solver: 实际求解验证码的协程函数
+
+        Returns:
+            验证码token或None(失败时)
+        """
+        key = (HttpSessionPool.cookie_key(cookies) if cookies else "", combination_index)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = CaptchaEntry(combination_index, cookies, solver)
+        entry.solver = solver
+        entry.last_used = time.monotonic()
+        entry.armed = True
+
+        token = self._pop(entry)
+        if token:
+            return token
+
+        # 冷路径：先等待后台正在求解的任务，仍然没有则同步求解
+        if entry.inflight:
+            await asyncio.wait(set(entry.inflight), return_when=asyncio.FIRST_COMPLETED)
+            token = self._pop(entry)
+            if token:
+                return token
+
+        logger.info("验证码池为空，同步求解验证码")
+        self.sync_solved += 1
+        return await solver(combination_index, cookies)
+
+    def stats(self) -> dict:
+        """预求解与消耗统计"""
+        return {
+            "presolved": self.presolved,
+            "consumed": self.consumed,
+            "expired": self.expired,
+            "sync_solved": self.sync_solved,
+            "entries": len(self._entries),
+            "armed": sum(1 for entry in self._entries.values() if entry.armed),
+            "pooled": sum(len(entry.tokens) for entry in self._entries.values()),
+        }
+
+    def _pop(self, entry: CaptchaEntry) -> Optional[str]:
+        self.expired += entry.drop_expired(self.ttl)
+        if not entry.tokens:
+            return None
+        self.consumed += 1
+        return entry.tokens.popleft()[0]
+
+    async def _solve(self, entry: CaptchaEntry) -> None:
+        async with self._semaphore:
+            try:
+                token = await entry.solver(entry.combination_index, entry.cookies)
+                if token:
+                    entry.tokens.append((token, time.monotonic()))
+                    self.presolved += 1
+            except Exception as e:
+                logger.error(f"预求解验证码失败: {e}")
+
+    async def _replenish_loop(self) -> None:
+        while True:
+            try:
+                now = time.monotonic()
+                for key, entry in list(self._entries.items()):
+                    expired = entry.drop_expired(self.ttl)
+                    if expired:
+                        # 预求解的token无人使用，停止为该账号继续付费求解
+                        self.expired += expired
+                        entry.armed = False
+                    if now - entry.last_used > self.idle_timeout and not entry.inflight:
+                        del self._entries[key]
+                        continue
+                    if not entry.armed:
+                        continue
+
+                    missing = self.size - len(entry.tokens) - len(entry.inflight)
+                    for _ in range(max(0, missing)):
+                        task = asyncio.create_task(self._solve(entry))
+                        entry.inflight.add(task)
+                        task.add_done_callback(entry.inflight.discard)
+            except Exception as e:
+                logger.error(f"验证码池补充失败: {e}")
+            await asyncio.sleep(self.interval)
+
+
+captcha_pool = CaptchaPool()
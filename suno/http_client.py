@@ -3,8 +3,8 @@ HTTP客户端模块
 处理所有HTTP请求、验证码和会话管理
 """
 
-import aiohttp
 from typing import Optional, Dict, Any, Callable
+from util.http_pool import http_pool
 from util.logger import logger
 from .constants import URLs, CLERK_API_VERSION, CLERK_JS_VERSION
 
@@ -76,7 +76,7 @@ class HttpClient:
             
             form_data = f'captcha_token={captcha_token}&captcha_widget_type=invisible'
             
-            async with aiohttp.ClientSession(cookies=self.cookies) as session:
+            async with http_pool.session(self.cookies) as session:
                 async with session.post(
                     url,
                     headers=headers,
@@ -122,7 +122,7 @@ class HttpClient:
             if 'headers' in kwargs:
                 headers.update(kwargs.pop('headers'))
             
-            async with aiohttp.ClientSession(cookies=self.cookies) as session:
+            async with http_pool.session(self.cookies) as session:
                 async with session.request(
                     method,
                     url,
@@ -169,7 +169,7 @@ class HttpClient:
             if 'headers' in kwargs:
                 headers.update(kwargs.pop('headers'))
             
-            async with aiohttp.ClientSession(cookies=self.cookies) as session:
+            async with http_pool.session(self.cookies) as session:
                 async with session.request(
                     method,
                     url,
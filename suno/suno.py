@@ -8,6 +8,8 @@ from fake_useragent import UserAgent
 from util.logger import logger
 from util import utils
 from util.config import PROXY
+from util.http_pool import http_pool
+from util.poll_scheduler import poll_scheduler
 from .constants import (
     URLs, DEFAULT_HEADERS, CaptchaConfig, 
     CLERK_API_VERSION, CLERK_JS_VERSION,
@@ -17,6 +19,7 @@ from .constants import (
     TaskStatus
 )
 from .http_client import HttpClient
+from .captcha_pool import captcha_pool
 import asyncio
 import aiohttp
 import uuid
@@ -54,10 +57,13 @@ class SongsGen:
         self.token_client = HttpClient(self.base_headers, self.cookie_dict, PROXY)
         self.request_client = HttpClient(self.base_headers, self.cookie_dict, PROXY)
         
-        # 设置验证码处理器
-        self.token_client.set_captcha_handler(self.get_captcha_token)
-        self.request_client.set_captcha_handler(self.get_captcha_token)
+        # 设置验证码处理器，优先从验证码池取预先求解好的token
+        self.token_client.set_captcha_handler(self.get_pooled_captcha_token)
+        self.request_client.set_captcha_handler(self.get_pooled_captcha_token)
         
+        # 本实例遇到验证码（401）的次数，用于账号健康度统计
+        self.captcha_count = 0
+
         # Clerk认证相关的实例变量
         self.auth_token: Optional[str] = None
         self.clerk_session_id: Optional[str] = None  # 用于URL的session id
@@ -353,7 +359,7 @@ class SongsGen:
             logger.info(data)
             
             # Make request
-            async with aiohttp.ClientSession() as session:
+            async with http_pool.session() as session:
                 try:
                     async with session.post(
                         f"{URLs.SUNO_BASE}/api/generate/v2/",
@@ -450,6 +456,11 @@ class SongsGen:
             logger.error(f"Traceback: {traceback.format_exc()}")
             return None, f"Failed to generate music: {str(e)}"
 
+    async def get_pooled_captcha_token(self, combination_index: int, cookies: Optional[Dict] = None) -> Optional[str]:
+        """Get a CAPTCHA token from the pre-solved pool, solving inline when the pool is empty"""
+        self.captcha_count += 1
+        return await captcha_pool.acquire(combination_index, cookies or self.cookie_dict, self.get_captcha_token)
+
     async def get_captcha_token(self, combination_index: int, cookies: Optional[Dict] = None) -> Optional[str]:
         """Get CAPTCHA token with improved error handling and cookie support"""
         try:
@@ -656,7 +667,7 @@ class SongsGen:
     async def check_task_status(
         self, 
         clip_ids: List[str], 
-        interval: int = 5, 
+        interval: Optional[float] = None, 
         timeout: int = 300,
         check_callback: Optional[callable] = None
     ) -> Optional[Dict]:
@@ -665,7 +676,7 @@ class SongsGen:
         
         Args:
             clip_ids: 要检查的歌曲ID列表
-            interval: 检查间隔（秒）
+            interval: 检查间隔（秒），为None时由自适应轮询调度决定
             timeout: 超时时间（秒）
             check_callback: 每次检查后的回调函数，接收当前状态作为参数
             
@@ -678,88 +689,96 @@ class SongsGen:
             
         start_time = asyncio.get_event_loop().time()
         retries = 0
+        for clip_id in clip_ids:
+            poll_scheduler.track(clip_id)
         
-        while True:
-            try:
-                # 检查是否超时
-                if asyncio.get_event_loop().time() - start_time > timeout:
-                    logger.error("Task status check timed out")
-                    return None
-                    
-                # 获取任务状态
-                feed_data = await self.get_feed(clip_ids)
-                if not feed_data:
-                    if retries >= MAX_RETRIES:
-                        logger.error("Max retries reached for task status check")
+        # 无论完成、超时还是出错，结束后都停止跟踪这些 clip
+        try:
+            while True:
+                try:
+                    # 检查是否超时
+                    if asyncio.get_event_loop().time() - start_time > timeout:
+                        logger.error("Task status check timed out")
                         return None
-                    retries += 1
-                    await asyncio.sleep(RETRY_DELAY)
-                    continue
                     
-                # 检查所有任务是否完成
-                clips = feed_data.get("clips", [])
-                all_completed = True
-                has_failed = False
-                status_summary = {}
+                    # 获取任务状态
+                    feed_data = await self.get_feed(clip_ids)
+                    if not feed_data:
+                        if retries >= MAX_RETRIES:
+                            logger.error("Max retries reached for task status check")
+                            return None
+                        retries += 1
+                        await asyncio.sleep(RETRY_DELAY)
+                        continue
+                    
+                    # 检查所有任务是否完成
+                    clips = feed_data.get("clips", [])
+                    all_completed = True
+                    has_failed = False
+                    status_summary = {}
                 
-                # 记录详细的响应信息
-                logger.info("-" * 50)
-                logger.info("Feed Response Details:")
-                for clip in clips:
-                    clip_id = clip.get("id")
-                    status = clip.get("status")
-                    status_summary[clip_id] = status
+                    # 记录详细的响应信息
+                    logger.info("-" * 50)
+                    logger.info("Feed Response Details:")
+                    for clip in clips:
+                        clip_id = clip.get("id")
+                        status = clip.get("status")
+                        status_summary[clip_id] = status
+                        poll_scheduler.observe(clip)
                     
-                    # 记录每个clip的详细信息
-                    logger.info(f"\nClip ID: {clip_id}")
-                    logger.info(f"Status: {status}")
-                    logger.info(f"Title: {clip.get('title')}")
-                    logger.info(f"Created At: {clip.get('created_at')}")
-                    logger.info(f"Updated At: {clip.get('updated_at')}")
+                        # 记录每个clip的详细信息
+                        logger.info(f"\nClip ID: {clip_id}")
+                        logger.info(f"Status: {status}")
+                        logger.info(f"Title: {clip.get('title')}")
+                        logger.info(f"Created At: {clip.get('created_at')}")
+                        logger.info(f"Updated At: {clip.get('updated_at')}")
                     
-                    # 如果有错误信息，记录错误
-                    if error := clip.get("error"):
-                        logger.error(f"Error: {error}")
+                        # 如果有错误信息，记录错误
+                        if error := clip.get("error"):
+                            logger.error(f"Error: {error}")
                         
-                    # 如果有其他重要信息，也记录下来
-                    if metadata := clip.get("metadata"):
-                        logger.info(f"Metadata: {metadata}")
+                        # 如果有其他重要信息，也记录下来
+                        if metadata := clip.get("metadata"):
+                            logger.info(f"Metadata: {metadata}")
                         
-                    if status not in TaskStatus.FINAL_STATES:
-                        all_completed = False
-                    elif status in TaskStatus.RETRIABLE_STATES:
-                        has_failed = True
+                        if status not in TaskStatus.FINAL_STATES:
+                            all_completed = False
+                        elif status in TaskStatus.RETRIABLE_STATES:
+                            has_failed = True
                         
-                logger.info("\nStatus Summary:")
-                for clip_id, status in status_summary.items():
-                    logger.info(f"{clip_id}: {status}")
-                logger.info("-" * 50)
+                    logger.info("\nStatus Summary:")
+                    for clip_id, status in status_summary.items():
+                        logger.info(f"{clip_id}: {status}")
+                    logger.info("-" * 50)
                 
-                # 调用回调函数
-                if check_callback:
-                    try:
-                        await check_callback(feed_data)
-                    except Exception as e:
-                        logger.error(f"Error in status check callback: {e}")
+                    # 调用回调函数
+                    if check_callback:
+                        try:
+                            await check_callback(feed_data)
+                        except Exception as e:
+                            logger.error(f"Error in status check callback: {e}")
                         
-                if all_completed:
-                    if has_failed:
-                        logger.warning("Some tasks failed or errored")
-                    else:
-                        logger.info("All tasks completed successfully")
-                    return feed_data
+                    if all_completed:
+                        if has_failed:
+                            logger.warning("Some tasks failed or errored")
+                        else:
+                            logger.info("All tasks completed successfully")
+                        return feed_data
                     
-                # 等待下一次检查
-                await asyncio.sleep(interval)
-                
-            except Exception as e:
-                logger.error(f"Error checking task status: {e}")
-                if retries >= MAX_RETRIES:
-                    logger.error("Max retries reached")
-                    return None
-                retries += 1
-                await asyncio.sleep(RETRY_DELAY)
+                    # 等待下一次检查
+                    await asyncio.sleep(interval if interval is not None else poll_scheduler.next_delay(clip_ids))
                 
+                except Exception as e:
+                    logger.error(f"Error checking task status: {e}")
+                    if retries >= MAX_RETRIES:
+                        logger.error("Max retries reached")
+                        return None
+                    retries += 1
+                    await asyncio.sleep(RETRY_DELAY)
+        finally:
+            for clip_id in clip_ids:
+                poll_scheduler.forget(clip_id)
+
     async def get_feed(self, ids: list[str], page: int = 5000) -> Optional[Dict]:
         """
         Get feed information for one or more songs with token refresh support
@@ -807,7 +826,7 @@ class SongsGen:
                 logger.debug(f"Request headers: {headers}")
                 
                 # Make request
-                async with aiohttp.ClientSession() as session:
+                async with http_pool.session() as session:
                     async with session.get(
                         URLs.FEED,
                         headers=headers,
@@ -931,7 +950,7 @@ class SongsGen:
             headers = self._get_common_headers()
             
             # Make request
-            async with aiohttp.ClientSession() as session:
+            async with http_pool.session() as session:
                 async with session.get(
                     f"{URLs.SUNO_BASE}/api/notification",
                     headers=headers,
@@ -974,7 +993,7 @@ class SongsGen:
             }
             
             # Make request
-            async with aiohttp.ClientSession() as session:
+            async with http_pool.session() as session:
                 async with session.post(
                     f"{URLs.SUNO_BASE}/api/c/check",
                     headers=headers,
@@ -0,0 +1,160 @@
+"""
+Token管理模块
+按账号缓存Clerk JWT，临近过期时通过sessions/tokens接口在后台续期
+"""
+
+import asyncio
+import base64
+import json
+import time
+from typing import Optional, Dict, TYPE_CHECKING
+
+from util.config import TOKEN_REFRESH_MARGIN
+from util.logger import logger
+from .constants import URLs, CLERK_API_VERSION, CLERK_JS_VERSION
+from .http_client import HttpClient
+
+if TYPE_CHECKING:
+    from .suno import SongsGen
+
+# 解析不出exp时按Clerk默认的60秒有效期估算
+DEFAULT_TOKEN_TTL = 60
+
+
+def decode_jwt_exp(jwt: str) -> Optional[float]:
+    """
+    解析JWT中的exp字段
+
+    Args:
+        jwt: JWT字符串
+
+    Returns:
+        过期时间戳(秒)或None(解析失败时)
+    """
+    try:
+        payload = jwt.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp")
+        return float(exp) if exp is not None else None
+    except Exception:
+        return None
+
+
+class AccountToken:
+    """单个账号的token缓存"""
+    __slots__ = ("jwt", "expires_at", "session_id", "client", "task")
+
+    def __init__(self):
+        self.jwt: Optional[str] = None
+        self.expires_at: float = 0
+        self.session_id: Optional[str] = None
+        self.client: Optional[HttpClient] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def set_jwt(self, jwt: str) -> None:
+        self.jwt = jwt
+        self.expires_at = decode_jwt_exp(jwt) or time.time() + DEFAULT_TOKEN_TTL
+
+
+class TokenManager:
+    """
+    按账号管理JWT
+    轮询时直接读取缓存，不产生网络请求；并发的刷新请求合并为一次；
+    token 过期后 idle_ttl 秒内没有再使用的账号会被清理
+    """
+
+    def __init__(self, refresh_margin: float = TOKEN_REFRESH_MARGIN, idle_ttl: float = 600):
+        self.refresh_margin = refresh_margin
+        self.idle_ttl = idle_ttl
+        self._entries: Dict[str, AccountToken] = {}
+        self._last_sweep = 0.0
+
+    async def get_token(self, account: str, song_gen: Optional["SongsGen"] = None) -> Optional[str]:
+        """
+        获取账号的有效token
+
+        Args:
+            account: 账号标识(cookie)
+            song_gen: 该账号的SongsGen实例，没有可用session时用于完整的verify认证
+
+        Returns:
+            JWT字符串或None(失败时)
+        """
+        now = time.time()
+        self._sweep(now)
+        entry = self._entries.get(account)
+        if entry is None:
+            entry = self._entries[account] = AccountToken()
+
+        if entry.jwt and now < entry.expires_at - self.refresh_margin:
+            # 即将过期时提前在后台续期，本次仍返回当前token
+            if now >= entry.expires_at - 2 * self.refresh_margin:
+                self._start_refresh(entry, song_gen)
+            return entry.jwt
+
+        return await asyncio.shield(self._start_refresh(entry, song_gen))
+
+    # 移除账号的缓存（例如账号已被删除）
+    def forget(self, account: str):
+        entry = self._entries.pop(account, None)
+        if entry is not None and entry.task is not None and not entry.task.done():
+            entry.task.cancel()
+
+    # 清理 token 过期已久且没有在刷新的账号，它们引用的 SongsGen 随之释放
+    def _sweep(self, now: float):
+        if now - self._last_sweep < self.idle_ttl / 10:
+            return
+        self._last_sweep = now
+        expire = now - self.idle_ttl
+        for account in [account for account, entry in self._entries.items()
+                        if entry.expires_at < expire and (entry.task is None or entry.task.done())]:
+            del self._entries[account]
+
+    def _start_refresh(self, entry: AccountToken, song_gen: Optional["SongsGen"]) -> asyncio.Task:
+        if entry.task is None or entry.task.done():
+            entry.task = asyncio.create_task(self._refresh(entry, song_gen))
+        return entry.task
+
+    async def _refresh(self, entry: AccountToken, song_gen: Optional["SongsGen"]) -> Optional[str]:
+        # 优先用已有session换取新token，只需一次轻量请求
+        if entry.session_id and entry.client:
+            jwt = await self._exchange(entry)
+            if jwt:
+                entry.set_jwt(jwt)
+                return jwt
+
+        # 无法重新认证时，旧 token 在真正过期前继续使用
+        if song_gen is None or song_gen._closed:
+            return entry.jwt if entry.jwt and time.time() < entry.expires_at else None
+
+        jwt = await song_gen.get_auth_token()
+        if not jwt:
+            return None
+        entry.set_jwt(jwt)
+        entry.session_id = song_gen.clerk_session_id
+        entry.client = song_gen.token_client
+        song_gen.auth_token = jwt
+        return jwt
+
+    @staticmethod
+    async def _exchange(entry: AccountToken) -> Optional[str]:
+        try:
+            response = await entry.client.request(
+                "POST",
+                URLs.EXCHANGE_TOKEN.format(sid=entry.session_id),
+                params={
+                    "__clerk_api_version": CLERK_API_VERSION,
+                    "_clerk_js_version": CLERK_JS_VERSION,
+                },
+                headers={"content-type": "application/x-www-form-urlencoded"},
+            )
+            if isinstance(response, dict) and response.get("jwt"):
+                return response["jwt"]
+            logger.warning(f"Token exchange returned no jwt for session {entry.session_id}")
+        except Exception as e:
+            logger.error(f"Token exchange failed: {e}")
+        entry.session_id = None
+        return None
+
+
+token_manager = TokenManager()
@@ -0,0 +1,66 @@
+"""
+SSE 分片编码耗时测试
+
+模拟大量并发流交替输出分片，比较逐个分片 json.dumps 整个字典与 ChunkEncoder 预编码信封两种方式的单分片耗时：
+- wait：以等待提示 🎵 为主，夹杂歌曲信息，大部分分片命中 ChunkEncoder 的短分片缓存
+- lyrics：每个分片都是不同的歌词行（含引号、换行和中文），不命中缓存，只测信封拼接和转义
+
+运行：python tests/bench_sse.py
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.sse_encoder import ChunkEncoder
+
+STREAMS = int(os.getenv('BENCH_STREAMS', 5000))
+CHUNKS = int(os.getenv('BENCH_CHUNKS', 40))
+MODEL = "suno-v3.5"
+CREATED = int(time.time())
+CONTENTS = ["🎵"] * 30 + ["🎵\n"] + ["\n### 🤯 Creating\n\n```suno\n{prompt:一首关于夏天的歌}\n```\n\n",
+                                    "## 🎧 歌曲名称\n夏日晚风\n", "🏷️ 歌曲风格\npop, summer\n",
+                                    "https://cdn1.suno.ai/image_0000.png\n"]
+LYRICS = [f"[Verse {i // 4 + 1}]\n第{i}行：\"夏日晚风\" 吹过 {i} 号街道 🌙\n" for i in range(CHUNKS)]
+
+
+def legacy(chat_id, content):
+    return (f"""data:""" + ' ' + f"""{json.dumps({"id": f"chatcmpl-{chat_id}", "object": "chat.completion.chunk", "model": MODEL, "created": CREATED, "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}]})}\n\n""").encode()
+
+
+def bench_legacy(chat_ids, contents):
+    start = time.perf_counter()
+    for i in range(CHUNKS):
+        content = contents[i % len(contents)]
+        for chat_id in chat_ids:
+            legacy(chat_id, content)
+    return time.perf_counter() - start
+
+
+def bench_encoder(chat_ids, contents):
+    start = time.perf_counter()
+    encoders = [ChunkEncoder(chat_id, MODEL, CREATED) for chat_id in chat_ids]
+    for i in range(CHUNKS):
+        content = contents[i % len(contents)]
+        for encoder in encoders:
+            encoder.content(content)
+    return time.perf_counter() - start
+
+
+def main():
+    chat_ids = [f"{i:029d}" for i in range(STREAMS)]
+    for content in CONTENTS + LYRICS:
+        assert legacy(chat_ids[0], content) == ChunkEncoder(chat_ids[0], MODEL, CREATED).content(content)
+
+    total = STREAMS * CHUNKS
+    print(f"并发流: {STREAMS}  每个流分片数: {CHUNKS}")
+    for case, contents in (("wait", CONTENTS), ("lyrics", LYRICS)):
+        for name, func in (("json.dumps", bench_legacy), ("ChunkEncoder", bench_encoder)):
+            elapsed = min(func(chat_ids, contents) for _ in range(3))
+            print(f"{case:<7} {name:<14} {elapsed * 1e6 / total:>8.2f} 微秒/分片    总计 {elapsed:.3f} 秒")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+存储后端租约吞吐量测试
+
+分别测试 SQLite 和 MySQL 两种后端：
+- lease：get_request_cookie + delete_song_ids，每次租用/归还各一个事务
+- batch：apply_cookie_writes，写入延迟队列合并后的一批租用/归还
+
+运行：python tests/bench_storage.py
+未配置 SQL_IP / SQL_PASSWORD / SQL_NAME 时只测试 SQLite。
+MySQL 测试会写入 bench_ 开头的测试 cookie，结束后删除。
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv('test.env')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util.config import SQL_IP, SQL_DK, USER_NAME, SQL_PASSWORD, SQL_NAME, COOKIE_SLOTS
+from util.sqlite_storage import SQLiteManager
+
+ACCOUNTS = int(os.getenv('BENCH_ACCOUNTS', 200))
+CONCURRENCY = int(os.getenv('BENCH_CONCURRENCY', 20))
+ROUNDS = int(os.getenv('BENCH_ROUNDS', 2000))
+BATCH = int(os.getenv('BENCH_BATCH', 100))
+
+
+async def bench_lease(db, rounds, concurrency):
+    remaining = rounds
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            cookie = await db.get_request_cookie()
+            await db.delete_song_ids(cookie)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return rounds / (time.perf_counter() - start)
+
+
+async def bench_batch(db, cookies, rounds, batch):
+    start = time.perf_counter()
+    for i in range(0, rounds, batch):
+        rows = [(cookies[(i + j) % len(cookies)], 1, 1, None, 1, "bench", 60, 1, time.time(), 0.0)
+                for j in range(batch)]
+        await db.apply_cookie_writes(rows)
+    return rounds / (time.perf_counter() - start)
+
+
+async def run(name, db, cookies):
+    await db.create_database_and_table()
+    await db.upsert_cookies_bulk([(cookie, 10 ** 9) for cookie in cookies])
+    try:
+        lease = await bench_lease(db, ROUNDS, min(CONCURRENCY, ACCOUNTS * COOKIE_SLOTS))
+        batch = await bench_batch(db, cookies, ROUNDS, BATCH)
+        print(f"{name:<8} lease: {lease:>10.0f} 次/秒    batch: {batch:>10.0f} 次/秒")
+    finally:
+        await db.delete_cookies_bulk(cookies)
+        await db.close_db_pool()
+
+
+async def main():
+    cookies = [f"bench_{i}" for i in range(ACCOUNTS)]
+    print(f"账号数: {ACCOUNTS}  并发: {CONCURRENCY}  次数: {ROUNDS}  批大小: {BATCH}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        await run("sqlite", SQLiteManager(os.path.join(tmp, "bench.db")), cookies)
+
+    if SQL_IP and SQL_PASSWORD and SQL_NAME:
+        from util.sql_uilts import DatabaseManager
+        await run("mysql", DatabaseManager(SQL_IP, int(SQL_DK), USER_NAME, SQL_PASSWORD, SQL_NAME), cookies)
+    else:
+        print("mysql    未配置，跳过")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
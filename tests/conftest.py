@@ -0,0 +1,7 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# test_suno.py 需要真实的 cookie 和网络，直接运行：python tests/test_suno.py
+collect_ignore = ["test_suno.py"]
@@ -0,0 +1,59 @@
+import asyncio
+
+from suno.captcha_pool import CaptchaPool
+
+
+class FakeSolver:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, combination_index, cookies):
+        self.calls += 1
+        return f"token-{self.calls}"
+
+
+def test_unused_account_stops_presolving_until_acquired():
+    solver = FakeSolver()
+    pool = CaptchaPool(size=2, ttl=0.05, concurrency=2, idle_timeout=60, interval=0.01)
+
+    async def scenario():
+        await pool.start()
+        # 首次401走同步求解，之后后台开始预求解
+        assert await pool.acquire(0, {"__client": "a"}, solver) == "token-1"
+        await asyncio.sleep(0.3)
+        idle_calls = solver.calls
+        await asyncio.sleep(0.2)
+        assert solver.calls == idle_calls
+
+        # 再次取用重新开启预求解
+        await pool.acquire(0, {"__client": "a"}, solver)
+        await asyncio.sleep(0.02)
+        rearmed_calls = solver.calls
+        await pool.close()
+        return idle_calls, rearmed_calls
+
+    idle_calls, rearmed_calls = asyncio.run(scenario())
+    # 同步求解一次 + 预求解一轮 size 个
+    assert idle_calls == 3
+    assert rearmed_calls > idle_calls
+    stats = pool.stats()
+    assert stats["sync_solved"] >= 1
+    assert stats["presolved"] >= 2
+    assert stats["expired"] >= 2
+
+
+def test_presolved_token_is_consumed():
+    solver = FakeSolver()
+    pool = CaptchaPool(size=1, ttl=60, concurrency=1, idle_timeout=60, interval=0.01)
+
+    async def scenario():
+        await pool.start()
+        await pool.acquire(0, None, solver)
+        await asyncio.sleep(0.05)
+        token = await pool.acquire(0, None, solver)
+        await pool.close()
+        return token
+
+    assert asyncio.run(scenario()) == "token-2"
+    stats = pool.stats()
+    assert (stats["sync_solved"], stats["consumed"]) == (1, 1)
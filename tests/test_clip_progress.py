@@ -0,0 +1,53 @@
+from data.clip_progress import ClipProgress
+
+
+def clip(**fields):
+    metadata = {key: fields.pop(key) for key in ("tags", "prompt") if key in fields}
+    return {"metadata": metadata, **fields}
+
+
+FULL = clip(title="夏日晚风", tags="pop", prompt="歌词", image_url="https://img", image_large_url="https://large",
+            audio_url="https://audio")
+
+
+def test_ids_are_sent_first_and_once():
+    progress = ClipProgress("id1", "id2")
+    first = progress.advance(clip())
+    assert len(first) == 1 and "id1" in first[0] and "id2" in first[0]
+    assert progress.advance(clip()) == []
+    assert not progress.metadata_done
+
+
+def test_later_fields_wait_for_earlier_ones():
+    progress = ClipProgress("id1", "id2")
+    # 没有歌名时，已经出现的类型和歌词也不会提前输出
+    contents = progress.advance(clip(tags="pop", prompt="歌词", audio_url="https://audio"))
+    assert len(contents) == 1
+
+    contents = progress.advance(clip(title="夏日晚风", tags="pop", prompt="歌词", audio_url="https://audio"))
+    assert [c for c in contents if "夏日晚风" in c]
+    assert [c for c in contents if "pop" in c]
+    assert [c for c in contents if "歌词" in c]
+    # 图片还没出现，实时链接也不输出
+    assert not [c for c in contents if "audiopipe" in c]
+    assert not progress.metadata_done
+
+
+def test_each_field_is_emitted_once_in_order():
+    progress = ClipProgress("id1", "id2")
+    contents = progress.advance(FULL)
+    text = "".join(contents)
+    positions = [text.index(marker) for marker in ("id1", "夏日晚风", "pop", "歌词", "https://large", "audiopipe")]
+    assert positions == sorted(positions)
+    assert progress.metadata_done
+    assert progress.advance(FULL) == []
+    assert not progress.finished
+
+
+def test_cdn_contents_finish_the_progress():
+    progress = ClipProgress("id1", "id2")
+    progress.advance(FULL)
+    contents = progress.cdn_contents()
+    assert "https://cdn1.suno.ai/id1.mp3" in contents[0]
+    assert "https://cdn1.suno.ai/id2.mp4" in contents[1]
+    assert progress.finished
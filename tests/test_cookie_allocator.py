@@ -0,0 +1,162 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+import process.cookie_allocator as allocator_module
+from process.cookie_allocator import CookieAllocator
+from process.cookie_health import CookieHealth
+from process.lease_store import LocalLeaseStore
+from process.write_behind import WriteBehindQueue
+
+
+class FakeStorage:
+    """只实现分配器用到的方法，rows 即数据库中的账号"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.reaped = 0
+
+    async def get_cookie_states(self):
+        return [dict(row) for row in self.rows]
+
+    async def reap_expired_leases(self, ttl):
+        self.reaped += 1
+        return 0
+
+
+def row(cookie, count, active_leases=0):
+    return {"cookie": cookie, "count": count, "active_leases": active_leases, "songID": None, "songID2": None}
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    queue = WriteBehindQueue()
+    monkeypatch.setattr(allocator_module, "write_behind", queue)
+    monkeypatch.setattr(allocator_module, "cookie_health", CookieHealth())
+    return queue
+
+
+def make_allocator(rows, slots=1, lease_ttl=60):
+    allocator = CookieAllocator(slots=slots, lease_ttl=lease_ttl, owner="test", store=LocalLeaseStore())
+    allocator.db_manager = FakeStorage(rows)
+    asyncio.run(allocator.reconcile())
+    return allocator
+
+
+def test_acquire_prefers_most_remaining(queue):
+    allocator = make_allocator([row("a", 3), row("b", 10), row("c", 5)])
+
+    async def scenario():
+        first = await allocator.acquire()
+        second = await allocator.acquire()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert (first.cookie, second.cookie) == ("b", "c")
+    assert allocator._accounts["b"].count == 9
+    assert queue._pending["b"].acquired == 1
+    assert queue._pending["b"].count_delta == 1
+
+
+def test_slots_are_exhausted_and_freed(queue):
+    allocator = make_allocator([row("a", 10)], slots=2)
+
+    async def scenario():
+        first = await allocator.acquire()
+        second = await allocator.acquire()
+        assert {first.slot, second.slot} == {0, 1}
+        with pytest.raises(HTTPException) as exc:
+            await allocator.acquire()
+        assert exc.value.status_code == 429
+
+        await allocator.release(first)
+        third = await allocator.acquire()
+        assert third.slot == 0
+        return second, third
+
+    second, third = asyncio.run(scenario())
+    state = allocator._accounts["a"]
+    assert state.leases == {second, third}
+    assert state.count == 7
+    assert queue._pending["a"].acquired == 3
+    assert queue._pending["a"].released == 1
+
+
+def test_release_twice_is_ignored(queue):
+    allocator = make_allocator([row("a", 10)])
+
+    async def scenario():
+        lease = await allocator.acquire()
+        await allocator.release(lease)
+        await allocator.release(lease)
+        return await allocator.acquire()
+
+    lease = asyncio.run(scenario())
+    assert lease.cookie == "a"
+    assert queue._pending["a"].released == 1
+
+
+def test_accounts_without_remaining_count_are_skipped(queue):
+    allocator = make_allocator([row("a", 0), row("b", 1)])
+
+    async def scenario():
+        lease = await allocator.acquire()
+        with pytest.raises(HTTPException):
+            await allocator.acquire()
+        return lease
+
+    assert asyncio.run(scenario()).cookie == "b"
+
+
+def test_reconcile_counts_leases_held_elsewhere(queue):
+    allocator = make_allocator([row("a", 10, active_leases=1)], slots=2)
+
+    async def scenario():
+        await allocator.acquire()
+        with pytest.raises(HTTPException):
+            await allocator.acquire()
+
+    asyncio.run(scenario())
+    assert allocator._accounts["a"].remote == 1
+
+
+def test_reap_releases_expired_leases(queue, monkeypatch):
+    monkeypatch.setattr(allocator_module.leader_elector, "_leader", False)
+    allocator = make_allocator([row("a", 10)])
+
+    async def scenario():
+        lease = await allocator.acquire()
+        lease.expire_at = time.time() - 1
+        reaped = await allocator.reap()
+        assert lease.slot is None
+        return reaped, await allocator.acquire()
+
+    reaped, lease = asyncio.run(scenario())
+    assert reaped == 1
+    assert lease.cookie == "a"
+    # 数据库中的过期租约只由 leader 回收
+    assert allocator.db_manager.reaped == 0
+
+    monkeypatch.setattr(allocator_module.leader_elector, "_leader", True)
+    asyncio.run(allocator.reap())
+    assert allocator.db_manager.reaped == 1
+
+
+def test_remove_stops_leasing_and_queues_delete(queue):
+    allocator = make_allocator([row("a", 10), row("b", 5)])
+
+    allocator.remove(["a", "missing"])
+    assert queue._pending["a"].invalidated
+    assert asyncio.run(allocator.acquire()).cookie == "b"
+
+
+def test_reconcile_keeps_queued_delete_out(queue):
+    allocator = make_allocator([row("a", 10), row("b", 5)])
+    allocator.remove(["a"])
+
+    # 删除写入数据库之前，对账仍会读到这个账号
+    asyncio.run(allocator.reconcile())
+    assert "a" not in allocator._accounts
+    assert asyncio.run(allocator.acquire()).cookie == "b"
@@ -0,0 +1,78 @@
+import pytest
+
+import process.cookie_health as health_module
+from process.cookie_health import CookieHealth
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(health_module.time, "time", clock)
+    return clock
+
+
+def make_health():
+    return CookieHealth(alpha=0.5, degraded_score=0.6, max_failures=3, cooldown=60, cooldown_max=300)
+
+
+def test_quarantine_after_consecutive_failures(clock):
+    health = make_health()
+    assert not health.record_failure("a", "error")
+    assert not health.record_failure("a", "error")
+    assert health.available("a")
+    assert health.record_failure("a", "error")
+    assert not health.available("a")
+
+
+def test_success_resets_the_failure_streak(clock):
+    health = make_health()
+    health.record_failure("a", "error")
+    health.record_failure("a", "error")
+    health.record_success("a", 30)
+    assert not health.record_failure("a", "error")
+    assert health.available("a")
+
+
+def test_quarantine_expires_and_cooldown_grows(clock):
+    health = make_health()
+    for _ in range(3):
+        health.record_failure("a", "error")
+    clock.now += 59
+    assert health.expire_quarantine() == []
+    clock.now += 1
+    assert health.expire_quarantine() == ["a"]
+    assert health.available("a")
+
+    # 冷却结束后再失败一次立即重新隔离，冷却时间翻倍
+    assert health.record_failure("a", "error")
+    clock.now += 119
+    assert health.expire_quarantine() == []
+    clock.now += 1
+    assert health.expire_quarantine() == ["a"]
+
+
+def test_reset_clears_quarantine_and_stats(clock):
+    health = make_health()
+    for _ in range(3):
+        health.record_failure("a", "error")
+    assert health.reset("a")
+    assert health.available("a")
+    assert health.tier("a") == 0
+    assert not health.record_failure("a", "error")
+
+
+def test_degraded_accounts_rank_lower(clock):
+    health = make_health()
+    health.record_success("a", 30)
+    health.record_failure("b", "error")
+    assert health.tier("a") == 0
+    assert health.tier("b") == 1
+    assert [item["cookie"] for item in health.status()] == ["b", "a"]
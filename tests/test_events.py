@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+import data.events as events_module
+from data.events import ContentDelta, StreamMetrics, until_disconnected
+
+
+class FakeRequest:
+    def __init__(self):
+        self.disconnected = False
+
+    async def is_disconnected(self):
+        return self.disconnected
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    metrics = StreamMetrics()
+    monkeypatch.setattr(events_module, "stream_metrics", metrics)
+    return metrics
+
+
+def test_completed_stream(metrics):
+    async def source():
+        yield ContentDelta("a")
+        yield ContentDelta("b")
+
+    async def scenario():
+        return [event.content async for event in until_disconnected(source(), FakeRequest(), 0.01)]
+
+    assert asyncio.run(scenario()) == ["a", "b"]
+    assert metrics.stats()["completed"] == 1
+    assert metrics.stats()["active"] == 0
+
+
+def test_disconnect_closes_source(metrics):
+    closed = []
+
+    async def source():
+        try:
+            while True:
+                await asyncio.sleep(0.02)
+                yield ContentDelta("🎵")
+        finally:
+            closed.append(True)
+
+    async def scenario():
+        request = FakeRequest()
+        received = []
+        async for event in until_disconnected(source(), request, 0.01):
+            received.append(event)
+            if len(received) == 2:
+                request.disconnected = True
+        return received
+
+    assert len(asyncio.run(scenario())) == 2
+    assert closed == [True]
+    assert metrics.abandoned == 1
+    assert metrics.stats()["active"] == 0
+
+
+def test_failed_source_is_counted(metrics):
+    async def source():
+        yield ContentDelta("a")
+        raise RuntimeError("boom")
+
+    async def scenario():
+        async for _ in until_disconnected(source(), FakeRequest(), 0.01):
+            pass
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(scenario())
+    assert metrics.failed == 1
+    assert metrics.stats()["active"] == 0
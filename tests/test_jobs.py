@@ -0,0 +1,154 @@
+import asyncio
+import json
+
+import pytest
+
+import data.jobs as jobs_module
+from data.events import ContentDelta, STREAM_END
+from data.jobs import GenerationJob, JobManager
+
+
+class Data:
+    model = "suno-v3.5"
+    tags = None
+    title = None
+    continue_at = None
+    continue_clip_id = None
+
+
+def finished_job(waits, log_size=256):
+    job = GenerationJob("job", "suno-v3.5", "prompt", log_size)
+    job.append(ContentDelta("\n### 🤯 Creating\n", role=True))
+    for _ in range(waits):
+        job.append(ContentDelta("🎵"))
+    job.append(ContentDelta("done"))
+    job.append(STREAM_END)
+    job.finish("completed")
+    return job
+
+
+def replay(job, last_event_id):
+    async def collect():
+        return [chunk async for chunk in JobManager().stream(job, last_event_id)]
+
+    return asyncio.run(collect())
+
+
+def parse(chunks):
+    # 返回 (id, 文本, 是否带 role) 列表，[DONE] 单独记为 None
+    events = []
+    for chunk in chunks:
+        lines = chunk.decode().split("\n")
+        seq = int(lines[0][len("id: "):])
+        data = json.loads(lines[1][len("data: "):])
+        delta = data["choices"][0]["delta"]
+        events.append((seq, delta.get("content"), "role" in delta))
+    return events
+
+
+def test_full_replay():
+    events = parse(replay(finished_job(3), 0))
+    assert [seq for seq, _, _ in events] == [1, 2, 3, 4, 5, 6]
+    assert events[0] == (1, "\n### 🤯 Creating\n", True)
+    assert events[-1][1] is None
+
+
+def test_resume_from_mid_stream():
+    events = parse(replay(finished_job(3), 3))
+    assert [(seq, content) for seq, content, _ in events[:-1]] == [(4, "🎵"), (5, "done")]
+    assert not any(role for _, _, role in events)
+
+
+def test_resume_after_eviction_replays_evicted_text():
+    job = finished_job(300, log_size=10)
+    events = parse(replay(job, 0))
+    seq, content, role = events[0]
+    # 被淘汰的事件合并为一个带 role 的分片，id 为最后一个被淘汰的序号
+    assert role and seq == job.last_seq - 10
+    assert content.startswith("\n### 🤯 Creating\n")
+    assert "".join(c for _, c, _ in events if c) == "".join(job.parts)
+    assert [s for s, _, _ in events[1:]] == list(range(seq + 1, job.last_seq + 1))
+
+    events = parse(replay(job, 100))
+    assert not events[0][2]
+    assert "".join(c for _, c, _ in events if c) == "".join(job.parts[100:])
+
+
+def test_bogus_last_event_id_replays_from_start():
+    job = finished_job(3)
+    assert replay(job, job.last_seq + 100) == replay(job, 0)
+    assert replay(job, -5) == replay(job, 0)
+
+
+def test_replay_up_to_date_returns_nothing():
+    job = finished_job(3)
+    assert replay(job, job.last_seq) == []
+
+
+def test_cancel_running_job(monkeypatch):
+    closed = []
+
+    async def events(*args):
+        try:
+            yield ContentDelta("start", role=True)
+            while True:
+                await asyncio.sleep(0.01)
+                yield ContentDelta("🎵")
+        finally:
+            closed.append(True)
+
+    monkeypatch.setattr(jobs_module, "generate_events", events)
+
+    async def scenario():
+        manager = JobManager()
+        job = manager.submit(Data(), "prompt")
+        await asyncio.sleep(0.05)
+        listener = asyncio.create_task(_drain(manager, job))
+        await manager.cancel(job.id)
+        return job, await asyncio.wait_for(listener, 1)
+
+    job, chunks = asyncio.run(scenario())
+    assert job.status == "cancelled"
+    assert closed == [True]
+    # 订阅者收到取消提示和结束标记后退出
+    assert chunks[-1].endswith(b"data: [DONE]\n\n")
+    assert "生成任务已取消" in "".join(c for _, c, _ in parse(chunks) if c)
+
+
+def test_cancel_before_start(monkeypatch):
+    async def events(*args):
+        yield STREAM_END
+
+    monkeypatch.setattr(jobs_module, "generate_events", events)
+
+    async def scenario():
+        manager = JobManager()
+        job = manager.submit(Data(), "prompt")
+        await manager.cancel(job.id)
+        return job
+
+    assert asyncio.run(scenario()).status == "cancelled"
+
+
+def test_submit_limits_running_jobs(monkeypatch):
+    async def events(*args):
+        await asyncio.sleep(1)
+        yield STREAM_END
+
+    monkeypatch.setattr(jobs_module, "generate_events", events)
+
+    async def scenario():
+        manager = JobManager(max_running=1)
+        manager.submit(Data(), "prompt")
+        try:
+            with pytest.raises(Exception) as exc:
+                manager.submit(Data(), "prompt")
+            return exc.value
+        finally:
+            await manager.close()
+
+    assert asyncio.run(scenario()).status_code == 429
+
+
+async def _drain(manager, job):
+    return [chunk async for chunk in manager.stream(job, 0)]
@@ -0,0 +1,82 @@
+import pytest
+
+import util.poll_scheduler as poll_module
+from util.poll_scheduler import PollScheduler, STAGE_METADATA
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(poll_module.time, "monotonic", clock)
+    return clock
+
+
+def make_scheduler():
+    return PollScheduler(default_interval=3, min_interval=1, max_interval=10, jitter=0, min_samples=5)
+
+
+# 一个 clip 在 seconds 秒后第一次被观察到带有歌名，上一次轮询在 seconds - gap
+def learn(scheduler, clock, clip_id, seconds, gap=1.0):
+    scheduler.track(clip_id)
+    started = clock.now
+    clock.now = started + seconds - gap
+    scheduler.observe({"id": clip_id})
+    clock.now = started + seconds
+    scheduler.observe({"id": clip_id, "title": "song"})
+    scheduler.forget(clip_id)
+
+
+def test_default_interval_until_enough_samples(clock):
+    scheduler = make_scheduler()
+    for i in range(4):
+        learn(scheduler, clock, f"old{i}", 20)
+    scheduler.track("new")
+    assert scheduler.next_delay(["new"]) == 3
+
+
+def test_sleeps_until_window_then_polls_densely(clock):
+    scheduler = make_scheduler()
+    for i in range(10):
+        learn(scheduler, clock, f"old{i}", 20 + i)
+    scheduler.track("new")
+    start = clock.now
+
+    # 离窗口开始还早：睡到窗口开始，但不超过 max_interval
+    assert scheduler.next_delay(["new"]) == 10
+    clock.now = start + 15
+    # 样本为 19.5 ~ 28.5 秒，p10 为 20.5
+    assert scheduler.next_delay(["new"]) == pytest.approx(20.5 - 15)
+    # 窗口内密集轮询
+    clock.now = start + 24
+    assert scheduler.next_delay(["new"]) == 1
+    # 超过 p90 后回到默认间隔
+    clock.now = start + 40
+    assert scheduler.next_delay(["new"]) == 3
+
+
+def test_samples_use_poll_midpoint(clock):
+    scheduler = make_scheduler()
+    learn(scheduler, clock, "clip", 30, gap=10)
+    assert list(scheduler._samples[STAGE_METADATA]) == [25]
+
+
+def test_completed_clips_poll_at_min_interval(clock):
+    scheduler = make_scheduler()
+    scheduler.track("clip")
+    scheduler.observe({"id": "clip", "title": "song", "status": "complete"})
+    assert scheduler.next_delay(["clip"]) == 1
+
+
+def test_jitter_bounds(clock):
+    scheduler = PollScheduler(default_interval=4, min_interval=1, max_interval=10, jitter=0.25)
+    delays = [scheduler.next_delay(["unknown"]) for _ in range(500)]
+    assert min(delays) >= 3 and max(delays) <= 5
+    assert max(delays) - min(delays) > 0.5
@@ -0,0 +1,36 @@
+import asyncio
+
+from util.sqlite_storage import SQLiteManager
+
+
+def test_named_lock_excludes_other_managers(tmp_path):
+    path = str(tmp_path / "cookies.db")
+
+    async def scenario():
+        first, second = SQLiteManager(path), SQLiteManager(path)
+        assert await first.acquire_lock("leader")
+        assert await first.check_lock("leader")
+        assert not await second.acquire_lock("leader", timeout=0.2)
+        await first.release_lock("leader")
+        assert await second.acquire_lock("leader")
+        await second.release_lock("leader")
+
+    asyncio.run(scenario())
+
+
+def test_cookie_writes_round_trip(tmp_path):
+    async def scenario():
+        db = SQLiteManager(str(tmp_path / "cookies.db"))
+        await db.create_database_and_table()
+        await db.upsert_cookies_bulk([("a", 10), ("b", 5)])
+        await db.apply_cookie_writes([("a", 2, 1, None, 2, "owner", 60, 1, 123.0, 0.0)], ["b"])
+        states = await db.get_cookie_states()
+        assert await db.delete_cookies_bulk(["a", "missing"]) == 1
+        await db.close_db_pool()
+        return states
+
+    (state,) = asyncio.run(scenario())
+    assert state["cookie"] == "a"
+    assert state["count"] == 8
+    assert state["active_leases"] == 1
+    assert state["uses"] == 1 and state["used_at"] == 123.0
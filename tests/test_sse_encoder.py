@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from data.sse_encoder import ChunkEncoder, DONE
+
+CHAT_ID = "0123456789abcdefghijklmnopqrs"
+MODEL = "suno-v3.5"
+CREATED = 1700000000
+
+TEXTS = [
+    "",
+    "🎵",
+    "🎵\n",
+    "\n### 🤯 Creating\n\n```suno\n{prompt:一首关于夏天的歌}\n```\n\n",
+    'say "hi" \\ back\\slash',
+    "tab\tcarriage\rreturn\x00\x1f\x7f",
+    "emoji 🌙 surrogate pairs and é accents",
+    "</script> & <tag>",
+]
+
+
+# 改造前逐个分片 json.dumps 整个字典的输出
+def legacy(delta, finish_reason=None, usage=None):
+    chunk = {"id": f"chatcmpl-{CHAT_ID}", "object": "chat.completion.chunk", "model": MODEL, "created": CREATED,
+             "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+    if usage is not None:
+        chunk["usage"] = usage
+    return f"data: {json.dumps(chunk)}\n\n".encode()
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_content_matches_json_dumps(text):
+    encoder = ChunkEncoder(CHAT_ID, MODEL, CREATED)
+    assert encoder.content(text) == legacy({"content": text})
+    # 第二次命中短分片缓存，输出不变
+    assert encoder.content(text) == legacy({"content": text})
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_role_chunk_matches_json_dumps(text):
+    encoder = ChunkEncoder(CHAT_ID, MODEL, CREATED)
+    assert encoder.role(text) == legacy({"role": "assistant", "content": text})
+
+
+def test_finish_chunk_matches_json_dumps():
+    encoder = ChunkEncoder(CHAT_ID, MODEL, CREATED)
+    usage = {"prompt_tokens": 3, "completion_tokens": 120, "total_tokens": 123}
+    assert encoder.finish() == legacy({}, "stop")
+    assert encoder.finish(usage) == legacy({}, "stop", usage)
+
+
+def test_envelope_escapes_model_and_id():
+    encoder = ChunkEncoder('id"1', 'model\\"x', CREATED)
+    expected = json.dumps({"id": 'chatcmpl-id"1', "object": "chat.completion.chunk", "model": 'model\\"x',
+                           "created": CREATED,
+                           "choices": [{"index": 0, "delta": {"content": "a"}, "finish_reason": None}]})
+    assert encoder.content("a") == f"data: {expected}\n\n".encode()
+
+
+def test_done_marker():
+    assert DONE == b"data: [DONE]\n\n"
@@ -0,0 +1,106 @@
+import asyncio
+
+from process.write_behind import WriteBehindQueue
+
+
+class FakeStorage:
+    """记录每次批量写入，fail 大于 0 时接下来的写入失败"""
+
+    def __init__(self, fail=0, during_write=None):
+        self.fail = fail
+        self.during_write = during_write
+        self.writes = []
+
+    async def apply_cookie_writes(self, rows, deletes=()):
+        if self.during_write is not None:
+            self.during_write()
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("database unavailable")
+        self.writes.append(({row[0]: row[1:] for row in rows}, list(deletes)))
+
+
+def make_queue(storage):
+    queue = WriteBehindQueue()
+    queue.db_manager = storage
+    return queue
+
+
+def test_updates_are_coalesced_per_account():
+    storage = FakeStorage()
+    queue = make_queue(storage)
+    queue.lease("a", "owner", 60)
+    queue.release("a")
+    queue.lease("a", "owner", 90)
+    queue.consume("b")
+    queue.set_count("b", 7)
+    queue.consume("b")
+
+    assert asyncio.run(queue.flush())
+    rows, deletes = storage.writes[0]
+    # (租用数, 归还数, 设置的count, count减少量, 持有者, 有效期, ...)
+    assert rows["a"][:6] == (2, 1, None, 2, "owner", 90)
+    assert rows["b"][:4] == (0, 0, 7, 1)
+    assert deletes == []
+    assert not queue._pending
+
+
+def test_failed_flush_is_merged_with_newer_updates():
+    queue = None
+
+    def release_during_write():
+        # 写入进行中又产生的修改
+        queue.release("a")
+        queue.set_count("b", 3)
+
+    storage = FakeStorage(fail=1, during_write=release_during_write)
+    queue = make_queue(storage)
+    queue.lease("a", "owner", 60)
+    queue.consume("b")
+
+    assert not asyncio.run(queue.flush())
+    assert not storage.writes
+    assert queue.dirty("a", queue.last_op)
+
+    storage.during_write = None
+    assert asyncio.run(queue.flush())
+    rows, _ = storage.writes[0]
+    assert rows["a"][:4] == (1, 1, None, 1)
+    # 新的 set_count 覆盖失败批次中的扣减
+    assert rows["b"][:4] == (0, 0, 3, 0)
+    assert not queue._pending
+
+
+def test_invalidated_accounts_are_deleted_not_updated():
+    storage = FakeStorage()
+    queue = make_queue(storage)
+    queue.lease("a", "owner", 60)
+    queue.invalidate("a")
+    queue.release("a")
+
+    assert asyncio.run(queue.flush())
+    assert storage.writes == [({}, ["a"])]
+
+
+def test_close_retries_until_drained():
+    storage = FakeStorage(fail=2)
+    queue = make_queue(storage)
+    queue.release("a")
+
+    asyncio.run(queue.close())
+    assert len(storage.writes) == 1
+    assert not queue._pending
+
+
+def test_touched_is_pruned_after_reconcile():
+    storage = FakeStorage()
+    queue = make_queue(storage)
+    queue.release("a")
+    asyncio.run(queue.flush())
+    since = queue.last_op
+    queue.release("b")
+
+    queue.reconciled(since)
+    asyncio.run(queue.flush())
+    assert set(queue._touched) == {"b"}
+    assert queue.dirty("b", since)
@@ -0,0 +1,159 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Union
+
+from util.logger import logger
+from util.poll_scheduler import PollScheduler, poll_scheduler
+from util.utils import get_feed
+
+
+class ClipWaitTimeout(TimeoutError):
+    """到达最大等待时间仍未收到 clip 状态"""
+
+
+class ClipSubscription:
+    """单个请求对一组 clip 的订阅，每轮轮询后收到这组 clip 的最新状态"""
+
+    def __init__(self, watcher: "ClipWatcher", account: str, clip_ids: List[str]):
+        self.watcher = watcher
+        self.account = account
+        self.clip_ids = list(clip_ids)
+        self.latest: Optional[List[dict]] = None
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self.closed = False
+
+    # 只保留最新一次快照，消费慢的订阅者不会堆积旧数据
+    def _push(self, snapshot: Union[List[dict], Exception]):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(snapshot)
+
+    # 轮询无法继续（例如账号 token 失效），下一次 next 抛出 error
+    def _fail(self, error: Exception):
+        self._push(error)
+
+    # 等待下一次轮询结果，返回值与 get_feed 的格式一致（clip 字典列表）；timeout 秒内没有结果时抛出 ClipWaitTimeout
+    async def next(self, timeout: Optional[float] = None) -> List[dict]:
+        if not self.queue.empty():
+            item = self.queue.get_nowait()
+        else:
+            try:
+                item = await asyncio.wait_for(self.queue.get(), None if timeout is None else max(timeout, 0.0))
+            except asyncio.TimeoutError:
+                raise ClipWaitTimeout(f"等待 clip 状态超时，ids：{self.clip_ids}") from None
+        if isinstance(item, Exception):
+            raise item
+        self.latest = item
+        return self.latest
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.watcher.unsubscribe(self)
+
+
+class _AccountGroup:
+    def __init__(self, token_getter: Callable[[], Awaitable[str]]):
+        self.token_getter = token_getter
+        self.clips: Dict[str, Set[ClipSubscription]] = {}
+        self.task: Optional[asyncio.Task] = None
+
+
+class ClipWatcher:
+    """
+    集中式 clip 状态轮询
+    同一账号下所有进行中的 clip 合并为一次批量 feed 请求，结果通过队列分发给各订阅者，
+    上游请求量只随账号数增长，与并发客户端数无关；轮询间隔由 PollScheduler 决定
+    """
+
+    def __init__(self, scheduler: PollScheduler = poll_scheduler):
+        self.scheduler = scheduler
+        self._groups: Dict[str, _AccountGroup] = {}
+
+    def subscribe(self, account: str, clip_ids: List[str],
+                  token_getter: Callable[[], Awaitable[str]]) -> ClipSubscription:
+        """
+        订阅一组 clip 的状态
+
+        Args:
+            account: 账号标识（cookie）
+            clip_ids: 需要关注的 clip id 列表
+            token_getter: 获取该账号 token 的协程函数
+        """
+        subscription = ClipSubscription(self, account, clip_ids)
+        group = self._groups.get(account)
+        if group is None:
+            group = self._groups[account] = _AccountGroup(token_getter)
+        else:
+            group.token_getter = token_getter
+
+        for clip_id in subscription.clip_ids:
+            group.clips.setdefault(clip_id, set()).add(subscription)
+            self.scheduler.track(clip_id)
+
+        if group.task is None or group.task.done():
+            group.task = asyncio.create_task(self._poll_account(account, group))
+        return subscription
+
+    def unsubscribe(self, subscription: ClipSubscription):
+        group = self._groups.get(subscription.account)
+        if group is None:
+            return
+        for clip_id in subscription.clip_ids:
+            subscribers = group.clips.get(clip_id)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del group.clips[clip_id]
+                self.scheduler.forget(clip_id)
+        # 最后一个订阅者离开（例如客户端断开）时立即停止轮询，不必等到下一轮
+        if not group.clips:
+            if group.task is not None and not group.task.done():
+                group.task.cancel()
+            del self._groups[subscription.account]
+
+    # 单个账号的轮询循环，没有订阅的 clip 时自动退出
+    async def _poll_account(self, account: str, group: _AccountGroup):
+        loop = asyncio.get_running_loop()
+        try:
+            while group.clips:
+                started = loop.time()
+                ids = list(group.clips)
+                subscriptions = set()
+                for clip_id in ids:
+                    subscriptions.update(group.clips.get(clip_id, ()))
+                try:
+                    token = await group.token_getter()
+                    if not token:
+                        # 没有可用 token 时继续轮询只会一直失败，让订阅者尽快结束
+                        for subscription in subscriptions:
+                            subscription._fail(RuntimeError("获取账号token失败，无法查询生成进度"))
+                        raise RuntimeError("获取账号token失败")
+                    feed = await get_feed(ids=",".join(ids), token=token)
+                    clips = {clip.get('id'): clip for clip in feed if isinstance(clip, dict)}
+                    for clip in clips.values():
+                        self.scheduler.observe(clip)
+
+                    for subscription in subscriptions:
+                        snapshot = [clips[clip_id] for clip_id in subscription.clip_ids if clip_id in clips]
+                        if snapshot:
+                            subscription._push(snapshot)
+                except Exception as e:
+                    logger.error(f"批量获取 feed 失败，ids：{ids}，错误为：{str(e)}")
+
+                delay = self.scheduler.next_delay(list(group.clips))
+                await asyncio.sleep(max(0.0, delay - (loop.time() - started)))
+        finally:
+            if self._groups.get(account) is group and not group.clips:
+                del self._groups[account]
+
+    # 停止所有轮询任务
+    async def close(self):
+        tasks = [group.task for group in self._groups.values() if group.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._groups.clear()
+
+
+clip_watcher = ClipWatcher()
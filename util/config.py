@@ -1,4 +1,5 @@
 import os
+import socket
 import time
 
 from dotenv import load_dotenv
@@ -26,6 +27,10 @@ SQL_PASSWORD = os.getenv('SQL_PASSWORD', '')
 SQL_IP = os.getenv('SQL_IP', '')
 # 数据库端口
 SQL_DK = os.getenv('SQL_DK', 3306)
+# 存储后端：mysql 或 sqlite
+DB_BACKEND = os.getenv('DB_BACKEND', 'mysql').lower()
+# SQLite 数据库文件路径
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'suno2openai.db')
 # cookies前缀
 COOKIES_PREFIX = os.getenv('COOKIES_PREFIX', "")
 # 鉴权key
@@ -36,6 +41,88 @@ RETRIES = int(os.getenv('RETRIES', 5))
 BATCH_SIZE = int(os.getenv('BATCH_SIZE', 10))
 # 最大等待时间（分钟）
 MAX_TIME = int(os.getenv('MAX_TIME', 5))
+# HTTP 连接池总连接数
+HTTP_POOL_LIMIT = int(os.getenv('HTTP_POOL_LIMIT', 200))
+# HTTP 连接池单个host的连接数
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv('HTTP_POOL_LIMIT_PER_HOST', 50))
+# HTTP keep-alive 保持时间（秒）
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', 60))
+# 最多缓存的账号会话数量
+HTTP_MAX_COOKIE_SESSIONS = int(os.getenv('HTTP_MAX_COOKIE_SESSIONS', 1000))
+# 歌曲状态批量轮询间隔（秒）
+FEED_POLL_INTERVAL = float(os.getenv('FEED_POLL_INTERVAL', 3))
+# 自适应轮询的最小/最大间隔（秒）
+POLL_MIN_INTERVAL = float(os.getenv('POLL_MIN_INTERVAL', 1))
+POLL_MAX_INTERVAL = float(os.getenv('POLL_MAX_INTERVAL', 10))
+# 轮询间隔随机抖动比例
+POLL_JITTER = float(os.getenv('POLL_JITTER', 0.2))
+# token 过期前提前续期的时间（秒）
+TOKEN_REFRESH_MARGIN = float(os.getenv('TOKEN_REFRESH_MARGIN', 10))
+# capsolver 密钥
+CAPSOLVER_APIKEY = os.getenv('CAPSOLVER_APIKEY', '')
+# 每个账号预求解的验证码数量
+CAPTCHA_POOL_SIZE = int(os.getenv('CAPTCHA_POOL_SIZE', 2))
+# 验证码有效期（秒），Turnstile token 5分钟失效，预留余量
+CAPTCHA_TOKEN_TTL = float(os.getenv('CAPTCHA_TOKEN_TTL', 240))
+# 后台同时求解的验证码数量上限
+CAPTCHA_CONCURRENCY = int(os.getenv('CAPTCHA_CONCURRENCY', 5))
+# 账号多久没有遇到401后停止预求解（秒）
+CAPTCHA_IDLE_TIMEOUT = float(os.getenv('CAPTCHA_IDLE_TIMEOUT', 600))
+# cookie 分配器与数据库对账间隔（秒）
+ALLOCATOR_RECONCILE_INTERVAL = float(os.getenv('ALLOCATOR_RECONCILE_INTERVAL', 30))
+# cookie 租约有效期（秒），默认比最大等待时间多两分钟
+LEASE_TTL = int(os.getenv('LEASE_TTL', MAX_TIME * 60 + 120))
+# 过期租约回收间隔（秒）
+LEASE_REAP_INTERVAL = float(os.getenv('LEASE_REAP_INTERVAL', 5))
+# uvicorn worker 进程数，多个 worker 时由选出的 leader 执行启动回收和定时任务
+WORKERS = int(os.getenv('WORKERS', 1))
+# 非 leader 的 worker 重试竞选、leader 检查锁的间隔（秒）
+LEADER_RETRY_INTERVAL = float(os.getenv('LEADER_RETRY_INTERVAL', 10))
+# 租约持有者标识
+LEASE_OWNER = os.getenv('LEASE_OWNER', f"{socket.gethostname()}:{os.getpid()}")
+# 租约存储后端：local（进程内）或 redis（多个网关节点共享账号池）
+LEASE_BACKEND = os.getenv('LEASE_BACKEND', 'local').lower()
+LEASE_REDIS_URL = os.getenv('LEASE_REDIS_URL', 'redis://localhost:6379/0')
+# 租约键的前缀
+LEASE_KEY_PREFIX = os.getenv('LEASE_KEY_PREFIX', 'suno2openai:lease:')
+# cookies 统计结果的缓存时间（秒）
+COOKIES_STATS_CACHE_TTL = float(os.getenv('COOKIES_STATS_CACHE_TTL', 5))
+# cookie 状态批量写入数据库的间隔（秒）
+WRITE_BEHIND_INTERVAL = float(os.getenv('WRITE_BEHIND_INTERVAL', 0.3))
+# 每个账号同时进行的生成数量上限
+COOKIE_SLOTS = int(os.getenv('COOKIE_SLOTS', 1))
+# 每个 cookie 的常规刷新周期（秒）
+COOKIE_REFRESH_INTERVAL = float(os.getenv('COOKIE_REFRESH_INTERVAL', 3600))
+# 增量刷新的检查间隔（秒）与每次最多刷新的 cookie 数量（账号多时自动加大，保证一个刷新周期内全部刷新一遍）
+COOKIE_REFRESH_TICK = float(os.getenv('COOKIE_REFRESH_TICK', 10))
+COOKIE_REFRESH_SLICE = int(os.getenv('COOKIE_REFRESH_SLICE', 5))
+# 账号被使用后多久刷新（秒）
+COOKIE_REFRESH_USED_DELAY = float(os.getenv('COOKIE_REFRESH_USED_DELAY', 120))
+# 剩余次数不超过该值的账号优先刷新
+COOKIE_REFRESH_LOW_COUNT = int(os.getenv('COOKIE_REFRESH_LOW_COUNT', 5))
+# 账号健康度的平滑系数，越大越看重最近的结果
+HEALTH_ALPHA = float(os.getenv('HEALTH_ALPHA', 0.2))
+# 健康度低于该值的账号排在健康账号之后分配
+HEALTH_DEGRADED_SCORE = float(os.getenv('HEALTH_DEGRADED_SCORE', 0.8))
+# 连续失败多少次后隔离账号
+HEALTH_QUARANTINE_FAILURES = int(os.getenv('HEALTH_QUARANTINE_FAILURES', 3))
+# 隔离的初始冷却时间与上限（秒），每次再被隔离冷却时间翻倍
+HEALTH_COOLDOWN = float(os.getenv('HEALTH_COOLDOWN', 60))
+HEALTH_COOLDOWN_MAX = float(os.getenv('HEALTH_COOLDOWN_MAX', 3600))
+
+# 用量统计使用的 tiktoken 模型，计数方式 exact（tiktoken）或 approx（近似估算）
+TOKEN_MODEL = os.getenv('TOKEN_MODEL', 'gpt-3.5-turbo')
+TOKEN_COUNT_MODE = os.getenv('TOKEN_COUNT_MODE', 'exact').lower()
+# 超过该字符数的文本在线程池中编码，以及线程池大小
+TOKEN_OFFLOAD_CHARS = int(os.getenv('TOKEN_OFFLOAD_CHARS', 2000))
+TOKEN_WORKERS = int(os.getenv('TOKEN_WORKERS', 2))
+# 后台生成任务：每个任务保留的事件数、结束后保留的时间（秒）和同时进行的任务上限
+JOB_EVENT_LOG_SIZE = int(os.getenv('JOB_EVENT_LOG_SIZE', 256))
+JOB_TTL = float(os.getenv('JOB_TTL', 600))
+JOB_MAX_RUNNING = int(os.getenv('JOB_MAX_RUNNING', 200))
+
+# 检查客户端是否断开的间隔（秒）
+DISCONNECT_CHECK_INTERVAL = float(os.getenv('DISCONNECT_CHECK_INTERVAL', 1))
 
 # 处理措施
 if not PROXY:
@@ -52,9 +139,31 @@ logger.info(f"SQL_NAME: {SQL_NAME}")
 logger.info(f"SQL_PASSWORD: {SQL_PASSWORD}")
 logger.info(f"SQL_IP: {SQL_IP}")
 logger.info(f"SQL_DK: {SQL_DK}")
+logger.info(f"DB_BACKEND: {DB_BACKEND}")
 logger.info(f"COOKIES_PREFIX: {COOKIES_PREFIX}")
 logger.info(f"AUTH_KEY: {AUTH_KEY}")
 logger.info(f"RETRIES: {RETRIES}")
 logger.info(f"MAX_TIME: {MAX_TIME}")
 logger.info(f"BATCH_SIZE: {BATCH_SIZE}")
+logger.info(f"HTTP_POOL_LIMIT: {HTTP_POOL_LIMIT}")
+logger.info(f"HTTP_POOL_LIMIT_PER_HOST: {HTTP_POOL_LIMIT_PER_HOST}")
+logger.info(f"FEED_POLL_INTERVAL: {FEED_POLL_INTERVAL}")
+logger.info(f"POLL_MIN_INTERVAL: {POLL_MIN_INTERVAL}")
+logger.info(f"POLL_MAX_INTERVAL: {POLL_MAX_INTERVAL}")
+logger.info(f"CAPTCHA_POOL_SIZE: {CAPTCHA_POOL_SIZE}")
+logger.info(f"CAPTCHA_CONCURRENCY: {CAPTCHA_CONCURRENCY}")
+logger.info(f"ALLOCATOR_RECONCILE_INTERVAL: {ALLOCATOR_RECONCILE_INTERVAL}")
+logger.info(f"LEASE_TTL: {LEASE_TTL}")
+logger.info(f"WORKERS: {WORKERS}")
+logger.info(f"LEASE_OWNER: {LEASE_OWNER}")
+logger.info(f"LEASE_BACKEND: {LEASE_BACKEND}")
+logger.info(f"COOKIE_SLOTS: {COOKIE_SLOTS}")
+logger.info(f"WRITE_BEHIND_INTERVAL: {WRITE_BEHIND_INTERVAL}")
+logger.info(f"COOKIE_REFRESH_INTERVAL: {COOKIE_REFRESH_INTERVAL}")
+logger.info(f"COOKIE_REFRESH_SLICE: {COOKIE_REFRESH_SLICE}")
+logger.info(f"HEALTH_QUARANTINE_FAILURES: {HEALTH_QUARANTINE_FAILURES}")
+logger.info(f"HEALTH_COOLDOWN: {HEALTH_COOLDOWN}")
+logger.info(f"TOKEN_COUNT_MODE: {TOKEN_COUNT_MODE}")
+logger.info(f"JOB_MAX_RUNNING: {JOB_MAX_RUNNING}")
+logger.info(f"DISCONNECT_CHECK_INTERVAL: {DISCONNECT_CHECK_INTERVAL}")
 logger.info("==========================================")
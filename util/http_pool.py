@@ -0,0 +1,137 @@
+import asyncio
+import hashlib
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Mapping, Set
+
+import aiohttp
+
+from util.config import (HTTP_POOL_LIMIT, HTTP_POOL_LIMIT_PER_HOST,
+                         HTTP_KEEPALIVE_TIMEOUT, HTTP_MAX_COOKIE_SESSIONS)
+from util.logger import logger
+
+
+class HttpSessionPool:
+    """
+    进程级共享的 aiohttp 连接池
+    所有上游请求共用一个 TCPConnector（keep-alive + 单host限流），
+    每个 cookie 拥有独立的 ClientSession 和 CookieJar，账号之间互不串号
+    """
+
+    def __init__(self, limit: int = HTTP_POOL_LIMIT, limit_per_host: int = HTTP_POOL_LIMIT_PER_HOST,
+                 keepalive_timeout: float = HTTP_KEEPALIVE_TIMEOUT, max_sessions: int = HTTP_MAX_COOKIE_SESSIONS):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.max_sessions = max_sessions
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._connector: Optional[aiohttp.TCPConnector] = None
+        self._anonymous: Optional[aiohttp.ClientSession] = None
+        self._sessions: "OrderedDict[str, aiohttp.ClientSession]" = OrderedDict()
+        # 每个 cookie 会话正在进行的请求数，以及已被淘汰、等最后一个请求结束后再关闭的会话
+        self._users: Dict[aiohttp.ClientSession, int] = {}
+        self._retired: Set[aiohttp.ClientSession] = set()
+
+    # 在当前事件循环中创建连接器
+    async def start(self):
+        if self._connector is not None and not self._connector.closed:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=300,
+        )
+        self._anonymous = aiohttp.ClientSession(
+            connector=self._connector,
+            connector_owner=False,
+            cookie_jar=aiohttp.DummyCookieJar(),
+        )
+        logger.info(f"HTTP 连接池已启动，limit={self.limit}，limit_per_host={self.limit_per_host}")
+
+    # 关闭所有会话和连接器
+    async def close(self):
+        sessions = list(self._sessions.values()) + list(self._retired)
+        self._sessions.clear()
+        self._retired.clear()
+        self._users.clear()
+        if self._anonymous is not None:
+            sessions.append(self._anonymous)
+            self._anonymous = None
+        await asyncio.gather(*(session.close() for session in sessions), return_exceptions=True)
+        if self._connector is not None:
+            await self._connector.close()
+            self._connector = None
+        self._loop = None
+        logger.info("HTTP 连接池已关闭")
+
+    @staticmethod
+    def cookie_key(cookies: Mapping[str, str]) -> str:
+        raw = ";".join(f"{k}={v}" for k, v in sorted(dict(cookies).items()))
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _get_session(self, cookies: Optional[Mapping[str, str]]) -> aiohttp.ClientSession:
+        if not cookies:
+            return self._anonymous
+
+        key = self.cookie_key(cookies)
+        session = self._sessions.get(key)
+        if session is not None and not session.closed:
+            self._sessions.move_to_end(key)
+            return session
+
+        session = aiohttp.ClientSession(
+            connector=self._connector,
+            connector_owner=False,
+            cookies=cookies,
+        )
+        self._sessions[key] = session
+
+        # 超过上限时淘汰最久未使用的 cookie 会话（连接器为共享，关闭会话不会断开连接）；
+        # 仍有请求在使用的会话等它们结束后再关闭
+        while len(self._sessions) > self.max_sessions:
+            _, stale = self._sessions.popitem(last=False)
+            if self._users.get(stale):
+                self._retired.add(stale)
+            else:
+                asyncio.ensure_future(stale.close())
+        return session
+
+    @asynccontextmanager
+    async def session(self, cookies: Optional[Mapping[str, str]] = None):
+        """
+        获取共享会话
+
+        Args:
+            cookies: 账号 cookie，为空时使用不保存 cookie 的匿名会话
+        """
+        loop = asyncio.get_running_loop()
+        if self._connector is None or self._connector.closed:
+            await self.start()
+
+        # 连接器绑定在创建它的事件循环上，其他线程/循环中的调用退回到临时会话
+        if loop is not self._loop:
+            async with aiohttp.ClientSession(cookies=cookies) as temp_session:
+                yield temp_session
+            return
+
+        session = self._get_session(cookies)
+        if not cookies:
+            yield session
+            return
+        self._users[session] = self._users.get(session, 0) + 1
+        try:
+            yield session
+        finally:
+            users = self._users.get(session, 0) - 1
+            if users > 0:
+                self._users[session] = users
+            else:
+                self._users.pop(session, None)
+                if session in self._retired:
+                    self._retired.discard(session)
+                    await session.close()
+
+
+http_pool = HttpSessionPool()
@@ -0,0 +1,75 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+from util.config import LEADER_RETRY_INTERVAL, LEASE_OWNER
+from util.logger import logger
+
+
+class LeaderElector:
+    """
+    多 worker 部署时的 leader 选举
+    通过存储后端的命名锁（MySQL 的 GET_LOCK，SQLite 则是数据库文件旁的锁文件）选出一个 leader，
+    只有 leader 执行启动时的租约回收和定时任务；leader 退出或断开连接后锁被释放，其他 worker 在下次重试时接替
+    """
+
+    def __init__(self, name: str = "leader", retry_interval: float = LEADER_RETRY_INTERVAL):
+        self.name = name
+        self.retry_interval = retry_interval
+        self.db_manager = None
+        self.on_elected: Optional[Callable[[], Awaitable]] = None
+        self.on_demoted: Optional[Callable[[], Awaitable]] = None
+        self._leader = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader
+
+    # 立即竞选一次，之后定时重试或检查是否仍持有锁
+    async def start(self, db_manager, on_elected: Callable[[], Awaitable], on_demoted: Callable[[], Awaitable]):
+        self.db_manager = db_manager
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        await self.campaign()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._campaign_loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._leader:
+            self._leader = False
+            await self._run(self.on_demoted)
+            await self.db_manager.release_lock(self.name)
+
+    async def campaign(self):
+        if self._leader:
+            if await self.db_manager.check_lock(self.name):
+                return
+            self._leader = False
+            logger.warning(f"已失去 leader 身份：{LEASE_OWNER}")
+            await self._run(self.on_demoted)
+        elif await self.db_manager.acquire_lock(self.name):
+            self._leader = True
+            logger.info(f"当前 worker 成为 leader：{LEASE_OWNER}")
+            await self._run(self.on_elected)
+
+    @staticmethod
+    async def _run(callback):
+        try:
+            await callback()
+        except Exception as e:
+            logger.error(f"leader 切换任务执行失败：{e}")
+
+    async def _campaign_loop(self):
+        while True:
+            await asyncio.sleep(self.retry_interval)
+            try:
+                await self.campaign()
+            except Exception as e:
+                logger.error(f"leader 选举失败：{e}")
+
+
+leader_elector = LeaderElector()
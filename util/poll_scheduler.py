@@ -0,0 +1,166 @@
+import random
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+from util.config import (FEED_POLL_INTERVAL, POLL_MIN_INTERVAL,
+                         POLL_MAX_INTERVAL, POLL_JITTER)
+
+# 歌曲生成的阶段：歌名/歌词等信息出现 -> 实时音频可用 -> 生成完成
+STAGE_METADATA = "metadata"
+STAGE_STREAM = "stream"
+STAGE_COMPLETE = "complete"
+STAGES = (STAGE_METADATA, STAGE_STREAM, STAGE_COMPLETE)
+
+
+class ClipTimeline:
+    """单个 clip 从提交开始到各阶段出现的时间点"""
+    __slots__ = ("started", "reached", "polled")
+
+    def __init__(self, started: float):
+        self.started = started
+        self.reached: Dict[str, float] = {}
+        # 上一次拿到这个 clip 状态的时间
+        self.polled = started
+
+    def pending_stage(self) -> Optional[str]:
+        for stage in STAGES:
+            if stage not in self.reached:
+                return stage
+        return None
+
+
+# 根据一次 feed 返回的 clip 判断已经到达的阶段
+def clip_stages(clip: dict) -> List[str]:
+    stages = []
+    metadata = clip.get('metadata') or {}
+    if clip.get('title') or metadata.get('tags') or metadata.get('prompt'):
+        stages.append(STAGE_METADATA)
+    status = clip.get('status')
+    if status in ('streaming', 'complete') or clip.get('audio_url'):
+        stages.append(STAGE_STREAM)
+    if status == 'complete':
+        stages.append(STAGE_COMPLETE)
+    return stages
+
+
+def _quantile(sorted_values: List[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+class PollScheduler:
+    """
+    自适应轮询调度
+    从最近完成的 clip 中学习每个阶段的耗时分布，阶段不太可能变化时稀疏轮询，
+    接近预期转换时间时密集轮询，并加入随机抖动避免所有请求同时打到上游
+    """
+
+    def __init__(self, default_interval: float = FEED_POLL_INTERVAL, min_interval: float = POLL_MIN_INTERVAL,
+                 max_interval: float = POLL_MAX_INTERVAL, jitter: float = POLL_JITTER,
+                 window: int = 200, min_samples: int = 5, max_age: float = 3600):
+        self.default_interval = default_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.min_samples = min_samples
+        self.max_age = max_age
+        self._samples: Dict[str, deque] = {stage: deque(maxlen=window) for stage in STAGES}
+        self._sorted: Dict[str, Optional[List[float]]] = {stage: None for stage in STAGES}
+        self._timelines: Dict[str, ClipTimeline] = {}
+
+    # 开始跟踪 clip，以当前时间为起点；顺带清理超时未释放的 clip
+    def track(self, clip_id: str, started: Optional[float] = None):
+        now = time.monotonic()
+        expired = [key for key, timeline in self._timelines.items() if now - timeline.started > self.max_age]
+        for key in expired:
+            del self._timelines[key]
+        if clip_id not in self._timelines:
+            self._timelines[clip_id] = ClipTimeline(started or now)
+
+    def forget(self, clip_id: str):
+        self._timelines.pop(clip_id, None)
+
+    # 记录一次 feed 结果，首次到达某阶段时加入样本
+    # 阶段转换发生在上一次与这一次轮询之间，取中点作为样本；若取发现的时间，
+    # 比 p10 更快的转换都会在睡到 p10 之后才被发现，分布会不断向后偏移
+    def observe(self, clip: dict):
+        timeline = self._timelines.get(clip.get('id'))
+        if timeline is None:
+            return
+        now = time.monotonic()
+        reached = (timeline.polled + now) / 2
+        for stage in clip_stages(clip):
+            if stage not in timeline.reached:
+                timeline.reached[stage] = reached
+                self._samples[stage].append(reached - timeline.started)
+                self._sorted[stage] = None
+        timeline.polled = now
+
+    def _distribution(self, stage: str) -> List[float]:
+        if self._sorted[stage] is None:
+            self._sorted[stage] = sorted(self._samples[stage])
+        return self._sorted[stage]
+
+    def _clip_delay(self, clip_id: str, now: float) -> float:
+        timeline = self._timelines.get(clip_id)
+        if timeline is None:
+            return self.default_interval
+
+        stage = timeline.pending_stage()
+        if stage is None:
+            return self.min_interval
+
+        distribution = self._distribution(stage)
+        if len(distribution) < self.min_samples:
+            return self.default_interval
+
+        elapsed = now - timeline.started
+        window_start = _quantile(distribution, 0.1)
+        window_end = _quantile(distribution, 0.9)
+        if elapsed < window_start:
+            # 离预期转换还早，直接睡到窗口开始
+            return min(self.max_interval, max(self.min_interval, window_start - elapsed))
+        if elapsed <= window_end:
+            return self.min_interval
+        # 超过了大部分历史样本，回到默认间隔
+        return self.default_interval
+
+    def next_delay(self, clip_ids: Iterable[str]) -> float:
+        """
+        计算一组 clip 的下一次轮询等待时间（取最急的那个 clip）
+
+        Args:
+            clip_ids: 同一次批量请求中的 clip id
+        """
+        now = time.monotonic()
+        delays = [self._clip_delay(clip_id, now) for clip_id in clip_ids]
+        delay = min(delays) if delays else self.default_interval
+        delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return max(0.1, delay)
+
+    # 各阶段耗时分布
+    def stats(self) -> dict:
+        stages = {}
+        for stage in STAGES:
+            distribution = self._distribution(stage)
+            if distribution:
+                stages[stage] = {
+                    "samples": len(distribution),
+                    "mean": round(sum(distribution) / len(distribution), 2),
+                    "p10": round(_quantile(distribution, 0.1), 2),
+                    "p50": round(_quantile(distribution, 0.5), 2),
+                    "p90": round(_quantile(distribution, 0.9), 2),
+                }
+            else:
+                stages[stage] = {"samples": 0}
+        return {
+            "tracking": len(self._timelines),
+            "default_interval": self.default_interval,
+            "min_interval": self.min_interval,
+            "max_interval": self.max_interval,
+            "stages": stages,
+        }
+
+
+poll_scheduler = PollScheduler()
@@ -5,11 +5,12 @@ import aiomysql
 from fastapi import HTTPException
 from tenacity import retry, stop_after_attempt, wait_random
 
-from util.config import RETRIES
+from util.config import RETRIES, COOKIE_SLOTS
 from util.logger import logger
+from util.storage import CookieStorage, hash_cookie, chunks
 
 
-class DatabaseManager:
+class DatabaseManager(CookieStorage):
     def __init__(self, host, port, user, password, db_name):
         self.host = host
         self.port = port
@@ -17,6 +18,8 @@ class DatabaseManager:
         self.password = password
         self.db_name = db_name
         self.pool = None
+        # 持有命名锁的连接，锁随连接存在
+        self._locks = {}
 
     # 创建连接池 
     async def create_pool(self):
@@ -67,10 +70,67 @@ class DatabaseManager:
 
     # 关闭连接池
     async def close_db_pool(self):
+        for name in list(self._locks):
+            await self.release_lock(name)
         if self.pool:
             self.pool.close()
             await self.pool.wait_closed()
 
+    # 命名锁在整个 MySQL 实例内有效，加上数据库名避免不同部署互相影响
+    def _lock_name(self, name):
+        return f"{self.db_name}.{name}"
+
+    # 获取命名锁（GET_LOCK），锁的连接从连接池中取出一直持有，连接断开时锁自动释放
+    async def acquire_lock(self, name, timeout=0):
+        if name in self._locks:
+            return await self.check_lock(name)
+        await self.create_pool()
+        conn = await self.pool.acquire()
+        try:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT GET_LOCK(%s, %s)", (self._lock_name(name), timeout))
+                (acquired,) = await cur.fetchone()
+        except Exception as e:
+            conn.close()
+            self.pool.release(conn)
+            raise HTTPException(status_code=500, detail=f"{str(e)}")
+        if acquired == 1:
+            self._locks[name] = conn
+            return True
+        self.pool.release(conn)
+        return False
+
+    async def check_lock(self, name):
+        conn = self._locks.get(name)
+        if conn is None:
+            return False
+        try:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT IS_USED_LOCK(%s) = CONNECTION_ID()", (self._lock_name(name),))
+                (held,) = await cur.fetchone()
+            if held == 1:
+                return True
+        except Exception as e:
+            logger.error(f"检查数据库锁 {name} 失败：{e}")
+        # 连接已断开或锁已丢失
+        del self._locks[name]
+        conn.close()
+        self.pool.release(conn)
+        return False
+
+    async def release_lock(self, name):
+        conn = self._locks.pop(name, None)
+        if conn is None:
+            return
+        try:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT RELEASE_LOCK(%s)", (self._lock_name(name),))
+        except Exception as e:
+            logger.error(f"释放数据库锁 {name} 失败：{e}")
+            conn.close()
+        finally:
+            self.pool.release(conn)
+
     # 创建数据库和表
     async def create_database_and_table(self):
         await self.create_pool()
@@ -90,7 +150,16 @@ class DatabaseManager:
                             time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                             add_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                             captcha_token TEXT,
-                            UNIQUE(cookie(191))
+                            lease_owner VARCHAR(255),
+                            lease_expire TIMESTAMP NULL DEFAULT NULL,
+                            active_leases INT NOT NULL DEFAULT 0,
+                            cookie_hash CHAR(40),
+                            uses INT NOT NULL DEFAULT 0,
+                            used_at DOUBLE NOT NULL DEFAULT 0,
+                            refresh_at DOUBLE NOT NULL DEFAULT 0,
+                            UNIQUE(cookie(191)),
+                            UNIQUE KEY idx_cookie_hash (cookie_hash),
+                            KEY idx_available (active_leases, count)
                         )
                     """)
                     # 查询表结构，检查是否存在 add_time 列
@@ -109,6 +178,92 @@ class DatabaseManager:
                     else:
                         logger.info("'add_time' 列已存在，跳过添加。")
 
+                    # 租约的持有者和过期时间
+                    await cursor.execute('''
+                        SHOW COLUMNS FROM suno2openai LIKE 'lease_owner';
+                    ''')
+                    column = await cursor.fetchone()
+                    if not column:
+                        await cursor.execute('''
+                            ALTER TABLE suno2openai
+                            ADD COLUMN lease_owner VARCHAR(255),
+                            ADD COLUMN lease_expire TIMESTAMP NULL DEFAULT NULL;
+                        ''')
+                        logger.info("成功添加 'lease_owner'、'lease_expire' 列。")
+                    elif column[1].lower() != 'varchar(255)':
+                        # 租约持有者为 hostname:pid，主机名较长时 VARCHAR(64) 放不下
+                        await cursor.execute('''
+                            ALTER TABLE suno2openai MODIFY COLUMN lease_owner VARCHAR(255);
+                        ''')
+                        logger.info("成功将 'lease_owner' 列扩大为 VARCHAR(255)。")
+
+                    # 每个账号正在进行的生成数量
+                    await cursor.execute('''
+                        SHOW COLUMNS FROM suno2openai LIKE 'active_leases';
+                    ''')
+                    column = await cursor.fetchone()
+                    if not column:
+                        await cursor.execute('''
+                            ALTER TABLE suno2openai
+                            ADD COLUMN active_leases INT NOT NULL DEFAULT 0;
+                        ''')
+                        await cursor.execute('''
+                            UPDATE suno2openai SET active_leases = 1
+                            WHERE songID IS NOT NULL OR songID2 IS NOT NULL;
+                        ''')
+                        logger.info("成功添加 'active_leases' 列。")
+
+                    # cookie 的哈希标识，与 MySQL 的 SHA1() 结果一致
+                    await cursor.execute('''
+                        SHOW COLUMNS FROM suno2openai LIKE 'cookie_hash';
+                    ''')
+                    column = await cursor.fetchone()
+                    if not column:
+                        await cursor.execute('''
+                            ALTER TABLE suno2openai
+                            ADD COLUMN cookie_hash CHAR(40);
+                        ''')
+                        logger.info("成功添加 'cookie_hash' 列。")
+                    # 回填和建索引单独检查，上次迁移中途退出时在这里补完
+                    rows_updated = await cursor.execute('''
+                        UPDATE suno2openai SET cookie_hash = SHA1(cookie) WHERE cookie_hash IS NULL;
+                    ''')
+                    if rows_updated:
+                        logger.info(f"回填 'cookie_hash' {rows_updated} 行。")
+                    await cursor.execute('''
+                        SHOW INDEX FROM suno2openai WHERE Key_name = 'idx_cookie_hash';
+                    ''')
+                    if not await cursor.fetchone():
+                        await cursor.execute('''
+                            ALTER TABLE suno2openai ADD UNIQUE INDEX idx_cookie_hash (cookie_hash);
+                        ''')
+                        logger.info("成功添加 'idx_cookie_hash' 索引。")
+
+                    # 各 worker 记录的使用次数、最近使用时间和刷新请求，由 leader 的增量刷新读取
+                    await cursor.execute('''
+                        SHOW COLUMNS FROM suno2openai LIKE 'refresh_at';
+                    ''')
+                    column = await cursor.fetchone()
+                    if not column:
+                        await cursor.execute('''
+                            ALTER TABLE suno2openai
+                            ADD COLUMN uses INT NOT NULL DEFAULT 0,
+                            ADD COLUMN used_at DOUBLE NOT NULL DEFAULT 0,
+                            ADD COLUMN refresh_at DOUBLE NOT NULL DEFAULT 0;
+                        ''')
+                        logger.info("成功添加 'uses'、'used_at'、'refresh_at' 列。")
+
+                    # 可用账号筛选所用的组合索引
+                    await cursor.execute('''
+                        SHOW INDEX FROM suno2openai WHERE Key_name = 'idx_available';
+                    ''')
+                    index = await cursor.fetchone()
+                    if not index:
+                        await cursor.execute('''
+                            ALTER TABLE suno2openai ADD INDEX idx_available (active_leases, count);
+                        ''')
+                        logger.info("成功添加 'idx_available' 索引。")
+
                     await conn.commit()
                 except Exception as e:
                     await conn.rollback()
@@ -122,25 +277,25 @@ class DatabaseManager:
                 try:
                     # 先查询一个不被锁定且可用的cookie
                     await cursor.execute('''
-                            SELECT cookie FROM suno2openai
-                            WHERE songID IS NULL AND songID2 IS NULL AND count > 0
+                            SELECT cookie_hash FROM suno2openai
+                            WHERE active_leases < %s AND count > 0
                             ORDER BY RAND() LIMIT 1
                             LOCK IN SHARE MODE;
-                        ''')
+                        ''', (COOKIE_SLOTS,))
                     row = await cursor.fetchone()
                     if not row:
                         raise HTTPException(status_code=429, detail="未找到可用的suno cookie")
 
-                    cookie = row['cookie']
+                    cookie_id = row['cookie_hash']
                     # 开始事务
                     await conn.begin()
                     try:
                         # 第二个查询，锁定获取的cookie
                         await cursor.execute('''
                                 SELECT cookie FROM suno2openai 
-                                WHERE cookie = %s AND songID IS NULL AND songID2 IS NULL AND count > 0
+                                WHERE cookie_hash = %s AND active_leases < %s AND count > 0
                                 LIMIT 1 FOR UPDATE;
-                            ''', (cookie,))
+                            ''', (cookie_id, COOKIE_SLOTS))
                         row = await cursor.fetchone()
                         if not row:
                             raise HTTPException(status_code=429, detail="并发更新cookie时发生并发冲突，重试中...")
@@ -149,9 +304,10 @@ class DatabaseManager:
                         # 然后更新选中的cookie
                         await cursor.execute('''
                                 UPDATE suno2openai
-                                SET count = count - 1, songID = %s, songID2 = %s, time = CURRENT_TIMESTAMP
-                                WHERE cookie = %s AND songID IS NULL AND songID2 IS NULL AND count > 0;
-                            ''', ("tmp", "tmp", cookie))
+                                SET count = count - 1, songID = %s, songID2 = %s, time = CURRENT_TIMESTAMP,
+                                    active_leases = active_leases + 1
+                                WHERE cookie_hash = %s AND active_leases < %s AND count > 0;
+                            ''', ("tmp", "tmp", cookie_id, COOKIE_SLOTS))
                         await conn.commit()
                         return cookie
                     except Exception as update_error:
@@ -177,9 +333,9 @@ class DatabaseManager:
                     # 查询现有记录的 songID 和 songID2
                     select_sql = """
                         SELECT songID, songID2, time FROM suno2openai
-                        WHERE cookie = %s
+                        WHERE cookie_hash = %s
                     """
-                    await cur.execute(select_sql, (cookie,))
+                    await cur.execute(select_sql, (hash_cookie(cookie),))
                     result = await cur.fetchone()
 
                     if result:
@@ -192,18 +348,18 @@ class DatabaseManager:
                             update_sql = """
                                 UPDATE suno2openai
                                 SET songID = NULL, songID2 = NULL
-                                WHERE cookie = %s
+                                WHERE cookie_hash = %s
                             """
-                            await cur.execute(update_sql, (cookie,))
+                            await cur.execute(update_sql, (hash_cookie(cookie),))
                             await conn.commit()
 
                     # 插入或更新记录
                     sql = """
-                        INSERT INTO suno2openai (cookie, songID, songID2, count, time)
-                        VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
+                        INSERT INTO suno2openai (cookie, cookie_hash, songID, songID2, count, time)
+                        VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
                         ON DUPLICATE KEY UPDATE count = VALUES(count)
                     """
-                    await cur.execute(sql, (cookie, songID, songID2, count))
+                    await cur.execute(sql, (cookie, hash_cookie(cookie), songID, songID2, count))
                     await conn.commit()
             except Exception as e:
                 await conn.rollback()
@@ -220,13 +376,18 @@ class DatabaseManager:
                 async with conn.cursor() as cur:
                     # 锁定目标行以防止其他事务修改
                     await cur.execute('''
-                        SELECT cookie FROM suno2openai WHERE cookie = %s FOR UPDATE;
-                    ''', (cookie,))
+                        SELECT id FROM suno2openai WHERE cookie_hash = %s FOR UPDATE;
+                    ''', (hash_cookie(cookie),))
+                    # 释放一个并发槽位，最后一个槽位释放后才清空占用标记（MySQL 按顺序使用更新后的值）
                     await cur.execute('''
                         UPDATE suno2openai
-                        SET songID = NULL, songID2 = NULL
-                        WHERE cookie = %s
-                    ''', cookie)
+                        SET active_leases = GREATEST(active_leases - 1, 0),
+                            songID = IF(active_leases = 0, NULL, songID),
+                            songID2 = IF(active_leases = 0, NULL, songID2),
+                            lease_owner = IF(active_leases = 0, NULL, lease_owner),
+                            lease_expire = IF(active_leases = 0, NULL, lease_expire)
+                        WHERE cookie_hash = %s
+                    ''', hash_cookie(cookie))
                     await conn.commit()
             except Exception as e:
                 await conn.rollback()
@@ -247,7 +408,7 @@ class DatabaseManager:
                     ''')
                     await cur.execute('''
                         UPDATE suno2openai
-                        SET songID = NULL, songID2 = NULL;
+                        SET songID = NULL, songID2 = NULL, lease_owner = NULL, lease_expire = NULL, active_leases = 0;
                     ''')
                     await conn.commit()
                     rows_updated = cur.rowcount
@@ -256,6 +417,46 @@ class DatabaseManager:
                 await conn.rollback()
                 raise HTTPException(status_code=500, detail=f"{str(e)}")
 
+    # 回收过期的租约，没有过期时间的旧租约按租用时间 time 判断
+    @retry(stop=stop_after_attempt(RETRIES + 2), wait=wait_random(min=0.10, max=0.3))
+    async def reap_expired_leases(self, ttl):
+        await self.create_pool()
+        async with self.pool.acquire() as conn:
+            try:
+                async with conn.cursor() as cur:
+                    await cur.execute('''
+                        UPDATE suno2openai
+                        SET songID = NULL, songID2 = NULL, lease_owner = NULL, lease_expire = NULL, active_leases = 0
+                        WHERE (songID IS NOT NULL OR songID2 IS NOT NULL OR active_leases > 0)
+                        AND (lease_expire < CURRENT_TIMESTAMP
+                             OR (lease_expire IS NULL AND time < DATE_SUB(CURRENT_TIMESTAMP, INTERVAL %s SECOND)))
+                    ''', (int(ttl),))
+                    await conn.commit()
+                    return cur.rowcount
+            except Exception as e:
+                await conn.rollback()
+                raise HTTPException(status_code=500, detail=f"{str(e)}")
+
+    # 获取数据库中所有未释放的租约
+    @retry(stop=stop_after_attempt(RETRIES + 2), wait=wait_random(min=0.10, max=0.3))
+    async def get_leases(self):
+        await self.create_pool()
+        async with self.pool.acquire() as conn:
+            try:
+                async with conn.cursor(aiomysql.DictCursor) as cur:
+                    await cur.execute('''
+                        SELECT cookie, songID, songID2, active_leases, lease_owner, lease_expire, time FROM suno2openai
+                        WHERE songID IS NOT NULL OR songID2 IS NOT NULL OR active_leases > 0
+                    ''')
+                    result = await cur.fetchall()
+                    for row in result:
+                        for key in row:
+                            row[key] = str(row[key]) if row[key] is not None else None
+                    await conn.commit()
+                    return result
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"{str(e)}")
+
     # 更新cookie的count
     async def update_cookie_count(self, cookie, count_increment, update=None):
         await self.create_pool()
@@ -266,20 +467,20 @@ class DatabaseManager:
                 async with conn.cursor() as cur:
                     # 锁定目标行以防止其他事务修改
                     await cur.execute('''
-                        SELECT cookie FROM suno2openai WHERE cookie = %s FOR UPDATE;
-                    ''', (cookie,))
+                        SELECT id FROM suno2openai WHERE cookie_hash = %s FOR UPDATE;
+                    ''', (hash_cookie(cookie),))
                     if update is not None:
                         await cur.execute('''
                             UPDATE suno2openai
                             SET count = %s
-                            WHERE cookie = %s
-                        ''', (count_increment, cookie))
+                            WHERE cookie_hash = %s
+                        ''', (count_increment, hash_cookie(cookie)))
                     else:
                         await cur.execute('''
                             UPDATE suno2openai
                             SET count = count + %s
-                            WHERE cookie = %s
-                        ''', (count_increment, cookie))
+                            WHERE cookie_hash = %s
+                        ''', (count_increment, hash_cookie(cookie)))
                     await conn.commit()
             except Exception as e:
                 await conn.rollback()
@@ -304,8 +505,8 @@ class DatabaseManager:
                     await cur.execute('''
                         UPDATE suno2openai
                         SET count = count - 1, songID = %s, songID2 = %s, time = CURRENT_TIMESTAMP
-                        WHERE cookie = %s
-                    ''', (songID1, songID2, cookie))
+                        WHERE cookie_hash = %s
+                    ''', (songID1, songID2, hash_cookie(cookie)))
                     await conn.commit()
             except Exception as e:
                 await conn.rollback()
@@ -360,6 +561,20 @@ class DatabaseManager:
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"{str(e)}")
 
+    # 获取所有账号的租用状态和剩余次数，供内存分配器对账
+    @retry(stop=stop_after_attempt(RETRIES + 2), wait=wait_random(min=0.10, max=0.3))
+    async def get_cookie_states(self):
+        await self.create_pool()
+        async with self.pool.acquire() as conn:
+            try:
+                async with conn.cursor(aiomysql.DictCursor) as cur:
+                    await cur.execute("SELECT cookie, songID, songID2, active_leases, count, uses, used_at, refresh_at "
+                                      "FROM suno2openai")
+                    await conn.commit()
+                    return await cur.fetchall()
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"{str(e)}")
+
     # 获取无效的cookies
     @retry(stop=stop_after_attempt(RETRIES + 2), wait=wait_random(min=0.10, max=0.3))
     async def get_invalid_cookies(self):
@@ -391,6 +606,46 @@ class DatabaseManager:
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"{str(e)}")
 
+    # 一次聚合查询获取cookies数量、有效数量和剩余次数总和
+    @retry(stop=stop_after_attempt(RETRIES + 2), wait=wait_random(min=0.10, max=0.3))
+    async def get_cookies_summary(self):
+        await self.create_pool()
+        async with self.pool.acquire() as conn:
+            try:
+                async with conn.cursor(aiomysql.DictCursor) as cur:
+                    await cur.execute('''
+                        SELECT COUNT(*) AS cookie_count,
+                               COALESCE(SUM(count >= 0), 0) AS valid_cookie_count,
+                               COALESCE(SUM(count), 0) AS remaining_count
+                        FROM suno2openai
+                    ''')
+                    result = await cur.fetchone()
+                    await conn.commit()
+                    return {key: int(value) for key, value in result.items()}
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"{str(e)}")
+
+    # 按 id 分页获取cookies（keyset 分页），返回 id 大于 after_id 的至多 limit 行
+    @retry(stop=stop_after_attempt(RETRIES + 2), wait=wait_random(min=0.10, max=0.3))
+    async def get_cookies_page(self, after_id=0, limit=100):
+        await self.create_pool()
+        async with self.pool.acquire() as conn:
+            try:
+                async with conn.cursor(aiomysql.DictCursor) as cur:
+                    await cur.execute('''
+                        SELECT id, cookie, songID, songID2, count, time, add_time FROM suno2openai
+                        WHERE id > %s ORDER BY id LIMIT %s
+                    ''', (after_id, limit))
+                    result = await cur.fetchall()
+                    for row in result:
+                        for key in row:
+                            if key != 'id':
+                                row[key] = str(row[key])
+                    await conn.commit()
+                    return result
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"{str(e)}")
+
     @retry(stop=stop_after_attempt(RETRIES + 2), wait=wait_random(min=0.10, max=0.3))
     async def get_row_cookies(self):
         try:
@@ -423,15 +678,130 @@ class DatabaseManager:
                 async with conn.cursor(aiomysql.DictCursor) as cur:
                     # 锁定目标行以防止其他事务修改
                     await cur.execute('''
-                        SELECT cookie FROM suno2openai WHERE cookie = %s FOR UPDATE;
-                    ''', (cookie,))
-                    await cur.execute("DELETE FROM suno2openai WHERE cookie = %s", cookie)
+                        SELECT id FROM suno2openai WHERE cookie_hash = %s FOR UPDATE;
+                    ''', (hash_cookie(cookie),))
+                    await cur.execute("DELETE FROM suno2openai WHERE cookie_hash = %s", hash_cookie(cookie))
                     await conn.commit()
                     return True
             except Exception as e:
                 await conn.rollback()
                 raise HTTPException(status_code=500, detail=f"{str(e)}")
 
+    # 批量删除cookies，分块执行多行语句，全部在一个事务内完成，返回删除的行数
+    @retry(stop=stop_after_attempt(RETRIES + 2), wait=wait_random(min=0.10, max=0.3))
+    async def delete_cookies_bulk(self, cookies):
+        hashes = list({hash_cookie(cookie) for cookie in cookies})
+        if not hashes:
+            return 0
+        await self.create_pool()
+        async with self.pool.acquire() as conn:
+            try:
+                await conn.begin()
+                rows_deleted = 0
+                async with conn.cursor() as cur:
+                    for chunk in chunks(hashes):
+                        placeholders = ", ".join(["%s"] * len(chunk))
+                        await cur.execute(f"DELETE FROM suno2openai WHERE cookie_hash IN ({placeholders})", chunk)
+                        rows_deleted += cur.rowcount
+                await conn.commit()
+                return rows_deleted
+            except Exception as e:
+                await conn.rollback()
+                raise HTTPException(status_code=500, detail=f"{str(e)}")
+
+    # 批量插入或更新cookies的count，items 为 (cookie, count) 列表
+    @retry(stop=stop_after_attempt(RETRIES + 2), wait=wait_random(min=0.10, max=0.3))
+    async def upsert_cookies_bulk(self, items):
+        rows = list({hash_cookie(cookie): (cookie, hash_cookie(cookie), count) for cookie, count in items}.values())
+        if not rows:
+            return 0
+        await self.create_pool()
+        async with self.pool.acquire() as conn:
+            try:
+                await conn.begin()
+                async with conn.cursor() as cur:
+                    for chunk in chunks(rows):
+                        placeholders = ", ".join(["(%s, %s, %s, CURRENT_TIMESTAMP)"] * len(chunk))
+                        await cur.execute(f'''
+                            INSERT INTO suno2openai (cookie, cookie_hash, count, time)
+                            VALUES {placeholders}
+                            ON DUPLICATE KEY UPDATE count = VALUES(count)
+                        ''', [value for row in chunk for value in row])
+                await conn.commit()
+                return len(rows)
+            except Exception as e:
+                await conn.rollback()
+                raise HTTPException(status_code=500, detail=f"{str(e)}")
+
+    # 批量更新已存在cookies的count，counts 为 {cookie: count}，返回更新的行数
+    @retry(stop=stop_after_attempt(RETRIES + 2), wait=wait_random(min=0.10, max=0.3))
+    async def update_counts_bulk(self, counts):
+        rows = list({hash_cookie(cookie): count for cookie, count in counts.items()}.items())
+        if not rows:
+            return 0
+        await self.create_pool()
+        async with self.pool.acquire() as conn:
+            try:
+                await conn.begin()
+                rows_updated = 0
+                async with conn.cursor() as cur:
+                    for chunk in chunks(rows):
+                        cases = " ".join(["WHEN %s THEN %s"] * len(chunk))
+                        placeholders = ", ".join(["%s"] * len(chunk))
+                        await cur.execute(f'''
+                            UPDATE suno2openai
+                            SET count = CASE cookie_hash {cases} END
+                            WHERE cookie_hash IN ({placeholders})
+                        ''', [value for row in chunk for value in row] + [cookie_id for cookie_id, _ in chunk])
+                        rows_updated += cur.rowcount
+                await conn.commit()
+                return rows_updated
+            except Exception as e:
+                await conn.rollback()
+                raise HTTPException(status_code=500, detail=f"{str(e)}")
+
+    # 批量写入合并后的cookie状态，全部在一个事务内完成
+    # rows 为 (cookie, 租用数, 归还数, 设置的count或None, count减少量, 租约持有者, 租约有效期, 使用次数, 最近使用时间, 刷新请求时间) 列表，
+    # deletes 为要删除的cookies
+    async def apply_cookie_writes(self, rows, deletes=()):
+        if not rows and not deletes:
+            return
+        await self.create_pool()
+        async with self.pool.acquire() as conn:
+            try:
+                await conn.begin()
+                async with conn.cursor() as cur:
+                    if rows:
+                        # MySQL 按顺序使用更新后的 active_leases，最后一个槽位释放后清空占用标记
+                        await cur.executemany('''
+                            UPDATE suno2openai
+                            SET count = COALESCE(%s, count) - %s,
+                                active_leases = GREATEST(active_leases + %s - %s, 0),
+                                time = IF(%s > 0, CURRENT_TIMESTAMP, time),
+                                songID = IF(active_leases = 0, NULL, 'tmp'),
+                                songID2 = IF(active_leases = 0, NULL, 'tmp'),
+                                lease_owner = IF(active_leases = 0, NULL, COALESCE(%s, lease_owner)),
+                                lease_expire = IF(active_leases = 0, NULL,
+                                                  IF(%s > 0, GREATEST(COALESCE(lease_expire, CURRENT_TIMESTAMP),
+                                                                      DATE_ADD(CURRENT_TIMESTAMP, INTERVAL %s SECOND)),
+                                                     lease_expire)),
+                                uses = uses + %s,
+                                used_at = GREATEST(used_at, %s),
+                                refresh_at = GREATEST(refresh_at, %s)
+                            WHERE cookie_hash = %s
+                        ''', [(count_set, count_delta, acquired, released, acquired, owner, acquired, int(ttl),
+                               uses, used_at, refresh_at, hash_cookie(cookie))
+                              for cookie, acquired, released, count_set, count_delta, owner, ttl, uses, used_at,
+                              refresh_at in rows])
+                    hashes = [hash_cookie(cookie) for cookie in deletes]
+                    for chunk in chunks(hashes):
+                        placeholders = ", ".join(["%s"] * len(chunk))
+                        await cur.execute(f"DELETE FROM suno2openai WHERE cookie_hash IN ({placeholders})", chunk)
+                await conn.commit()
+            except Exception as e:
+                await conn.rollback()
+                raise HTTPException(status_code=500, detail=f"{str(e)}")
+
     @retry(stop=stop_after_attempt(RETRIES + 2), wait=wait_random(min=0.10, max=0.3))
     async def update_captcha_token(self, cookie: str, captcha_token: str):
         """更新指定cookie的captcha_token"""
@@ -442,8 +812,8 @@ class DatabaseManager:
                     await cur.execute('''
                         UPDATE suno2openai
                         SET captcha_token = %s
-                        WHERE cookie = %s
-                    ''', (captcha_token, cookie))
+                        WHERE cookie_hash = %s
+                    ''', (captcha_token, hash_cookie(cookie)))
                     await conn.commit()
             except Exception as e:
                 await conn.rollback()
@@ -459,8 +829,8 @@ class DatabaseManager:
                     await cur.execute('''
                         SELECT captcha_token 
                         FROM suno2openai 
-                        WHERE cookie = %s
-                    ''', (cookie,))
+                        WHERE cookie_hash = %s
+                    ''', (hash_cookie(cookie),))
                     result = await cur.fetchone()
                     return result['captcha_token'] if result else None
             except Exception as e:
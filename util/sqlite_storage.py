@@ -0,0 +1,449 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from fastapi import HTTPException
+
+from util.config import COOKIE_SLOTS
+from util.logger import logger
+from util.storage import CookieStorage, hash_cookie, chunks
+
+# 锁文件在 Unix 上用 flock，Windows 上用 msvcrt.locking
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+# 尝试以非阻塞方式锁住文件，已被其他进程锁住时返回 False
+def _try_lock(fd: int) -> bool:
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(fd: int):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class SQLiteManager(CookieStorage):
+    """
+    嵌入式 SQLite 存储后端，适合单机部署
+    使用 WAL 模式，所有读写在一个专用线程中串行执行，不阻塞事件循环；
+    表结构和各方法的语义与 MySQL 的 DatabaseManager 保持一致
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # 命名锁对应的锁文件描述符
+        self._locks = {}
+
+    async def create_pool(self):
+        if self.conn is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+            self.conn = await asyncio.get_running_loop().run_in_executor(self._executor, self._connect)
+            logger.info(f"SQLite 数据库已打开：{self.path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    async def close_db_pool(self):
+        for name in list(self._locks):
+            await self.release_lock(name)
+        if self.conn is not None:
+            conn, self.conn = self.conn, None
+            await asyncio.get_running_loop().run_in_executor(self._executor, conn.close)
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    # 命名锁使用数据库文件旁的锁文件，只在同一台机器的进程间有效
+    async def acquire_lock(self, name, timeout=0):
+        if name in self._locks:
+            return True
+        fd = os.open(f"{self.path}.{name}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = time.monotonic() + timeout
+        while not _try_lock(fd):
+            if time.monotonic() >= deadline:
+                os.close(fd)
+                return False
+            await asyncio.sleep(0.1)
+        self._locks[name] = fd
+        return True
+
+    async def check_lock(self, name):
+        return name in self._locks
+
+    async def release_lock(self, name):
+        fd = self._locks.pop(name, None)
+        if fd is not None:
+            _unlock(fd)
+            os.close(fd)
+
+    # 在专用线程中以一个事务执行 func(cursor)，出错时回滚并抛出 HTTPException
+    async def _run(self, func, *args):
+        await self.create_pool()
+
+        def transaction():
+            cur = self.conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(cur, *args)
+                cur.execute("COMMIT")
+                return result
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+            finally:
+                cur.close()
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, transaction)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"{str(e)}")
+
+    @staticmethod
+    def _rows(cur):
+        return [dict(row) for row in cur.fetchall()]
+
+    async def create_database_and_table(self):
+        def create(cur):
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS suno2openai (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    cookie TEXT NOT NULL UNIQUE,
+                    songID VARCHAR(255),
+                    songID2 VARCHAR(255),
+                    count INT,
+                    time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    add_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    captcha_token TEXT,
+                    lease_owner VARCHAR(255),
+                    lease_expire TIMESTAMP NULL DEFAULT NULL,
+                    active_leases INT NOT NULL DEFAULT 0,
+                    cookie_hash CHAR(40) UNIQUE,
+                    uses INT NOT NULL DEFAULT 0,
+                    used_at REAL NOT NULL DEFAULT 0,
+                    refresh_at REAL NOT NULL DEFAULT 0
+                )
+            """)
+            # 早期版本创建的表没有增量刷新所需的列
+            columns = {row[1] for row in cur.execute("PRAGMA table_info(suno2openai)").fetchall()}
+            for column, definition in (("uses", "INT NOT NULL DEFAULT 0"), ("used_at", "REAL NOT NULL DEFAULT 0"),
+                                       ("refresh_at", "REAL NOT NULL DEFAULT 0")):
+                if column not in columns:
+                    cur.execute(f"ALTER TABLE suno2openai ADD COLUMN {column} {definition}")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_available ON suno2openai (active_leases, count)")
+
+        await self._run(create)
+
+    async def get_request_cookie(self):
+        def lease(cur):
+            cur.execute('''
+                SELECT cookie, cookie_hash FROM suno2openai
+                WHERE active_leases < ? AND count > 0
+                ORDER BY RANDOM() LIMIT 1
+            ''', (COOKIE_SLOTS,))
+            row = cur.fetchone()
+            if not row:
+                raise HTTPException(status_code=429, detail="未找到可用的suno cookie")
+            cur.execute('''
+                UPDATE suno2openai
+                SET count = count - 1, songID = ?, songID2 = ?, time = CURRENT_TIMESTAMP,
+                    active_leases = active_leases + 1
+                WHERE cookie_hash = ?
+            ''', ("tmp", "tmp", row['cookie_hash']))
+            return row['cookie']
+
+        return await self._run(lease)
+
+    async def insert_or_update_cookie(self, cookie, songID=None, songID2=None, count=0):
+        def upsert(cur):
+            # 与 MySQL 后端一致：占用超过10分钟的 songID 和 songID2 清空
+            cur.execute('''
+                UPDATE suno2openai SET songID = NULL, songID2 = NULL
+                WHERE cookie_hash = ? AND songID IS NOT NULL AND songID2 IS NOT NULL
+                AND time < datetime('now', '-10 minutes')
+            ''', (hash_cookie(cookie),))
+            cur.execute('''
+                INSERT INTO suno2openai (cookie, cookie_hash, songID, songID2, count, time)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(cookie_hash) DO UPDATE SET count = excluded.count
+            ''', (cookie, hash_cookie(cookie), songID, songID2, count))
+
+        await self._run(upsert)
+
+    async def delete_song_ids(self, cookie):
+        def release(cur):
+            # SQLite 的 SET 中引用的都是更新前的值
+            cur.execute('''
+                UPDATE suno2openai
+                SET active_leases = MAX(active_leases - 1, 0),
+                    songID = CASE WHEN active_leases <= 1 THEN NULL ELSE songID END,
+                    songID2 = CASE WHEN active_leases <= 1 THEN NULL ELSE songID2 END,
+                    lease_owner = CASE WHEN active_leases <= 1 THEN NULL ELSE lease_owner END,
+                    lease_expire = CASE WHEN active_leases <= 1 THEN NULL ELSE lease_expire END
+                WHERE cookie_hash = ?
+            ''', (hash_cookie(cookie),))
+
+        await self._run(release)
+
+    async def delete_songIDS(self):
+        def reset(cur):
+            cur.execute('''
+                UPDATE suno2openai
+                SET songID = NULL, songID2 = NULL, lease_owner = NULL, lease_expire = NULL, active_leases = 0
+            ''')
+            return cur.rowcount
+
+        return await self._run(reset)
+
+    async def reap_expired_leases(self, ttl):
+        def reap(cur):
+            cur.execute('''
+                UPDATE suno2openai
+                SET songID = NULL, songID2 = NULL, lease_owner = NULL, lease_expire = NULL, active_leases = 0
+                WHERE (songID IS NOT NULL OR songID2 IS NOT NULL OR active_leases > 0)
+                AND (lease_expire < CURRENT_TIMESTAMP
+                     OR (lease_expire IS NULL AND time < datetime('now', ?)))
+            ''', (f"-{int(ttl)} seconds",))
+            return cur.rowcount
+
+        return await self._run(reap)
+
+    async def get_leases(self):
+        def select(cur):
+            cur.execute('''
+                SELECT cookie, songID, songID2, active_leases, lease_owner, lease_expire, time FROM suno2openai
+                WHERE songID IS NOT NULL OR songID2 IS NOT NULL OR active_leases > 0
+            ''')
+            return [{key: str(value) if value is not None else None for key, value in row.items()}
+                    for row in self._rows(cur)]
+
+        return await self._run(select)
+
+    async def update_cookie_count(self, cookie, count_increment, update=None):
+        def update_count(cur):
+            if update is not None:
+                cur.execute("UPDATE suno2openai SET count = ? WHERE cookie_hash = ?",
+                            (count_increment, hash_cookie(cookie)))
+            else:
+                cur.execute("UPDATE suno2openai SET count = count + ? WHERE cookie_hash = ?",
+                            (count_increment, hash_cookie(cookie)))
+
+        await self._run(update_count)
+
+    async def query_cookies(self):
+        def select(cur):
+            cur.execute('SELECT * FROM suno2openai')
+            return self._rows(cur)
+
+        return await self._run(select)
+
+    async def update_song_ids_by_cookie(self, cookie, songID1, songID2):
+        def update_ids(cur):
+            cur.execute('''
+                UPDATE suno2openai
+                SET count = count - 1, songID = ?, songID2 = ?, time = CURRENT_TIMESTAMP
+                WHERE cookie_hash = ?
+            ''', (songID1, songID2, hash_cookie(cookie)))
+
+        await self._run(update_ids)
+
+    async def get_cookies_count(self):
+        def select(cur):
+            cur.execute("SELECT SUM(count) AS total_count FROM suno2openai")
+            return cur.fetchone()['total_count'] or 0
+
+        return await self._run(select)
+
+    async def get_valid_cookies_count(self):
+        def select(cur):
+            cur.execute("SELECT COUNT(cookie) AS total_count FROM suno2openai WHERE count >= 0")
+            return cur.fetchone()['total_count'] or 0
+
+        return await self._run(select)
+
+    async def get_cookies(self):
+        def select(cur):
+            cur.execute("SELECT cookie FROM suno2openai")
+            return self._rows(cur)
+
+        return await self._run(select)
+
+    async def get_cookie_states(self):
+        def select(cur):
+            cur.execute("SELECT cookie, songID, songID2, active_leases, count, uses, used_at, refresh_at "
+                        "FROM suno2openai")
+            return self._rows(cur)
+
+        return await self._run(select)
+
+    async def get_invalid_cookies(self):
+        def select(cur):
+            cur.execute("SELECT cookie FROM suno2openai WHERE count < 0")
+            return self._rows(cur)
+
+        return await self._run(select)
+
+    async def get_all_cookies(self):
+        def select(cur):
+            cur.execute("SELECT cookie, songID, songID2, count, time, add_time FROM suno2openai")
+            return json.dumps([{key: str(value) for key, value in row.items()} for row in self._rows(cur)])
+
+        return await self._run(select)
+
+    async def get_cookies_summary(self):
+        def select(cur):
+            cur.execute('''
+                SELECT COUNT(*) AS cookie_count,
+                       COALESCE(SUM(count >= 0), 0) AS valid_cookie_count,
+                       COALESCE(SUM(count), 0) AS remaining_count
+                FROM suno2openai
+            ''')
+            return {key: int(value) for key, value in dict(cur.fetchone()).items()}
+
+        return await self._run(select)
+
+    async def get_cookies_page(self, after_id=0, limit=100):
+        def select(cur):
+            cur.execute('''
+                SELECT id, cookie, songID, songID2, count, time, add_time FROM suno2openai
+                WHERE id > ? ORDER BY id LIMIT ?
+            ''', (after_id, limit))
+            return [{key: value if key == 'id' else str(value) for key, value in row.items()}
+                    for row in self._rows(cur)]
+
+        return await self._run(select)
+
+    async def get_row_cookies(self):
+        def select(cur):
+            cur.execute("SELECT cookie FROM suno2openai")
+            return [row['cookie'] for row in cur.fetchall()]
+
+        return await self._run(select)
+
+    async def delete_cookies(self, cookie: str):
+        def delete(cur):
+            cur.execute("DELETE FROM suno2openai WHERE cookie_hash = ?", (hash_cookie(cookie),))
+            return True
+
+        return await self._run(delete)
+
+    async def delete_cookies_bulk(self, cookies):
+        hashes = list({hash_cookie(cookie) for cookie in cookies})
+        if not hashes:
+            return 0
+
+        def delete(cur):
+            rows_deleted = 0
+            for chunk in chunks(hashes):
+                placeholders = ", ".join(["?"] * len(chunk))
+                cur.execute(f"DELETE FROM suno2openai WHERE cookie_hash IN ({placeholders})", chunk)
+                rows_deleted += cur.rowcount
+            return rows_deleted
+
+        return await self._run(delete)
+
+    async def upsert_cookies_bulk(self, items):
+        rows = list({hash_cookie(cookie): (cookie, hash_cookie(cookie), count) for cookie, count in items}.values())
+        if not rows:
+            return 0
+
+        def upsert(cur):
+            cur.executemany('''
+                INSERT INTO suno2openai (cookie, cookie_hash, count, time)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(cookie_hash) DO UPDATE SET count = excluded.count
+            ''', rows)
+            return len(rows)
+
+        return await self._run(upsert)
+
+    async def update_counts_bulk(self, counts):
+        rows = [(count, hash_cookie(cookie)) for cookie, count in counts.items()]
+        if not rows:
+            return 0
+
+        def update(cur):
+            cur.executemany("UPDATE suno2openai SET count = ? WHERE cookie_hash = ?", rows)
+            return cur.rowcount
+
+        return await self._run(update)
+
+    async def apply_cookie_writes(self, rows, deletes=()):
+        if not rows and not deletes:
+            return
+
+        def apply(cur):
+            if rows:
+                # SQLite 的 SET 中引用的都是更新前的值，先算出新的占用数
+                cur.executemany('''
+                    UPDATE suno2openai
+                    SET count = COALESCE(:count_set, count) - :count_delta,
+                        active_leases = MAX(active_leases + :acquired - :released, 0),
+                        time = CASE WHEN :acquired > 0 THEN CURRENT_TIMESTAMP ELSE time END,
+                        songID = CASE WHEN active_leases + :acquired - :released <= 0 THEN NULL ELSE 'tmp' END,
+                        songID2 = CASE WHEN active_leases + :acquired - :released <= 0 THEN NULL ELSE 'tmp' END,
+                        lease_owner = CASE WHEN active_leases + :acquired - :released <= 0 THEN NULL
+                                           ELSE COALESCE(:owner, lease_owner) END,
+                        lease_expire = CASE
+                            WHEN active_leases + :acquired - :released <= 0 THEN NULL
+                            WHEN :acquired > 0 THEN MAX(COALESCE(lease_expire, CURRENT_TIMESTAMP),
+                                                        datetime('now', :expire))
+                            ELSE lease_expire END,
+                        uses = uses + :uses,
+                        used_at = MAX(used_at, :used_at),
+                        refresh_at = MAX(refresh_at, :refresh_at)
+                    WHERE cookie_hash = :cookie_hash
+                ''', [{"count_set": count_set, "count_delta": count_delta, "acquired": acquired,
+                       "released": released, "owner": owner, "expire": f"+{int(ttl)} seconds",
+                       "uses": uses, "used_at": used_at, "refresh_at": refresh_at,
+                       "cookie_hash": hash_cookie(cookie)}
+                      for cookie, acquired, released, count_set, count_delta, owner, ttl, uses, used_at,
+                      refresh_at in rows])
+            for chunk in chunks([hash_cookie(cookie) for cookie in deletes]):
+                placeholders = ", ".join(["?"] * len(chunk))
+                cur.execute(f"DELETE FROM suno2openai WHERE cookie_hash IN ({placeholders})", chunk)
+
+        await self._run(apply)
+
+    async def update_captcha_token(self, cookie: str, captcha_token: str):
+        """更新指定cookie的captcha_token"""
+        def update(cur):
+            cur.execute("UPDATE suno2openai SET captcha_token = ? WHERE cookie_hash = ?",
+                        (captcha_token, hash_cookie(cookie)))
+
+        await self._run(update)
+
+    async def get_captcha_token(self, cookie: str) -> str:
+        """获取指定cookie的captcha_token"""
+        def select(cur):
+            cur.execute("SELECT captcha_token FROM suno2openai WHERE cookie_hash = ?", (hash_cookie(cookie),))
+            row = cur.fetchone()
+            return row['captcha_token'] if row else None
+
+        return await self._run(select)
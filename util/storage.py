@@ -0,0 +1,138 @@
+import hashlib
+from abc import ABC, abstractmethod
+
+from util.config import (DB_BACKEND, SQLITE_PATH, SQL_IP, SQL_DK,
+                         USER_NAME, SQL_PASSWORD, SQL_NAME)
+
+# 批量操作每条语句处理的行数
+BULK_CHUNK_SIZE = 500
+
+
+# cookie 的定长标识，数据库按它查找，避免每次比较和传输完整的 cookie
+def hash_cookie(cookie: str) -> str:
+    return hashlib.sha1(cookie.encode('utf-8')).hexdigest()
+
+
+def chunks(items, size=BULK_CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class CookieStorage(ABC):
+    """
+    cookie 存储接口
+    MySQL（DatabaseManager）和 SQLite（SQLiteManager）两种后端都实现这里的全部方法，
+    出错时统一抛出 HTTPException
+    """
+
+    # 建立连接（池），重复调用无副作用
+    @abstractmethod
+    async def create_pool(self): ...
+
+    @abstractmethod
+    async def close_db_pool(self): ...
+
+    # 获取命名锁，timeout 秒内未获取到返回 False；锁在持有它的进程退出或断开连接后自动释放
+    @abstractmethod
+    async def acquire_lock(self, name: str, timeout: float = 0) -> bool: ...
+
+    # 是否仍持有命名锁
+    @abstractmethod
+    async def check_lock(self, name: str) -> bool: ...
+
+    @abstractmethod
+    async def release_lock(self, name: str): ...
+
+    # 建表并执行迁移
+    @abstractmethod
+    async def create_database_and_table(self): ...
+
+    # 在数据库中直接租用一个可用的cookie
+    @abstractmethod
+    async def get_request_cookie(self): ...
+
+    @abstractmethod
+    async def insert_or_update_cookie(self, cookie, songID=None, songID2=None, count=0): ...
+
+    # 释放cookie的一个并发槽位
+    @abstractmethod
+    async def delete_song_ids(self, cookie): ...
+
+    # 释放所有cookie的占用，返回更新的行数
+    @abstractmethod
+    async def delete_songIDS(self): ...
+
+    # 回收过期的租约，返回回收的行数
+    @abstractmethod
+    async def reap_expired_leases(self, ttl): ...
+
+    @abstractmethod
+    async def get_leases(self): ...
+
+    @abstractmethod
+    async def update_cookie_count(self, cookie, count_increment, update=None): ...
+
+    @abstractmethod
+    async def query_cookies(self): ...
+
+    @abstractmethod
+    async def update_song_ids_by_cookie(self, cookie, songID1, songID2): ...
+
+    @abstractmethod
+    async def get_cookies_count(self): ...
+
+    @abstractmethod
+    async def get_valid_cookies_count(self): ...
+
+    @abstractmethod
+    async def get_cookies(self): ...
+
+    @abstractmethod
+    async def get_cookie_states(self): ...
+
+    @abstractmethod
+    async def get_invalid_cookies(self): ...
+
+    @abstractmethod
+    async def get_all_cookies(self): ...
+
+    @abstractmethod
+    async def get_cookies_summary(self): ...
+
+    @abstractmethod
+    async def get_cookies_page(self, after_id=0, limit=100): ...
+
+    @abstractmethod
+    async def get_row_cookies(self): ...
+
+    @abstractmethod
+    async def delete_cookies(self, cookie: str): ...
+
+    @abstractmethod
+    async def delete_cookies_bulk(self, cookies): ...
+
+    @abstractmethod
+    async def upsert_cookies_bulk(self, items): ...
+
+    @abstractmethod
+    async def update_counts_bulk(self, counts): ...
+
+    @abstractmethod
+    async def apply_cookie_writes(self, rows, deletes=()): ...
+
+    @abstractmethod
+    async def update_captcha_token(self, cookie: str, captcha_token: str): ...
+
+    @abstractmethod
+    async def get_captcha_token(self, cookie: str) -> str: ...
+
+
+# 根据 DB_BACKEND 创建存储后端
+def create_db_manager() -> CookieStorage:
+    if DB_BACKEND == "sqlite":
+        from util.sqlite_storage import SQLiteManager
+        return SQLiteManager(SQLITE_PATH)
+    if DB_BACKEND != "mysql":
+        raise ValueError(f"不支持的 DB_BACKEND：{DB_BACKEND}")
+    from util.sql_uilts import DatabaseManager
+    return DatabaseManager(SQL_IP, int(SQL_DK), USER_NAME, SQL_PASSWORD, SQL_NAME)
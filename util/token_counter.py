@@ -0,0 +1,88 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional
+
+import tiktoken
+
+from util.config import TOKEN_MODEL, TOKEN_COUNT_MODE, TOKEN_OFFLOAD_CHARS, TOKEN_WORKERS
+from util.logger import logger
+
+
+# 每个模型的编码器只加载一次
+@lru_cache(maxsize=8)
+def get_encoding(model: str):
+    return tiktoken.encoding_for_model(model)
+
+
+# 近似计数：ASCII 约 4 个字符一个 token，其他字符（中文、emoji 等）按每个字符一个 token
+def approx_tokens(text: str) -> int:
+    ascii_count = len(text.encode('ascii', 'ignore'))
+    return (ascii_count + 3) // 4 + len(text) - ascii_count
+
+
+class TokenCounter:
+    """
+    用量统计的 token 计数
+    启动时在线程中预加载编码器，短文本直接在事件循环中编码，长文本交给线程池；
+    mode 为 approx 或编码器加载失败时使用近似计数，不再依赖 tiktoken
+    """
+
+    def __init__(self, model: str = TOKEN_MODEL, mode: str = TOKEN_COUNT_MODE,
+                 offload_chars: int = TOKEN_OFFLOAD_CHARS, workers: int = TOKEN_WORKERS):
+        self.model = model
+        self.approx = mode == "approx"
+        self.offload_chars = offload_chars
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # self.model 的编码器已在 start 中加载完成，之后短文本才在事件循环中直接编码
+        self._ready = False
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tokens")
+        return self._executor
+
+    async def start(self):
+        if self.approx:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(self.executor, get_encoding, self.model)
+            self._ready = True
+        except Exception as e:
+            logger.error(f"加载 tiktoken 编码器失败，改用近似计数：{e}")
+            self.approx = True
+
+    async def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _encode_count(self, text: str) -> int:
+        return len(get_encoding(self.model).encode(text))
+
+    async def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.approx:
+            return approx_tokens(text)
+        try:
+            if self._ready and len(text) < self.offload_chars:
+                return self._encode_count(text)
+            return await asyncio.get_running_loop().run_in_executor(self.executor, self._encode_count, text)
+        except Exception as e:
+            logger.error(f"tiktoken 编码失败，改用近似计数：{e}")
+            self.approx = True
+            return approx_tokens(text)
+
+    async def usage(self, prompt: str, completion: str) -> dict:
+        prompt_tokens, completion_tokens = await asyncio.gather(self.count(prompt), self.count(completion))
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+
+token_counter = TokenCounter()
@@ -3,10 +3,9 @@ import random
 import string
 import time
 
-import tiktoken
-
 from util.config import RETRIES, MAX_TIME
 from util.logger import logger
+from util.token_counter import get_encoding
 
 
 def generate_random_string_async(length):
@@ -18,7 +17,7 @@ def generate_timestamp_async():
 
 
 def calculate_token_costs(input_prompt: str, output_prompt: str, model_name: str) -> (int, int):
-    encoding = tiktoken.encoding_for_model(model_name)
+    encoding = get_encoding(model_name)
 
     # Encode the prompts
     input_tokens = encoding.encode(input_prompt)
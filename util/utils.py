@@ -2,11 +2,11 @@ import json
 import os
 from http.cookies import SimpleCookie
 
-import aiohttp
 from curl_cffi.requests import Cookies
 from dotenv import load_dotenv
 
 from util.config import PROXY
+from util.http_pool import http_pool
 
 load_dotenv()
 
@@ -34,7 +34,7 @@ async def fetch(url, headers=None, data=None, method="POST", captcha_token=None)
         if data is not None:
             data = json.dumps(data)
 
-        async with aiohttp.ClientSession() as session:
+        async with http_pool.session() as session:
             async with session.request(method=method, url=url, data=data, headers=headers, proxy=PROXY) as resp:
                 if resp.status != 200:
                     raise ValueError(f"请求状态码：{resp.status}，请求报错：{await resp.text()}")